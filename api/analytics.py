@@ -0,0 +1,161 @@
+"""
+Estatísticas diárias de venda e avaliação por vendedor e por produto (SellerDailyStats, ProductDailyStats).
+
+Os sinais aplicam deltas a cada item de pedido, mudança de status do pedido e comentário; o painel do
+vendedor lê só as linhas do intervalo. `reconstruir_estatisticas` refaz as tabelas a partir do histórico.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Comment, Order, OrderItem, Product, ProductDailyStats, SellerDailyStats
+
+ZERO = Decimal('0.00')
+
+
+def somar(product_id, day, deltas, seller_id=None):
+    if seller_id is None:
+        seller_id = Product.objects.filter(pk=product_id).values_list('seller_id', flat=True).first()
+        if seller_id is None:
+            return
+    ProductDailyStats.add(day, deltas, product_id=product_id, seller_id=seller_id)
+    SellerDailyStats.add(day, deltas, seller_id=seller_id)
+
+
+def registrar_item(order_id, product_id, price, quantity, sinal):
+    """Soma (sinal 1) ou tira (sinal -1) um item das vendas do dia do pedido, se o pedido conta como venda."""
+    order = Order.objects.filter(pk=order_id).values('status', 'created_at').first()
+    if order is None or order['status'] not in Order.SALE_STATUSES:
+        return
+    somar(product_id, timezone.localdate(order['created_at']), {'revenue': sinal * price * quantity, 'units': sinal * quantity})
+
+
+def registrar_pedido(order, sinal):
+    """Soma ou tira todos os itens do pedido; usado quando ele entra ou sai de um status de venda."""
+    day = timezone.localdate(order.created_at)
+    items = (
+        OrderItem.objects.filter(order=order).values('product_id', 'product__seller_id')
+        .annotate(revenue=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)), units=Sum('quantity'))
+    )
+    for item in items:
+        somar(
+            item['product_id'], day, {'revenue': sinal * item['revenue'], 'units': sinal * item['units']},
+            seller_id=item['product__seller_id'],
+        )
+
+
+def registrar_avaliacao(product_id, day, rating, sinal):
+    somar(product_id, day, {'rating_sum': sinal * rating, 'rating_count': sinal})
+
+
+def reconstruir_estatisticas(desde=None):
+    """Apaga e recalcula as estatísticas a partir de `desde` (ou de todo o histórico); retorna as linhas de produto criadas."""
+    vendas = OrderItem.objects.filter(order__status__in=Order.SALE_STATUSES)
+    avaliacoes = Comment.objects.all()
+    if desde is not None:
+        vendas = vendas.filter(order__created_at__date__gte=desde)
+        avaliacoes = avaliacoes.filter(date__gte=desde)
+
+    linhas = defaultdict(lambda: dict.fromkeys(ProductDailyStats.METRICS, 0))
+    for row in (
+        vendas.annotate(day=TruncDate('order__created_at'))
+        .values('product_id', 'product__seller_id', 'day')
+        .annotate(revenue=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=14, decimal_places=2)), units=Sum('quantity'))
+    ):
+        linha = linhas[row['product_id'], row['product__seller_id'], row['day']]
+        linha['revenue'], linha['units'] = row['revenue'], row['units']
+    for row in avaliacoes.values('product_id', 'product__seller_id', 'date').annotate(
+        rating_sum=Sum('rating'), rating_count=Count('id')
+    ):
+        linha = linhas[row['product_id'], row['product__seller_id'], row['date']]
+        linha['rating_sum'], linha['rating_count'] = row['rating_sum'], row['rating_count']
+
+    por_vendedor = defaultdict(lambda: dict.fromkeys(SellerDailyStats.METRICS, 0))
+    for (_, seller_id, day), metricas in linhas.items():
+        for campo, total in metricas.items():
+            por_vendedor[seller_id, day][campo] += total
+
+    with transaction.atomic():
+        for model in (ProductDailyStats, SellerDailyStats):
+            antigas = model.objects.all() if desde is None else model.objects.filter(day__gte=desde)
+            antigas.delete()
+        ProductDailyStats.objects.bulk_create(
+            [
+                ProductDailyStats(product_id=product_id, seller_id=seller_id, day=day, **metricas)
+                for (product_id, seller_id, day), metricas in linhas.items()
+            ],
+            batch_size=1000,
+        )
+        SellerDailyStats.objects.bulk_create(
+            [SellerDailyStats(seller_id=seller_id, day=day, **metricas) for (seller_id, day), metricas in por_vendedor.items()],
+            batch_size=1000,
+        )
+    return len(linhas)
+
+
+def valor(revenue):
+    # Somas agregadas no SQLite voltam sem as casas decimais fixas.
+    return str(Decimal(revenue).quantize(ZERO))
+
+
+def media(rating_sum, rating_count):
+    return round(rating_sum / rating_count, 2) if rating_count else None
+
+
+def painel_do_vendedor(seller_id, start, end, top=10):
+    """Série diária (com dias zerados), totais e produtos mais vendidos entre `start` e `end`, inclusive."""
+    linhas = {
+        row['day']: row
+        for row in SellerDailyStats.objects.filter(seller_id=seller_id, day__range=(start, end)).values('day', *SellerDailyStats.METRICS)
+    }
+    dias = []
+    totais = {'revenue': ZERO, 'units': 0, 'rating_sum': 0, 'rating_count': 0}
+    day = start
+    while day <= end:
+        row = linhas.get(day) or {'revenue': ZERO, 'units': 0, 'rating_sum': 0, 'rating_count': 0}
+        for campo in totais:
+            totais[campo] += row[campo]
+        dias.append({
+            'day': day.isoformat(),
+            'revenue': valor(row['revenue']),
+            'units': row['units'],
+            'rating_count': row['rating_count'],
+            'rating_average': media(row['rating_sum'], row['rating_count']),
+        })
+        day += timedelta(days=1)
+
+    produtos = (
+        ProductDailyStats.objects.filter(seller_id=seller_id, day__range=(start, end))
+        .values('product_id', title=F('product__title'))
+        .annotate(
+            revenue=Sum('revenue'), units=Sum('units'), rating_sum=Sum('rating_sum'), rating_count=Sum('rating_count')
+        )
+        .order_by('-revenue', 'product_id')[:top]
+    )
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'totals': {
+            'revenue': valor(totais['revenue']),
+            'units': totais['units'],
+            'rating_count': totais['rating_count'],
+            'rating_average': media(totais['rating_sum'], totais['rating_count']),
+        },
+        'days': dias,
+        'products': [
+            {
+                'product': row['product_id'],
+                'title': row['title'],
+                'revenue': valor(row['revenue']),
+                'units': row['units'],
+                'rating_count': row['rating_count'],
+                'rating_average': media(row['rating_sum'], row['rating_count']),
+            }
+            for row in produtos
+        ],
+    }
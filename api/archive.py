@@ -0,0 +1,150 @@
+"""
+Arquivo de mensagens antigas: cada MessageArchive guarda as mensagens de um chat em um mês como
+JSON comprimido (zstd quando disponível, senão zlib), no mesmo formato do MessageSerializer.
+
+No SQLite o texto arquivado continua na busca: um índice FTS5 sem conteúdo (api_messagearchive_fts,
+só os termos) e uma tabela que liga cada mensagem ao chat e ao bloco onde ela está.
+"""
+import json
+import zlib
+
+from django.db import connections, transaction
+
+from .models import Message, MessageArchive, User
+from .routers import db_for_chat
+from .serializers import MessageSerializer
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+FTS_TABLE = 'api_messagearchive_fts'
+FTS_MAP_TABLE = 'api_messagearchive_fts_map'
+
+
+def compactar(dados):
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=10).compress(dados)
+    return 'zlib', zlib.compress(dados, 9)
+
+
+def descompactar(codec, dados):
+    dados = bytes(dados)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('Arquivo de mensagens em zstd, mas o pacote zstandard não está instalado.')
+        return zstandard.ZstdDecompressor().decompress(dados)
+    return zlib.decompress(dados)
+
+
+def arquivar_mensagens(chat_id, month, mensagens):
+    """Grava as mensagens (em ordem de seq) num MessageArchive e as remove da tabela quente."""
+    linhas = [
+        {campo: valor for campo, valor in item.items() if campo != 'sender_name'}
+        for item in MessageSerializer(mensagens, many=True).data
+    ]
+    codec, dados = compactar(json.dumps(linhas, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    using = db_for_chat(chat_id)
+    with transaction.atomic(using=using):
+        archive = MessageArchive.objects.using(using).create(
+            chat_id=chat_id,
+            month=month,
+            first_seq=linhas[0]['seq'],
+            last_seq=linhas[-1]['seq'],
+            message_count=len(linhas),
+            codec=codec,
+            data=dados,
+        )
+        # Os sinais de deleção mantêm os contadores de não lidas e o índice de busca coerentes.
+        Message.objects.using(using).filter(pk__in=[mensagem.pk for mensagem in mensagens]).delete()
+        indexar(archive, linhas)
+    return archive
+
+
+def indexar(archive, linhas):
+    """Põe as mensagens do bloco no índice de busca do arquivo (só no SQLite)."""
+    connection = connections[archive._state.db]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE}(rowid, message) VALUES (%s, %s)',
+            [(linha['id'], linha['message']) for linha in linhas],
+        )
+        cursor.executemany(
+            f'INSERT INTO {FTS_MAP_TABLE}(message_id, chat_id, archive_id) VALUES (%s, %s, %s)',
+            [(linha['id'], archive.chat_id, archive.pk) for linha in linhas],
+        )
+
+
+def desindexar(archive):
+    """Tira o bloco do índice; um índice FTS5 sem conteúdo precisa do texto original para apagar os termos."""
+    connection = connections[archive._state.db]
+    if connection.vendor != 'sqlite':
+        return
+    linhas = json.loads(descompactar(archive.codec, archive.data))
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message) VALUES ('delete', %s, %s)",
+            [(linha['id'], linha['message']) for linha in linhas],
+        )
+        cursor.execute(f'DELETE FROM {FTS_MAP_TABLE} WHERE archive_id = %s', [archive.pk])
+
+
+def com_nomes(linhas):
+    nomes = dict(User.objects.filter(id__in={linha['sender'] for linha in linhas}).values_list('id', 'name'))
+    for linha in linhas:
+        linha['sender_name'] = nomes.get(linha['sender'])
+    return linhas
+
+
+def linhas_arquivadas(using, ids_por_bloco):
+    """{id da mensagem: linha} das mensagens pedidas, descomprimindo cada bloco uma vez; `ids_por_bloco` é {archive_id: ids}."""
+    linhas = []
+    for archive in MessageArchive.objects.using(using).filter(pk__in=ids_por_bloco):
+        ids = set(ids_por_bloco[archive.pk])
+        linhas.extend(
+            linha for linha in json.loads(descompactar(archive.codec, archive.data)) if linha['id'] in ids
+        )
+    return {linha['id']: linha for linha in com_nomes(linhas)}
+
+
+def buscar_sem_indice(using, chats, termos, before, limit):
+    """Fora do SQLite: varre os blocos dos chats do usuário; devolve as `limit` linhas mais recentes com todos os termos."""
+    termos = [termo.lower() for termo in termos]
+    linhas = []
+    for archive in MessageArchive.objects.using(using).filter(chat__in=chats):
+        linhas.extend(
+            linha for linha in json.loads(descompactar(archive.codec, archive.data))
+            if (before is None or linha['id'] < before) and all(termo in linha['message'].lower() for termo in termos)
+        )
+    linhas.sort(key=lambda linha: linha['id'], reverse=True)
+    return com_nomes(linhas[:limit])
+
+
+def mensagens_arquivadas(chat_id, after_seq=None, before_seq=None, limit=None):
+    """
+    Mensagens arquivadas do chat com after_seq < seq < before_seq, em ordem de seq. Com `limit`,
+    devolve só as `limit` mais recentes do intervalo e descomprime apenas os blocos necessários.
+    """
+    archives = MessageArchive.objects.using(db_for_chat(chat_id)).filter(chat_id=chat_id)
+    if after_seq is not None:
+        archives = archives.filter(last_seq__gt=after_seq)
+    if before_seq is not None:
+        archives = archives.filter(first_seq__lt=before_seq)
+
+    linhas = []
+    for archive in archives.order_by('-first_seq'):
+        linhas.extend(
+            linha for linha in json.loads(descompactar(archive.codec, archive.data))
+            if (after_seq is None or linha['seq'] > after_seq) and (before_seq is None or linha['seq'] < before_seq)
+        )
+        if limit is not None and len(linhas) >= limit:
+            break
+
+    linhas.sort(key=lambda linha: linha['seq'])
+    if limit is not None:
+        linhas = linhas[-limit:] if limit else []
+
+    return com_nomes(linhas)
@@ -0,0 +1,69 @@
+"""
+Apoio aos comandos bench_*: roda a medição num processo novo, com bancos SQLite vazios num
+diretório temporário, para que escritas concorrentes não toquem o banco de verdade.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+
+RUN_SCRIPT = '''
+import importlib, json, sys
+import django
+django.setup()
+from django.core.management import call_command
+from django.db import connections
+from api.routers import chat_databases
+for alias in {'default', *chat_databases()}:
+    call_command('migrate', database=alias, verbosity=0)
+print(json.dumps(importlib.import_module(sys.argv[1]).executar(*map(int, sys.argv[2:]))))
+'''
+
+
+def executar_em_banco_novo(modulo, *args, diretorio=None, **env):
+    """
+    Chama `modulo.executar(*args)` (inteiros) no processo filho, depois do migrate, e devolve o JSON que ela
+    retornar. Os bancos ficam num diretório temporário dentro de `diretorio` (padrão: o do sistema).
+    """
+    with tempfile.TemporaryDirectory(dir=diretorio) as directory:
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'wastee.settings'),
+            'DATABASE_PATH': os.path.join(directory, 'default.sqlite3'),
+            'CHAT_DB_DIR': directory,
+            'CHAT_SHARDS': '0',
+            **env,
+        }
+        result = subprocess.run(
+            [sys.executable, '-c', RUN_SCRIPT, modulo, *map(str, args)],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+        )
+    if result.returncode != 0:
+        raise CommandError(result.stderr[-2000:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def latencia_fsync(diretorio=None, vezes=50):
+    """Tempo médio (s) de um fsync de um bloco pequeno no disco de `diretorio`: o custo mínimo de um commit no SQLite."""
+    with tempfile.NamedTemporaryFile(dir=diretorio) as arquivo:
+        start = time.perf_counter()
+        for _ in range(vezes):
+            arquivo.write(b'\0' * 512)
+            arquivo.flush()
+            os.fsync(arquivo.fileno())
+        return (time.perf_counter() - start) / vezes
+
+
+def iniciar_processo():
+    """Initializer dos pools de processos dos benchmarks."""
+    import django
+    django.setup()
+    from django.db import connections
+    # Vários processos disputam o mesmo arquivo; espera o lock em vez de falhar.
+    for alias in connections:
+        connections.settings[alias].setdefault('OPTIONS', {})['timeout'] = 60
@@ -0,0 +1,108 @@
+"""
+Contadores somados em memória e gravados em lote: cada processo junta os incrementos num dicionário e
+os grava com um UPDATE só (`campo = campo + CASE pk ...`) a cada `interval` segundos, ao juntar
+`max_pending` incrementos ou ao encerrar o processo.
+
+Se o processo cair sem encerrar, perde no máximo o que ainda não foi gravado: os incrementos dos
+últimos `interval` segundos, nunca mais que `max_pending`. Ver bench_view_counters.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import Case, F, Value, When
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    def __init__(self, model, field, interval=10, max_pending=1000, batch_size=500):
+        self.model = model
+        self.field = field
+        self.interval = interval
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.lock = threading.Lock()
+        self.reset()
+        atexit.register(self.flush)
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.pending = Counter()
+        self.pending_total = 0
+        self.flushes = 0
+        self.thread = None
+
+    def increment(self, pk, amount=1):
+        with self.lock:
+            # Processo filho de um fork: o que estava pendente é do pai, que grava.
+            if self.pid != os.getpid():
+                self.reset()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name=f'{self.field}-flush', daemon=True)
+                self.thread.start()
+            self.pending[pk] += amount
+            self.pending_total += amount
+            full = self.pending_total >= self.max_pending
+        if full:
+            self.flush()
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            finally:
+                # A thread tem conexões próprias; não deixa uma aberta segurando o arquivo entre gravações.
+                connections.close_all()
+
+    def take(self):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.reset()
+            pending, self.pending, self.pending_total = self.pending, Counter(), 0
+        return pending
+
+    def flush(self):
+        """Grava o que estiver pendente; devolve quantas linhas foram atualizadas."""
+        pending = self.take()
+        if not pending:
+            return 0
+        try:
+            updated = self.write(pending)
+        except DatabaseError:
+            logger.exception('Falha ao gravar %s; tentando de novo na próxima gravação.', self.field)
+            with self.lock:
+                self.pending.update(pending)
+                self.pending_total += sum(pending.values())
+            return 0
+        self.flushes += 1
+        return updated
+
+    def write(self, pending):
+        items = sorted(pending.items())
+        updated = 0
+        with transaction.atomic(using=self.model.objects.db):
+            for start in range(0, len(items), self.batch_size):
+                batch = items[start:start + self.batch_size]
+                increment = Case(*[When(pk=pk, then=Value(amount)) for pk, amount in batch], default=Value(0))
+                updated += self.model.objects.filter(pk__in=[pk for pk, _ in batch]).update(
+                    **{self.field: F(self.field) + increment}
+                )
+        return updated
+
+
+@lru_cache(maxsize=None)
+def product_views():
+    from .models import Product
+
+    return CounterBuffer(
+        Product, 'view_count',
+        interval=settings.PRODUCT_VIEW_FLUSH_INTERVAL, max_pending=settings.PRODUCT_VIEW_FLUSH_MAX_PENDING,
+    )
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, PBKDF2PasswordHasher
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = getattr(settings, 'PBKDF2_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
+
+
+class TunableArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = getattr(settings, 'ARGON2_TIME_COST', None) or Argon2PasswordHasher.time_cost
+    memory_cost = getattr(settings, 'ARGON2_MEMORY_COST', None) or Argon2PasswordHasher.memory_cost
+    parallelism = getattr(settings, 'ARGON2_PARALLELISM', None) or Argon2PasswordHasher.parallelism
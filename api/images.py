@@ -0,0 +1,73 @@
+"""
+Validação de imagens só pelo cabeçalho (formato e dimensões), sem decodificar pixels.
+
+Este módulo não importa o Django: as funções rodam nos processos do pool de validação.
+"""
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+ALLOWED_FORMATS = ['jpeg', 'jpg', 'png']
+MAX_DIMENSION = 3000
+HEADER_BYTES = 256 * 1024
+
+
+def validar_cabecalho_imagem(fonte):
+    """Recebe um caminho ou os bytes iniciais do arquivo; retorna a mensagem de erro ou None."""
+    # Importado aqui para o Pillow não pesar no boot dos workers.
+    from PIL import Image
+
+    try:
+        if isinstance(fonte, bytes):
+            fonte = io.BytesIO(fonte)
+        with Image.open(fonte) as img:
+            img_format = (img.format or '').lower()
+            width, height = img.size
+    except Exception as e:
+        return f"Imagem inválida: {str(e)}"
+
+    if img_format not in ALLOWED_FORMATS:
+        return f"Formato de imagem inválido: {img_format}. Apenas JPEG e PNG são permitidos."
+    if width > MAX_DIMENSION or height > MAX_DIMENSION:
+        return f'As imagens devem ter no máximo {MAX_DIMENSION}x{MAX_DIMENSION} pixels.'
+    return None
+
+
+def fonte_da_imagem(arquivo, limite=HEADER_BYTES):
+    if hasattr(arquivo, 'temporary_file_path'):
+        return arquivo.temporary_file_path()
+    arquivo.seek(0)
+    cabecalho = arquivo.read(limite)
+    arquivo.seek(0)
+    return cabecalho
+
+
+@lru_cache(maxsize=None)
+def pool_de_validacao(max_workers):
+    # spawn: o processo filho não herda conexões de banco nem threads do servidor.
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def validar_imagens(arquivos, max_workers=1):
+    """Valida todos os arquivos e devolve um erro (ou None) por arquivo, na mesma ordem."""
+    fontes = [fonte_da_imagem(arquivo) for arquivo in arquivos]
+    erros = None
+    if len(fontes) > 1 and max_workers > 1:
+        try:
+            erros = list(pool_de_validacao(max_workers).map(validar_cabecalho_imagem, fontes))
+        except BrokenProcessPool:
+            pool_de_validacao.cache_clear()
+    if erros is None:
+        erros = [validar_cabecalho_imagem(fonte) for fonte in fontes]
+
+    for indice, (arquivo, fonte, erro) in enumerate(zip(arquivos, fontes, erros)):
+        # Cabeçalho maior que o trecho lido (EXIF enorme): tenta de novo com o arquivo inteiro.
+        if erro and isinstance(fonte, bytes) and len(fonte) == HEADER_BYTES:
+            erros[indice] = validar_cabecalho_imagem(fonte_da_imagem(arquivo, limite=-1))
+    return erros
+
+
+def validar_imagem(arquivo):
+    return validar_imagens([arquivo])[0]
@@ -0,0 +1,157 @@
+"""
+Ingestão das imagens externas (ProductImage.external_image_url) para o armazenamento local.
+
+O download é assíncrono e com concorrência limitada; o ORM só é usado fora do loop de eventos.
+"""
+import asyncio
+import ipaddress
+from collections import defaultdict
+from urllib.parse import urljoin, urlsplit
+
+import aiohttp
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .images import validar_cabecalho_imagem
+from .models import ExternalImageFailure, ImageBlob, ProductImage
+
+CHUNK_SIZE = 64 * 1024
+MAX_REDIRECTS = 5
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+
+
+def endereco_publico(host):
+    try:
+        return ipaddress.ip_address(host).is_global
+    except ValueError:
+        return True
+
+
+class PublicResolver(aiohttp.ThreadedResolver):
+    """Descarta endereços internos na resolução de DNS, para a URL de um vendedor não alcançar a rede privada."""
+
+    async def resolve(self, host, port=0, family=0):
+        enderecos = [e for e in await super().resolve(host, port, family) if endereco_publico(e['host'])]
+        if not enderecos:
+            raise OSError(f'{host} resolve apenas para endereços internos')
+        return enderecos
+
+
+def verificar_url(url, permitir_hosts_privados):
+    """Mensagem de erro se a URL não puder ser buscada, ou None."""
+    partes = urlsplit(url)
+    if partes.scheme not in ('http', 'https') or not partes.hostname:
+        return 'URL inválida'
+    # IPs literais não passam pelo resolvedor.
+    if not permitir_hosts_privados and not endereco_publico(partes.hostname):
+        return 'Endereço interno não permitido'
+    return None
+
+
+async def baixar_imagem(session, url, max_bytes, permitir_hosts_privados=False):
+    """Retorna (url, conteúdo, erro); exatamente um entre conteúdo e erro é None."""
+    atual = url
+    try:
+        # Redirecionamentos seguidos aqui, um a um: cada destino passa pela mesma verificação da URL original.
+        for _ in range(MAX_REDIRECTS + 1):
+            erro = verificar_url(atual, permitir_hosts_privados)
+            if erro:
+                return url, None, erro
+            async with session.get(atual, allow_redirects=False) as resposta:
+                if resposta.status in REDIRECT_STATUSES:
+                    location = resposta.headers.get('Location')
+                    if not location:
+                        return url, None, f'HTTP {resposta.status}'
+                    atual = urljoin(atual, location)
+                    continue
+                if resposta.status != 200:
+                    return url, None, f'HTTP {resposta.status}'
+                if resposta.content_length and resposta.content_length > max_bytes:
+                    return url, None, 'Imagem maior que o limite permitido'
+                conteudo = bytearray()
+                async for chunk in resposta.content.iter_chunked(CHUNK_SIZE):
+                    conteudo.extend(chunk)
+                    if len(conteudo) > max_bytes:
+                        return url, None, 'Imagem maior que o limite permitido'
+                return url, bytes(conteudo), None
+        return url, None, 'Redirecionamentos demais'
+    except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError) as e:
+        return url, None, str(e) or e.__class__.__name__
+
+
+async def baixar_imagens(urls, concorrencia=8, por_host=4, timeout=10, max_bytes=None, permitir_hosts_privados=None):
+    """Baixa as URLs com no máximo `concorrencia` conexões abertas (e `por_host` por host)."""
+    max_bytes = max_bytes or settings.EXTERNAL_IMAGE_MAX_SIZE
+    if permitir_hosts_privados is None:
+        permitir_hosts_privados = settings.EXTERNAL_IMAGE_ALLOW_PRIVATE_HOSTS
+
+    connector = aiohttp.TCPConnector(
+        limit=concorrencia,
+        limit_per_host=por_host,
+        resolver=None if permitir_hosts_privados else PublicResolver(),
+    )
+    async with aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+        headers={'User-Agent': 'wastee-api/1.0 (ingestao de imagens)'},
+    ) as session:
+        return await asyncio.gather(*(
+            baixar_imagem(session, url, max_bytes, permitir_hosts_privados) for url in urls
+        ))
+
+
+def imagens_externas_pendentes():
+    """Imagens com URL externa ainda sem arquivo local, exceto as URLs em cache negativo."""
+    em_espera = ExternalImageFailure.objects.filter(retry_after__gt=timezone.now()).values('url')
+    return (
+        ProductImage.objects
+        .filter(external_image_url__isnull=False, blob__isnull=True)
+        .filter(Q(image='') | Q(image__isnull=True))
+        .exclude(external_image_url='')
+        .exclude(external_image_url__in=em_espera)
+    )
+
+
+def extensao_da_imagem(conteudo):
+    return '.png' if conteudo.startswith(b'\x89PNG') else '.jpg'
+
+
+def guardar_imagem_externa(url, conteudo, imagens):
+    """Grava o conteúdo como ImageBlob e aponta as imagens para ele; retorna quantas foram atualizadas."""
+    digest = ImageBlob.compute_digest(ContentFile(conteudo))
+    atualizadas = 0
+    with transaction.atomic():
+        for imagem in imagens:
+            blob = ImageBlob.acquire(digest, content=ContentFile(conteudo, name=f'external{extensao_da_imagem(conteudo)}'))
+            # Outro worker pode ter ingerido a mesma imagem nesse meio tempo.
+            if ProductImage.objects.filter(pk=imagem.pk, blob__isnull=True).update(
+                blob=blob, image=blob.file, updated_at=timezone.now()
+            ):
+                atualizadas += 1
+            else:
+                ImageBlob.release(digest)
+        ExternalImageFailure.objects.filter(url=url).delete()
+    return atualizadas
+
+
+def ingerir_imagens_externas(imagens, **opcoes):
+    """Baixa, valida e guarda localmente as imagens; retorna (imagens ingeridas, URLs com falha)."""
+    por_url = defaultdict(list)
+    for imagem in imagens:
+        por_url[imagem.external_image_url].append(imagem)
+    if not por_url:
+        return 0, 0
+
+    ingeridas = falhas = 0
+    for url, conteudo, erro in asyncio.run(baixar_imagens(list(por_url), **opcoes)):
+        if erro is None:
+            erro = validar_cabecalho_imagem(conteudo)
+        if erro:
+            ExternalImageFailure.record(url, erro)
+            falhas += 1
+            continue
+        ingeridas += guardar_imagem_externa(url, conteudo, por_url[url])
+    return ingeridas, falhas
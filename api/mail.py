@@ -0,0 +1,87 @@
+"""
+Cliente do Gmail compartilhado pelo processo: credenciais carregadas uma vez, token renovado
+antes de expirar e gravado de volta no arquivo, e a mesma conexão HTTP reaproveitada entre envios.
+
+As bibliotecas do Google só são importadas no primeiro envio (ver bench_startup).
+"""
+import datetime
+import os
+import tempfile
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+
+GMAIL_SCOPES = ['https://www.googleapis.com/auth/gmail.send']
+
+
+class GmailClient:
+    def __init__(self, token_path, scopes=GMAIL_SCOPES, refresh_margin=300):
+        self.token_path = token_path
+        self.scopes = scopes
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.credentials = None
+        self.service = None
+        self.refresh_request = None
+
+    def load(self):
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from googleapiclient.discovery import build
+
+        self.credentials = Credentials.from_authorized_user_file(self.token_path, scopes=self.scopes)
+        self.refresh_request = Request()
+        # static_discovery: usa o documento de descoberta que vem com a biblioteca, sem buscar na rede.
+        self.service = build(
+            'gmail', 'v1', credentials=self.credentials, static_discovery=True, cache_discovery=False
+        )
+
+    def expiring(self):
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return not self.credentials.valid
+        # google-auth guarda expiry como UTC sem fuso.
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return expiry - self.refresh_margin <= now
+
+    def save_token(self):
+        directory = os.path.dirname(os.path.abspath(self.token_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.token-', suffix='.json')
+        try:
+            with os.fdopen(fd, 'w') as tmp:
+                tmp.write(self.credentials.to_json())
+                tmp.flush()
+                os.fsync(tmp.fileno())
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, self.token_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def send(self, raw_message):
+        with self.lock:
+            # Processo filho de um fork não pode reaproveitar a conexão do pai.
+            if self.pid != os.getpid():
+                self.reset()
+            if self.service is None:
+                self.load()
+
+            token = self.credentials.token
+            if self.expiring():
+                self.credentials.refresh(self.refresh_request)
+            result = self.service.users().messages().send(userId='me', body={'raw': raw_message}).execute()
+            # A renovação pode ter acontecido aqui ou dentro do execute(), após um 401.
+            if self.credentials.token != token:
+                self.save_token()
+            return result
+
+
+@lru_cache(maxsize=None)
+def gmail_client():
+    return GmailClient(settings.GMAIL_TOKEN_FILE, refresh_margin=settings.GMAIL_TOKEN_REFRESH_MARGIN)
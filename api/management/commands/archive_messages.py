@@ -0,0 +1,44 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from api.archive import arquivar_mensagens
+from api.models import Message
+from api.routers import chat_databases
+
+
+class Command(BaseCommand):
+    help = 'Move mensagens antigas para o arquivo comprimido, um bloco por chat e mês.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.MESSAGE_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--limit', type=int, help='Máximo de blocos (chat, mês) nesta execução.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archives = messages = 0
+        for alias in chat_databases():
+            cold = Message.objects.using(alias).filter(sent_at__lt=cutoff)
+            groups = (
+                cold.annotate(month=TruncMonth('sent_at'))
+                .values_list('chat_id', 'month').distinct().order_by('chat_id', 'month')
+            )
+            if options['limit']:
+                groups = groups[:max(options['limit'] - archives, 0)]
+
+            for chat_id, month in list(groups):
+                next_month = (month + timedelta(days=32)).replace(day=1)
+                batch = list(
+                    cold.filter(chat_id=chat_id, sent_at__gte=month, sent_at__lt=next_month)
+                    .prefetch_related('sender').order_by('seq')
+                )
+                if not batch:
+                    continue
+                arquivar_mensagens(chat_id, month.date(), batch)
+                archives += 1
+                messages += len(batch)
+
+        self.stdout.write(self.style.SUCCESS(f'{messages} mensagens arquivadas em {archives} blocos.'))
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.benchmarks import executar_em_banco_novo, iniciar_processo, latencia_fsync
+
+
+def gravar_mensagens(tarefa):
+    from django.db.models.signals import post_save
+
+    from api.models import Message
+    from api.signals import count_unread_message
+
+    chats, quantidade, com_nao_lidas = tarefa
+    if not com_nao_lidas:
+        post_save.disconnect(count_unread_message, sender=Message)
+    cpu = time.process_time()
+    for i in range(quantidade):
+        chat_id, buyer_id = chats[i % len(chats)]
+        Message(chat_id=chat_id, sender_id=buyer_id, message=f'mensagem de teste {i}').save()
+    return quantidade, time.process_time() - cpu
+
+
+def executar(n_chats, writers, messages, com_nao_lidas):
+    """Roda dentro do processo filho, com bancos vazios em CHAT_DB_DIR; devolve o tempo de escrita."""
+    from api.models import Chat, Seller, User
+
+    seller_user = User.objects.create_user(email='bench-seller@example.com', password=None, name='Vendedor')
+    seller = Seller.objects.create(
+        user=seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo', neighborhood='Centro'
+    )
+    chats = []
+    for i in range(n_chats):
+        buyer = User.objects.create_user(email=f'bench-buyer-{i}@example.com', password=None, name=f'Comprador {i}')
+        chats.append((Chat.objects.create(buyer=buyer, seller=seller).pk, buyer.pk))
+
+    por_processo = messages // writers
+    tarefas = [(chats[i::writers] or chats, por_processo, com_nao_lidas) for i in range(writers)]
+    contexto = multiprocessing.get_context('spawn')
+    with contexto.Pool(writers, initializer=iniciar_processo) as pool:
+        pool.map(int, range(writers))
+        start = time.perf_counter()
+        runs = pool.map(gravar_mensagens, tarefas)
+        elapsed = time.perf_counter() - start
+    return {'messages': sum(run[0] for run in runs), 'seconds': elapsed, 'cpu_seconds': sum(run[1] for run in runs)}
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a vazão de escrita de mensagens com 1, 2, 4... bancos de chat (CHAT_SHARDS), com vários '
+        'processos escrevendo ao mesmo tempo. Cada rodada usa bancos SQLite novos num diretório temporário. '
+        'Os shards só aumentam a vazão enquanto o gargalo é o lock de escrita e o fsync de cada arquivo; '
+        'com a CPU já ocupada (coluna CPU perto de 100%) ou fsync quase de graça, a vazão não muda.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', default='1,2,4', help='Quantidades de bancos de chat a comparar.')
+        parser.add_argument('--writers', type=int, default=8, help='Processos escrevendo em paralelo.')
+        parser.add_argument('--messages', type=int, default=4000)
+        parser.add_argument('--chats', type=int, default=64)
+        parser.add_argument('--dir', help='Onde criar os bancos; use o disco de produção para medir o fsync de verdade.')
+        parser.add_argument(
+            '--with-unread', action='store_true',
+            help='Mantém os contadores de não lidas, que ficam no banco principal e não escalam com os shards.',
+        )
+
+    def handle(self, *args, **options):
+        cpus = os.cpu_count() or 1
+        self.stdout.write(f"{cpus} CPU(s), fsync em {latencia_fsync(options['dir']) * 1000:.2f} ms")
+        baseline = None
+        for shards in [int(value) for value in options['shards'].split(',')]:
+            result = executar_em_banco_novo(
+                __name__, options['chats'], options['writers'], options['messages'], int(options['with_unread']),
+                diretorio=options['dir'], CHAT_SHARDS=str(shards),
+            )
+            rate = result['messages'] / result['seconds']
+            baseline = baseline or rate
+            cpu = result['cpu_seconds'] / (result['seconds'] * min(cpus, options['writers']))
+            self.stdout.write(
+                f"{shards:>3} banco(s): {result['messages']} mensagens em {result['seconds']:.2f} s  "
+                f"{rate:9.0f} msg/s  ({rate / baseline:.2f}x)  CPU {cpu:4.0%}"
+            )
@@ -0,0 +1,92 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import executar_em_banco_novo, iniciar_processo
+
+MODES = ('reserva', 'baixa no pedido', 'ler e salvar')
+
+
+def comprar(tarefa):
+    """Compra uma unidade por vez até o produto esgotar; retorna quantas vendeu."""
+    from api.models import Order, OrderItem, Product, StockReservation, User
+
+    modo, product_id, buyer_id = tarefa
+    buyer = User.objects.get(pk=buyer_id)
+    vendidas = 0
+    while True:
+        product = Product.objects.get(pk=product_id)
+        if modo == 'reserva':
+            reservation = StockReservation.reserve(buyer, product_id, 1)
+            if reservation is None or Order.place(buyer, [(product, 1, reservation)]) is None:
+                break
+        elif modo == 'baixa no pedido':
+            if Order.place(buyer, [(product, 1, None)]) is None:
+                break
+        else:
+            # O jeito ingênuo: lê, confere e salva. Entre a leitura e o save outro processo pode vender a mesma unidade.
+            if product.stock < 1:
+                break
+            product.stock -= 1
+            product.save(update_fields=['stock'])
+            order = Order.objects.create(user=buyer, status='pending', total_price=product.original_price)
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=product.original_price)
+        vendidas += 1
+    return vendidas
+
+
+def executar(stock, writers):
+    """Roda no processo filho, com um banco vazio em DATABASE_PATH."""
+    from api.models import Category, Product, Seller, User
+
+    seller = Seller.objects.create(
+        user=User.objects.create_user(email='bench-seller@example.com', password=None, name='Vendedor'),
+        cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo', neighborhood='Centro',
+    )
+    category = Category.objects.create(name='Bench', description='')
+    buyers = [
+        User.objects.create_user(email=f'bench-buyer-{i}@example.com', password=None, name=f'Comprador {i}').pk
+        for i in range(writers)
+    ]
+
+    resultados = {}
+    contexto = multiprocessing.get_context('spawn')
+    with contexto.Pool(writers, initializer=iniciar_processo) as pool:
+        pool.map(int, range(writers))
+        for modo in MODES:
+            product = Product.objects.create(
+                title=f'Produto disputado ({modo})', original_price=10, description='', category=category,
+                seller=seller, stock=stock,
+            )
+            start = time.perf_counter()
+            vendidas = sum(pool.map(comprar, [(modo, product.pk, buyer) for buyer in buyers]))
+            elapsed = time.perf_counter() - start
+            product.refresh_from_db()
+            resultados[modo] = {'sold': vendidas, 'stock': product.stock, 'seconds': elapsed}
+    return resultados
+
+
+class Command(BaseCommand):
+    help = (
+        'Vários processos compram o mesmo produto até esgotar: confere que não há venda além do estoque '
+        'e mede a vazão de pedidos. Roda num banco SQLite novo num diretório temporário.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stock', type=int, default=500)
+        parser.add_argument('--writers', type=int, default=8, help='Processos comprando em paralelo.')
+
+    def handle(self, *args, **options):
+        resultados = executar_em_banco_novo(__name__, options['stock'], options['writers'])
+        oversold = False
+        for modo, run in resultados.items():
+            extra = run['sold'] - options['stock']
+            oversold |= extra > 0 and modo != 'ler e salvar'
+            self.stdout.write(
+                f"{modo:<16} {run['sold']:>6} vendidas de {options['stock']}  estoque final {run['stock']:>4}  "
+                f"vendas além do estoque {max(extra, 0):>4}  {run['sold'] / run['seconds']:8.0f} pedidos/s"
+            )
+        if oversold:
+            raise CommandError('A reserva atômica vendeu além do estoque.')
+        self.stdout.write(self.style.SUCCESS('Sem venda além do estoque com baixa condicional.'))
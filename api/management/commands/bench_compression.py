@@ -0,0 +1,51 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from api.middleware import ENCODERS, CompressionMiddleware
+from api.models import Chat, Product
+from api.serializers import ChatSerializer, ProductDetailSerializer
+
+
+class Command(BaseCommand):
+    help = 'Mede bytes e tempo de CPU por requisição da compressão de respostas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--limit', type=int, default=100)
+
+    def handle(self, *args, **options):
+        payloads = {
+            'products': ProductDetailSerializer(Product.objects.all()[:options['limit']], many=True).data,
+            'chats': ChatSerializer(Chat.objects.all()[:options['limit']], many=True).data,
+        }
+        factory = RequestFactory()
+
+        for name, data in payloads.items():
+            body = json.dumps(data, default=str).encode('utf-8')
+            if len(body) < 1024:
+                body = json.dumps([data] * (1024 // max(len(body), 1) + 1), default=str).encode('utf-8')
+            self.stdout.write(f'{name}: {len(body)} bytes sem compressão')
+
+            for encoding in ['identity', *ENCODERS]:
+                middleware = CompressionMiddleware(lambda request: HttpResponse(body, content_type='application/json'))
+                request = factory.get('/', HTTP_ACCEPT_ENCODING=encoding)
+                cache.clear()
+
+                start = time.process_time()
+                size = len(middleware(request).content)
+                cold = (time.process_time() - start) * 1000
+
+                start = time.process_time()
+                for _ in range(options['requests']):
+                    middleware(request)
+                warm = (time.process_time() - start) * 1000 / options['requests']
+
+                self.stdout.write(
+                    f'  {encoding:>8}: {size:>9} bytes  {size / len(body):6.1%}  '
+                    f'cpu frio {cold:7.3f} ms  cpu em cache {warm:7.3f} ms/req'
+                )
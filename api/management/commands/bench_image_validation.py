@@ -0,0 +1,49 @@
+import io
+import time
+
+from django.conf import settings
+from django.core.files.images import get_image_dimensions
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from api.images import validar_imagens
+
+
+class Command(BaseCommand):
+    help = 'Compara a validação antiga (decodificação serial) com a validação por cabeçalho, serial e em pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=6)
+        parser.add_argument('--size', type=int, default=3000)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_VALIDATION_WORKERS)
+
+    def handle(self, *args, **options):
+        buffer = io.BytesIO()
+        Image.effect_noise((options['size'], options['size']), 64).convert('RGB').save(buffer, 'JPEG', quality=85)
+        content = buffer.getvalue()
+        images = [SimpleUploadedFile(f'foto{i}.jpg', content, 'image/jpeg') for i in range(options['images'])]
+        self.stdout.write(f"{options['images']} JPEGs de {options['size']}x{options['size']} ({len(content) // 1024} KiB cada)")
+
+        def antiga():
+            for image in images:
+                image.seek(0)
+                img = Image.open(image)
+                img.verify()
+                img.format.lower()
+                get_image_dimensions(image)
+
+        # Aquece o pool para não medir a criação dos processos.
+        validar_imagens(images, max_workers=options['workers'])
+
+        for nome, funcao in (
+            ('decodificação serial (antiga)', antiga),
+            ('cabeçalho serial', lambda: validar_imagens(images)),
+            (f"cabeçalho em pool ({options['workers']} processos)", lambda: validar_imagens(images, max_workers=options['workers'])),
+        ):
+            start = time.perf_counter()
+            for _ in range(options['rounds']):
+                funcao()
+            elapsed = (time.perf_counter() - start) / options['rounds'] * 1000
+            self.stdout.write(f'  {nome:<40} {elapsed:9.2f} ms por requisição')
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.models import Comment, Product, User
+from api.serializers import (
+    CommentSerializer, CommentValuesSerializer, ProductDetailSerializer, ProductDetailValuesSerializer
+)
+
+
+class Command(BaseCommand):
+    help = 'Compara linhas por segundo dos ModelSerializers de listagem com os serializers baseados em .values().'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=500)
+        parser.add_argument('--rounds', type=int, default=5)
+        parser.add_argument('--user-id', type=int, help='Usuário da requisição (define o chat_id). Padrão: o primeiro.')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(pk=options['user_id']).first() if options['user_id'] else User.objects.first()
+        if user is None:
+            raise CommandError('Nenhum usuário encontrado.')
+        request = Request(APIRequestFactory().get('/'))
+        request.user = user
+        context = {'request': request}
+        renderer = JSONRenderer()
+
+        casos = (
+            ('comentários', Comment.objects.select_related('user'), CommentSerializer, CommentValuesSerializer),
+            ('produtos', Product.objects.all(), ProductDetailSerializer, ProductDetailValuesSerializer),
+        )
+        for nome, queryset, antigo, novo in casos:
+            ids = list(queryset.values_list('id', flat=True)[:options['limit']])
+            if not ids:
+                self.stdout.write(f'{nome}: nenhuma linha no banco, pulando.')
+                continue
+            queryset = queryset.filter(id__in=ids).order_by('id')
+
+            def serializar_antigo():
+                return renderer.render(antigo(queryset, many=True, context=context).data)
+
+            def serializar_novo():
+                return renderer.render(novo(novo.values(queryset), context=context).data)
+
+            identica = serializar_antigo() == serializar_novo()
+            self.stdout.write(f"{nome}: {len(ids)} linhas, saída idêntica: {'sim' if identica else 'NÃO'}")
+            for rotulo, funcao in (('ModelSerializer', serializar_antigo), ('.values()', serializar_novo)):
+                start = time.perf_counter()
+                for _ in range(options['rounds']):
+                    funcao()
+                elapsed = (time.perf_counter() - start) / options['rounds']
+                self.stdout.write(f'  {rotulo:<16} {elapsed * 1000:9.2f} ms  {len(ids) / elapsed:12.0f} linhas/s')
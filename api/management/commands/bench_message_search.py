@@ -0,0 +1,91 @@
+import random
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Chat, Message, Seller, User
+from api.routers import chat_databases, db_for_buyer, db_for_chat
+from api.search import buscar_mensagens
+
+WORDS = (
+    'produto entrega frete desconto pagamento pix boleto retirada tamanho cor azul verde preto '
+    'usado novo garantia nota fiscal endereço horário amanhã hoje semana valor proposta troca '
+    'bicicleta celular notebook geladeira sofá mesa cadeira tênis camiseta livro'
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede a latência da busca de mensagens com N mensagens sintéticas. '
+        'Tudo roda numa transação desfeita no final; o banco não é alterado.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1_000_000)
+        parser.add_argument('--chats', type=int, default=20_000)
+        parser.add_argument('--user-chats', type=int, default=50, help='Chats do usuário que faz as buscas.')
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        with ExitStack() as stack:
+            aliases = {'default', *chat_databases()}
+            for alias in aliases:
+                stack.enter_context(transaction.atomic(using=alias))
+            start = time.perf_counter()
+            chats, searcher = self.populate(rng, options)
+            self.stdout.write(
+                f"{options['messages']} mensagens em {len(chats)} chats criadas em {time.perf_counter() - start:.1f} s"
+            )
+
+            for label, query in (
+                ('termo comum', 'entrega'), ('dois termos', 'frete pix'), ('prefixo', 'bicic'), ('sem resultado', 'garagem'),
+            ):
+                timings = []
+                for _ in range(options['queries']):
+                    start = time.perf_counter()
+                    buscar_mensagens(searcher, query, limit=21)
+                    timings.append((time.perf_counter() - start) * 1000)
+                timings.sort()
+                p95 = timings[int(len(timings) * 0.95) - 1]
+                self.stdout.write(
+                    f'  {label:<13} "{query}": mediana {statistics.median(timings):7.2f} ms  p95 {p95:7.2f} ms'
+                )
+            for alias in aliases:
+                transaction.set_rollback(True, using=alias)
+
+    def populate(self, rng, options):
+        searcher = User.objects.create_user(email='bench-search@example.com', password=None, name='Bench')
+        other = User.objects.create_user(email='bench-search-seller@example.com', password=None, name='Bench Seller')
+        seller = Seller.objects.create(
+            user=other, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo', neighborhood='Centro'
+        )
+
+        # Cada comprador tem os chats no próprio banco (ver api.routers).
+        chats = []
+        for buyer, count in ((searcher, options['user_chats']), (other, options['chats'] - options['user_chats'])):
+            using = db_for_buyer(buyer.pk)
+            Chat.objects.using(using).bulk_create(
+                [Chat(buyer=buyer, seller=seller) for _ in range(count)], batch_size=options['batch_size'],
+            )
+            chats += Chat.objects.using(using).filter(buyer=buyer).values_list('id', flat=True)
+        seqs = dict.fromkeys(chats, 0)
+
+        remaining = options['messages']
+        while remaining:
+            batches = {}
+            for _ in range(min(remaining, options['batch_size'])):
+                chat_id = rng.choice(chats)
+                seqs[chat_id] += 1
+                text = ' '.join(rng.choices(WORDS, k=rng.randint(4, 20)))
+                batches.setdefault(db_for_chat(chat_id), []).append(
+                    Message(chat_id=chat_id, sender=other, message=text, seq=seqs[chat_id])
+                )
+            for using, batch in batches.items():
+                Message.objects.using(using).bulk_create(batch)
+                remaining -= len(batch)
+        return chats, searcher
@@ -0,0 +1,32 @@
+import time
+
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Mede logins por segundo por núcleo (verificação de senha) para cada hasher configurado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        password = 'senha-de-benchmark'
+        for hasher in get_hashers()[:2]:
+            try:
+                encoded = hasher.encode(password, hasher.salt())
+            except ValueError as e:
+                self.stdout.write(f'{hasher.algorithm}: indisponível ({e})')
+                continue
+
+            start = time.process_time()
+            for _ in range(options['rounds']):
+                hasher.verify(password, encoded)
+            elapsed = time.process_time() - start
+
+            params = {k: v for k, v in hasher.safe_summary(encoded).items() if k not in ('salt', 'hash')}
+            # process_time soma todos os threads; argon2 com parallelism > 1 usa vários núcleos.
+            self.stdout.write(
+                f'{hasher.algorithm}: {options["rounds"] / elapsed:8.1f} logins/s por núcleo '
+                f'({elapsed / options["rounds"] * 1000:.1f} ms de CPU por login) {params}'
+            )
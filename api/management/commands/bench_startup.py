@@ -0,0 +1,85 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Módulos que só podem carregar no primeiro uso (upload de imagem, envio de e-mail, ingestão).
+LAZY_MODULES = (
+    'PIL.Image',
+    'googleapiclient.discovery',
+    'google.oauth2.credentials',
+    'aiohttp',
+)
+
+FIRST_REQUEST_SCRIPT = '''
+import json, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+from django.core.handlers.wsgi import WSGIHandler
+from django.urls import get_resolver
+get_resolver().url_patterns
+boot = time.perf_counter()
+carregados = sorted(m for m in sys.argv[2].split(',') if m in sys.modules)
+handler = WSGIHandler()
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': sys.argv[1], 'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+    'HTTP_HOST': 'localhost', 'wsgi.url_scheme': 'http', 'wsgi.input': sys.stdin.buffer, 'wsgi.errors': sys.stderr,
+}
+handler(environ, lambda status, headers: None)
+fim = time.perf_counter()
+print(json.dumps({'boot_ms': (boot - inicio) * 1000, 'first_request_ms': (fim - inicio) * 1000, 'lazy_loaded': carregados}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede o boot de um processo novo (python -X importtime) e o tempo até a primeira resposta. '
+        'Que os módulos de LAZY_MODULES não carregam no boot é checado em api/tests/test_startup.py.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/categories/')
+        parser.add_argument('--rounds', type=int, default=3)
+        parser.add_argument('--top', type=int, default=15)
+
+    def run_python(self, *args):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'wastee.settings')}
+        result = subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL
+        )
+        if result.returncode != 0:
+            raise CommandError(result.stderr[-2000:])
+        return result
+
+    def handle(self, *args, **options):
+        imports = self.run_python(
+            '-X', 'importtime', '-c', f'import django; django.setup(); import {settings.ROOT_URLCONF}'
+        ).stderr
+        modules = [
+            (int(cumulative), name)
+            for _, cumulative, indent, name in IMPORTTIME_LINE.findall(imports)
+            if len(indent) == 1
+        ]
+        total = sum(cumulative for cumulative, _ in modules)
+        self.stdout.write(f'Imports no boot: {total / 1000:.1f} ms. Mais pesados:')
+        for cumulative, name in sorted(modules, reverse=True)[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} ms  {name}')
+
+        runs = [
+            json.loads(self.run_python('-c', FIRST_REQUEST_SCRIPT, options['path'], ','.join(LAZY_MODULES)).stdout.strip().splitlines()[-1])
+            for _ in range(options['rounds'])
+        ]
+        boot = min(run['boot_ms'] for run in runs)
+        first_request = min(run['first_request_ms'] for run in runs)
+        self.stdout.write(f"Boot: {boot:.1f} ms | até a primeira resposta ({options['path']}): {first_request:.1f} ms")
+
+        loaded = sorted({module for run in runs for module in run['lazy_loaded']})
+        if loaded:
+            self.stdout.write(self.style.WARNING(f"Carregados no boot, antes do primeiro uso: {', '.join(loaded)}"))
@@ -0,0 +1,106 @@
+import multiprocessing
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import executar_em_banco_novo, iniciar_processo
+
+MODES = ('por requisição', 'buffer')
+
+
+def visualizar(tarefa):
+    """Conta `quantidade` visualizações, com poucos produtos concentrando a maior parte, como na vitrine."""
+    from django.db.models import F
+
+    from api.counters import product_views
+    from api.models import Product
+
+    modo, product_ids, quantidade, seed = tarefa
+    sorteio = random.Random(seed)
+    pesos = [1 / (posicao + 1) for posicao in range(len(product_ids))]
+    escolhidos = sorteio.choices(product_ids, weights=pesos, k=quantidade)
+    counter = product_views()
+    flushes = counter.flushes
+    start = time.perf_counter()
+    for product_id in escolhidos:
+        if modo == 'por requisição':
+            Product.objects.filter(pk=product_id).update(view_count=F('view_count') + 1)
+        else:
+            counter.increment(product_id)
+    if modo == 'buffer':
+        # O que o atexit faria ao encerrar o worker.
+        counter.flush()
+    return quantidade, counter.flushes - flushes, time.perf_counter() - start
+
+
+def executar(n_products, writers, views):
+    """Roda no processo filho, com um banco vazio em DATABASE_PATH."""
+    from api.models import Category, Product, Seller, User
+
+    seller = Seller.objects.create(
+        user=User.objects.create_user(email='bench-seller@example.com', password=None, name='Vendedor'),
+        cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo', neighborhood='Centro',
+    )
+    category = Category.objects.create(name='Bench', description='')
+    product_ids = [
+        product.pk for product in Product.objects.bulk_create([
+            Product(title=f'Produto {i}', original_price=10, description='', category=category, seller=seller)
+            for i in range(n_products)
+        ])
+    ]
+
+    resultados = {}
+    por_processo = views // writers
+    contexto = multiprocessing.get_context('spawn')
+    with contexto.Pool(writers, initializer=iniciar_processo) as pool:
+        pool.map(int, range(writers))
+        for modo in MODES:
+            Product.objects.update(view_count=0)
+            start = time.perf_counter()
+            runs = pool.map(visualizar, [(modo, product_ids, por_processo, seed) for seed in range(writers)])
+            elapsed = time.perf_counter() - start
+            contadas = sum(Product.objects.values_list('view_count', flat=True))
+            resultados[modo] = {
+                'views': sum(run[0] for run in runs),
+                'writes': sum(run[0] for run in runs) if modo == 'por requisição' else sum(run[1] for run in runs),
+                'counted': contadas,
+                'seconds': elapsed,
+            }
+    return resultados
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara gravar a visualização do produto a cada requisição com o buffer em memória de '
+        'api.counters (um UPDATE em lote por intervalo), com vários processos contando ao mesmo tempo. '
+        'Roda num banco SQLite novo num diretório temporário.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--writers', type=int, default=4, help='Processos contando em paralelo.')
+        parser.add_argument('--views', type=int, default=20000)
+        parser.add_argument('--interval', type=int, default=10, help='PRODUCT_VIEW_FLUSH_INTERVAL dos processos.')
+        parser.add_argument('--max-pending', type=int, default=1000, help='PRODUCT_VIEW_FLUSH_MAX_PENDING dos processos.')
+
+    def handle(self, *args, **options):
+        resultados = executar_em_banco_novo(
+            __name__, options['products'], options['writers'], options['views'],
+            PRODUCT_VIEW_FLUSH_INTERVAL=str(options['interval']),
+            PRODUCT_VIEW_FLUSH_MAX_PENDING=str(options['max_pending']),
+        )
+        baseline = None
+        for modo, run in resultados.items():
+            rate = run['views'] / run['seconds']
+            baseline = baseline or rate
+            self.stdout.write(
+                f"{modo:<15} {run['views']:>7} visualizações em {run['seconds']:6.2f} s  {rate:9.0f}/s  "
+                f"({rate / baseline:.1f}x)  {run['writes']:>6} UPDATEs  gravadas {run['counted']}"
+            )
+            if run['counted'] != run['views']:
+                raise CommandError(f'{modo}: {run["views"] - run["counted"]} visualizações perdidas.')
+        self.stdout.write(
+            f"Se um processo cair, perde no máximo {options['max_pending']} visualizações "
+            f"(ou as dos últimos {options['interval']} s, se forem menos)."
+        )
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api.ingestion import imagens_externas_pendentes, ingerir_imagens_externas
+
+
+class Command(BaseCommand):
+    help = 'Baixa as imagens externas dos produtos e passa a servi-las do armazenamento local.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--per-host', type=int, default=4)
+        parser.add_argument('--timeout', type=float, default=10)
+
+    def handle(self, *args, **options):
+        opcoes = {
+            'concorrencia': options['concurrency'],
+            'por_host': options['per_host'],
+            'timeout': options['timeout'],
+        }
+        total_ingeridas = total_falhas = 0
+        ultimo_id = 0
+        while True:
+            # Paginação por id: imagens que falharam continuam pendentes e não podem repetir o lote.
+            lote = list(imagens_externas_pendentes().filter(id__gt=ultimo_id).order_by('id')[:options['batch_size']])
+            if not lote:
+                break
+            ultimo_id = lote[-1].id
+            ingeridas, falhas = ingerir_imagens_externas(lote, **opcoes)
+            total_ingeridas += ingeridas
+            total_falhas += falhas
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_ingeridas} imagens ingeridas, {total_falhas} URLs com falha (em cache negativo).'
+        ))
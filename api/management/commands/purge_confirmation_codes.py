@@ -0,0 +1,28 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from api.models import ConfirmationCode
+
+
+class Command(BaseCommand):
+    help = 'Remove em lotes os códigos de confirmação expirados ou já usados.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--grace-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['grace_hours'])
+        stale = ConfirmationCode.objects.filter(Q(expiration_time__lt=cutoff) | Q(is_used=True, created_at__lt=cutoff))
+
+        total = 0
+        while True:
+            ids = list(stale.values_list('id', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            total += ConfirmationCode.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'{total} códigos removidos.'))
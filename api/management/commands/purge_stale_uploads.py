@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ChunkedUpload
+
+
+class Command(BaseCommand):
+    help = 'Remove uploads em partes abandonados (pendentes, interrompidos ou inválidos) e seus arquivos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=24)
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['hours'])
+        stale = ChunkedUpload.objects.filter(status__in=['pending', 'receiving', 'invalid'], updated_at__lt=cutoff)
+
+        total = 0
+        while True:
+            uploads = list(stale[:options['batch_size']])
+            if not uploads:
+                break
+            for upload in uploads:
+                upload.discard()
+            total += ChunkedUpload.objects.filter(pk__in=[upload.pk for upload in uploads]).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(f'{total} uploads removidos.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.models import ProductRanking
+
+
+class Command(BaseCommand):
+    help = 'Recalcula a tabela de ranking da home a partir de comentários e favoritos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        total = ProductRanking.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'{total} produtos ranqueados.'))
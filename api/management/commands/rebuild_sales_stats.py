@@ -0,0 +1,16 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from api.analytics import reconstruir_estatisticas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula as estatísticas diárias de vendedores e produtos a partir dos pedidos e comentários.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=date.fromisoformat, help='Só refaz a partir deste dia (AAAA-MM-DD).')
+
+    def handle(self, *args, **options):
+        rows = reconstruir_estatisticas(options['since'])
+        self.stdout.write(self.style.SUCCESS(f'{rows} linhas de produto por dia recalculadas.'))
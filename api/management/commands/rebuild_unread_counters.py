@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.models import UnreadCounter
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula o total de mensagens não lidas de cada usuário a partir dos contadores dos chats. '
+        'Com CHAT_SHARDS o total fica em outro banco e pode divergir se um processo cair entre os dois commits. '
+        'Uma mensagem enviada durante o recálculo pode deixar diferença de uma, corrigida na próxima execução.'
+    )
+
+    def handle(self, *args, **options):
+        changed = UnreadCounter.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'{changed} totais de não lidas corrigidos.'))
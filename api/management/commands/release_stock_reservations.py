@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from api.models import StockReservation
+
+
+class Command(BaseCommand):
+    help = 'Devolve ao estoque as reservas vencidas que não viraram pedido.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            released = StockReservation.release_expired(limit=options['batch_size'])
+            if not released:
+                break
+            total += released
+
+        self.stdout.write(self.style.SUCCESS(f'{total} reservas devolvidas ao estoque.'))
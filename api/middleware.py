@@ -0,0 +1,176 @@
+import gzip
+import hashlib
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'application/javascript', 'application/xml')
+
+
+def gzip_compress(data):
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def brotli_compress(data):
+    return brotli.compress(data, quality=5)
+
+
+def zstd_compress(data):
+    return zstandard.ZstdCompressor(level=6).compress(data)
+
+
+def available_encoders():
+    encoders = {}
+    if brotli is not None:
+        encoders['br'] = brotli_compress
+    if zstandard is not None:
+        encoders['zstd'] = zstd_compress
+    encoders['gzip'] = gzip_compress
+    return encoders
+
+
+ENCODERS = available_encoders()
+
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_encoding(header, encoders=ENCODERS):
+    accepted = parse_accept_encoding(header)
+    wildcard = accepted.get('*', 0.0)
+    best, best_quality = None, 0.0
+    # Os encoders já estão na ordem de preferência do servidor (br, zstd, gzip).
+    for coding in encoders:
+        quality = accepted.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def gzip_stream(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def brotli_stream(chunks):
+    compressor = brotli.Compressor(quality=5)
+    for chunk in chunks:
+        data = compressor.process(chunk)
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def zstd_stream(chunks):
+    compressor = zstandard.ZstdCompressor(level=6).compressobj()
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def available_stream_encoders():
+    encoders = {}
+    if brotli is not None:
+        encoders['br'] = brotli_stream
+    if zstandard is not None:
+        encoders['zstd'] = zstd_stream
+    encoders['gzip'] = gzip_stream
+    return encoders
+
+
+STREAM_ENCODERS = available_stream_encoders()
+
+
+class CompressionMiddleware:
+    """
+    Comprime respostas com br, zstd ou gzip conforme o Accept-Encoding.
+
+    O corpo comprimido fica no cache indexado pelo hash do corpo original,
+    então respostas quentes e idênticas não são comprimidas duas vezes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.cache_timeout = getattr(settings, 'COMPRESSION_CACHE_TIMEOUT', 300)
+        self.cache_max_size = getattr(settings, 'COMPRESSION_CACHE_MAX_SIZE', 512 * 1024)
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.has_header('Content-Encoding') or response.status_code != 200:
+            return response
+        if not response.get('Content-Type', '').startswith(COMPRESSIBLE_TYPES):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+        if response.streaming:
+            encoding = choose_encoding(accept_encoding, STREAM_ENCODERS)
+            if encoding is None or response.is_async:
+                return response
+            response.streaming_content = STREAM_ENCODERS[encoding](response.streaming_content)
+            del response.headers['Content-Length']
+        else:
+            encoding = choose_encoding(accept_encoding)
+            if encoding is None:
+                return response
+            content = response.content
+            if len(content) < self.min_size:
+                return response
+            compressed = self.compress(content, encoding)
+            if len(compressed) >= len(content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def compress(self, content, encoding):
+        if len(content) > self.cache_max_size:
+            return ENCODERS[encoding](content)
+
+        key = f'compressed:{encoding}:{hashlib.blake2b(content, digest_size=16).hexdigest()}'
+        compressed = cache.get(key)
+        if compressed is None:
+            compressed = ENCODERS[encoding](content)
+            cache.set(key, compressed, self.cache_timeout)
+        return compressed
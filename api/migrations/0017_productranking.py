@@ -0,0 +1,30 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0016_productimage_external_image_url_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='chat',
+            unique_together={('buyer', 'seller', 'product')},
+        ),
+        migrations.CreateModel(
+            name='ProductRanking',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='ranking', serialize=False, to='api.product')),
+                ('score', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rankings', to='api.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score', 'product'], name='ranking_score_idx'), models.Index(fields=['category', '-score', 'product'], name='ranking_category_score_idx'), models.Index(fields=['category', '-product'], name='ranking_category_newest_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:45
+
+from django.db import migrations, models
+
+
+def invalidate_duplicate_active_codes(apps, schema_editor):
+    ConfirmationCode = apps.get_model('api', 'ConfirmationCode')
+    codes = ConfirmationCode.objects.using(schema_editor.connection.alias)
+    latest_ids = {}
+    for code_id, user_id in codes.filter(is_used=False).order_by('created_at', 'id').values_list('id', 'user_id'):
+        latest_ids[user_id] = code_id
+    codes.filter(is_used=False).exclude(id__in=latest_ids.values()).update(is_used=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_productranking'),
+    ]
+
+    operations = [
+        migrations.RunPython(invalidate_duplicate_active_codes, migrations.RunPython.noop, hints={'model_name': 'confirmationcode'}),
+        migrations.AddIndex(
+            model_name='confirmationcode',
+            index=models.Index(fields=['user', 'confirmation_code'], name='confirmation_user_code_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='confirmationcode',
+            index=models.Index(fields=['expiration_time'], name='confirmation_expiration_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='confirmationcode',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_used', False)), fields=('user',), name='unique_active_confirmation_code'),
+        ),
+    ]
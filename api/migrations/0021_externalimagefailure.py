@@ -0,0 +1,23 @@
+# Generated by Django 4.2.1 on 2026-10-19 17:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_imageblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExternalImageFailure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(unique=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('error', models.CharField(max_length=255)),
+                ('retry_after', models.DateTimeField(db_index=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.1 on 2026-10-19 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def mark_existing_messages_read(apps, schema_editor):
+    # Sem histórico de leitura: as mensagens antigas contam como lidas pelos dois participantes.
+    Chat = apps.get_model('api', 'Chat')
+    Message = apps.get_model('api', 'Message')
+    alias = schema_editor.connection.alias
+    latest = Message.objects.using(alias).filter(chat=OuterRef('pk')).values('chat').annotate(last=Max('id')).values('last')
+    Chat.objects.using(alias).update(
+        buyer_last_read_message_id=Coalesce(Subquery(latest), 0),
+        seller_last_read_message_id=Coalesce(Subquery(latest), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_externalimagefailure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnreadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='unread_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='buyer_last_read_message_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='buyer_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='seller_last_read_message_id',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chat',
+            name='seller_unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(mark_existing_messages_read, migrations.RunPython.noop, hints={'model_name': 'chat'}),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.1 on 2026-10-19 18:10
+
+from django.db import migrations, models
+
+
+def number_existing_messages(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    Chat = apps.get_model('api', 'Chat')
+    Message = apps.get_model('api', 'Message')
+    for chat_id in Chat.objects.using(alias).values_list('id', flat=True).iterator():
+        messages = list(Message.objects.using(alias).filter(chat_id=chat_id).order_by('id').only('id'))
+        for seq, message in enumerate(messages, start=1):
+            message.seq = seq
+        Message.objects.using(alias).bulk_update(messages, ['seq'], batch_size=500)
+        Chat.objects.using(alias).filter(pk=chat_id).update(last_message_seq=len(messages))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_chat_read_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chat',
+            name='last_message_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+            preserve_default=False,
+        ),
+        migrations.RunPython(number_existing_messages, migrations.RunPython.noop, hints={'model_name': 'message'}),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('chat', 'seq'), name='message_chat_seq_uniq'),
+        ),
+    ]
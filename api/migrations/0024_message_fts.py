@@ -0,0 +1,51 @@
+# Generated by Django 4.2.1 on 2026-10-19 18:20
+
+from django.db import migrations
+
+# SQL congelado aqui: a migração não pode depender do código atual de api.search.
+FTS_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_message_fts USING fts5("
+    "message, content='api_message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    '''
+    CREATE TRIGGER IF NOT EXISTS api_message_fts_ai AFTER INSERT ON api_message BEGIN
+        INSERT INTO api_message_fts(rowid, message) VALUES (new.id, new.message);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS api_message_fts_ad AFTER DELETE ON api_message BEGIN
+        INSERT INTO api_message_fts(api_message_fts, rowid, message) VALUES ('delete', old.id, old.message);
+    END''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS api_message_fts_au AFTER UPDATE OF message ON api_message BEGIN
+        INSERT INTO api_message_fts(api_message_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        INSERT INTO api_message_fts(rowid, message) VALUES (new.id, new.message);
+    END''',
+    "INSERT INTO api_message_fts(api_message_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS api_message_fts_ai',
+    'DROP TRIGGER IF EXISTS api_message_fts_ad',
+    'DROP TRIGGER IF EXISTS api_message_fts_au',
+    'DROP TABLE IF EXISTS api_message_fts',
+]
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        # Fora do SQLite a busca usa icontains e não há índice para criar.
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0023_message_seq'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FTS_SQL), run(DROP_SQL), hints={'model_name': 'message'}),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-19 21:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_catalog_sync'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='chunkedupload',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('receiving', 'Receiving'), ('complete', 'Complete'), ('attached', 'Attached'), ('invalid', 'Invalid')], default='pending', max_length=10),
+        ),
+    ]
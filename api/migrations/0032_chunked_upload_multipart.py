@@ -0,0 +1,18 @@
+# Generated by Django 4.2.1 on 2026-10-19 21:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0031_chunked_upload_receiving'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunkedupload',
+            name='multipart_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
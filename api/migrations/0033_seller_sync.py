@@ -0,0 +1,27 @@
+# Generated by Django 4.2.1 on 2026-10-19 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0032_chunked_upload_multipart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='seller',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='tombstone',
+            name='kind',
+            field=models.CharField(choices=[('product', 'Product'), ('image', 'Image'), ('category', 'Category'), ('seller', 'Seller')], max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='seller',
+            index=models.Index(fields=['updated_at', 'id'], name='seller_sync_idx'),
+        ),
+    ]
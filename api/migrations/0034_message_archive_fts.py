@@ -0,0 +1,69 @@
+# Generated by Django 4.2.1 on 2026-10-19 22:30
+
+import json
+import zlib
+
+from django.db import migrations
+
+# SQL congelado aqui, como na 0024: não depende do código atual de api.archive.
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_messagearchive_fts USING fts5("
+    "message, content='', tokenize='unicode61 remove_diacritics 2')",
+    'CREATE TABLE IF NOT EXISTS api_messagearchive_fts_map ('
+    'message_id INTEGER PRIMARY KEY, chat_id INTEGER NOT NULL, archive_id INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS api_messagearchive_fts_map_chat ON api_messagearchive_fts_map (chat_id)',
+    'CREATE INDEX IF NOT EXISTS api_messagearchive_fts_map_archive ON api_messagearchive_fts_map (archive_id)',
+]
+
+DROP_SQL = [
+    'DROP TABLE IF EXISTS api_messagearchive_fts_map',
+    'DROP TABLE IF EXISTS api_messagearchive_fts',
+]
+
+
+def descompactar(codec, dados):
+    dados = bytes(dados)
+    if codec == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(dados)
+    return zlib.decompress(dados)
+
+
+def install(apps, schema_editor):
+    # Fora do SQLite a busca varre o arquivo e não há índice para criar.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+    # Indexa os blocos arquivados antes desta migração.
+    MessageArchive = apps.get_model('api', 'MessageArchive')
+    with schema_editor.connection.cursor() as cursor:
+        for archive in MessageArchive.objects.using(schema_editor.connection.alias).iterator():
+            linhas = json.loads(descompactar(archive.codec, archive.data))
+            cursor.executemany(
+                'INSERT INTO api_messagearchive_fts(rowid, message) VALUES (%s, %s)',
+                [(linha['id'], linha['message']) for linha in linhas],
+            )
+            cursor.executemany(
+                'INSERT INTO api_messagearchive_fts_map(message_id, chat_id, archive_id) VALUES (%s, %s, %s)',
+                [(linha['id'], archive.chat_id, archive.pk) for linha in linhas],
+            )
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_seller_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall, hints={'model_name': 'messagearchive'}),
+    ]
@@ -1,8 +1,21 @@
-from django.db import models
+from django.db import DatabaseError, IntegrityError, models, router, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from datetime import timedelta
+import hashlib
+import math
+import os
 import re
+import uuid
 from django.core.exceptions import ValidationError
+from django.db.models.functions import Greatest
 from django.utils import timezone
+from itertools import chain
+from collections import Counter
+
+from .routers import chat_databases, db_for_buyer
 
 class UserManager(BaseUserManager):
     def create_user(self, email, password=None, **extra_fields):
@@ -52,6 +65,17 @@ class ConfirmationCode(models.Model):
     is_used = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'confirmation_code'], name='confirmation_user_code_idx'),
+            models.Index(fields=['expiration_time'], name='confirmation_expiration_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user'], condition=models.Q(is_used=False), name='unique_active_confirmation_code'
+            ),
+        ]
+
 
 class Seller(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -64,6 +88,12 @@ class Seller(models.Model):
     city = models.CharField(max_length=100)
     neighborhood = models.CharField(max_length=100)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='seller_sync_idx'),
+        ]
 
     def clean(self):
         cpf_pattern = re.compile(r'^\d{11}$')
@@ -80,6 +110,12 @@ class Seller(models.Model):
 class Category(models.Model):
     name = models.CharField(max_length=255)
     description = models.TextField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='category_sync_idx'),
+        ]
 
 
 class Product(models.Model):
@@ -94,6 +130,42 @@ class Product(models.Model):
     state = models.CharField(max_length=100)
     city = models.CharField(max_length=100)
     neighborhood = models.CharField(max_length=100)
+    # Unidades disponíveis; None = estoque não controlado.
+    stock = models.PositiveIntegerField(null=True, blank=True)
+    # Gravado em lote por api.counters; pode estar atrasado alguns segundos.
+    view_count = models.PositiveBigIntegerField(default=0)
+    # Sincronização incremental (api.sync); UPDATEs em lote como os de estoque e visualizações não mexem nele.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='product_sync_idx'),
+        ]
+
+    # Colunas escritas por UPDATEs condicionais (estoque, visualizações em lote); save() sem update_fields
+    # só as regrava se o valor mudou desde a leitura.
+    CONDITIONAL_FIELDS = ('stock', 'view_count')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = instance.conditional_values()
+        return instance
+
+    def conditional_values(self):
+        return {name: getattr(self, name) for name in self.CONDITIONAL_FIELDS if name in self.__dict__}
+
+    @classmethod
+    def take_stock(cls, product_id, quantity):
+        """Baixa `quantity` do estoque num único UPDATE condicional; False se não houver o bastante."""
+        return bool(
+            cls.objects.filter(models.Q(stock__isnull=True) | models.Q(stock__gte=quantity), pk=product_id)
+            .update(stock=models.F('stock') - quantity)
+        )
+
+    @classmethod
+    def return_stock(cls, product_id, quantity):
+        cls.objects.filter(pk=product_id, stock__isnull=False).update(stock=models.F('stock') + quantity)
 
     def update_rating(self):
         comments = self.comments.all() 
@@ -102,21 +174,327 @@ class Product(models.Model):
             self.rate = total_rating / comments.count() 
         else:
             self.rate = 0 
-        self.save() 
+        self.save(update_fields=['rate', 'updated_at'])
 
     def save(self, *args, **kwargs):
         if self.seller:
             self.state = self.seller.state
             self.city = self.seller.city
             self.neighborhood = self.seller.neighborhood
-        super().save(*args, **kwargs)
+        if self._state.adding or args or kwargs.get('update_fields') is not None or kwargs.get('force_insert'):
+            super().save(*args, **kwargs)
+        else:
+            self.save_loaded_fields(**kwargs)
+        self._loaded_values = self.conditional_values()
+
+    def save_loaded_fields(self, **kwargs):
+        """
+        save() sem update_fields de um produto já gravado. Não regrava o que os UPDATEs condicionais
+        (CONDITIONAL_FIELDS) escreveram depois da leitura: essas colunas só entram se o valor foi
+        alterado na instância.
+        """
+        deferred = self.get_deferred_fields()
+        loaded = getattr(self, '_loaded_values', {})
+        kwargs['update_fields'] = [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname not in deferred and (
+                field.name not in self.CONDITIONAL_FIELDS
+                or (field.name in loaded and getattr(self, field.name) != loaded[field.name])
+            )
+        ]
+        using = kwargs.get('using') or router.db_for_write(Product, instance=self)
+        try:
+            with transaction.atomic(using=using):
+                super().save(**kwargs)
+        except DatabaseError:
+            # Como num save() comum, a linha removida por outro processo volta com um INSERT.
+            if Product.objects.using(using).filter(pk=self.pk).exists():
+                raise
+            super().save(force_insert=True, using=using)
+
+
+class ImageBlob(models.Model):
+    """Arquivo de imagem guardado uma única vez por conteúdo (BLAKE2b), com contagem de referências."""
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    file = models.CharField(max_length=255)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @staticmethod
+    def compute_digest(content, chunk_size=64 * 1024):
+        digest = getattr(content, 'content_digest', None)
+        if digest:
+            return digest
+        hasher = hashlib.blake2b(digest_size=32)
+        for chunk in iter(lambda: content.read(chunk_size), b''):
+            hasher.update(chunk)
+        content.seek(0)
+        return hasher.hexdigest()
+
+    @classmethod
+    def acquire(cls, digest, content=None, stored_name=None, size=0):
+        """
+        Soma uma referência ao blob do conteúdo. Se ele ainda não existe, grava
+        `content` num caminho derivado do hash ou adota um arquivo já gravado em `stored_name`.
+        """
+        if cls.objects.filter(digest=digest).update(ref_count=models.F('ref_count') + 1):
+            if stored_name:
+                transaction.on_commit(lambda: default_storage.delete(stored_name))
+            return cls.objects.get(digest=digest)
+
+        if stored_name is None:
+            extension = os.path.splitext(content.name or '')[1].lower() or '.jpg'
+            stored_name = default_storage.save(f'product_images/{digest[:2]}/{digest}{extension}', content)
+            size = content.size
+        try:
+            with transaction.atomic():
+                return cls.objects.create(digest=digest, file=stored_name, size=size, ref_count=1)
+        except IntegrityError:
+            # Outra requisição criou o mesmo blob ao mesmo tempo.
+            transaction.on_commit(lambda: default_storage.delete(stored_name))
+            cls.objects.filter(digest=digest).update(ref_count=models.F('ref_count') + 1)
+            return cls.objects.get(digest=digest)
+
+    @classmethod
+    def release(cls, digest, count=1):
+        cls.objects.filter(digest=digest).update(ref_count=models.F('ref_count') - count)
+        orphan = cls.objects.filter(digest=digest, ref_count=0).values_list('file', flat=True).first()
+        if orphan and cls.objects.filter(digest=digest, ref_count=0).delete()[0]:
+            transaction.on_commit(lambda: default_storage.delete(orphan))
 
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='product_images/', blank=True, null=True)
     external_image_url = models.URLField(blank=True, null=True)
-    
+    blob = models.ForeignKey(ImageBlob, related_name='images', null=True, blank=True, on_delete=models.SET_NULL)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='productimage_sync_idx'),
+        ]
+
+
+class Tombstone(models.Model):
+    """Registro de uma deleção no catálogo, para a sincronização incremental avisar o app (api.sync)."""
+
+    KIND_CHOICES = [
+        ('product', 'Product'),
+        ('image', 'Image'),
+        ('category', 'Category'),
+        ('seller', 'Seller'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at', 'id'], name='tombstone_sync_idx'),
+        ]
+
+class ExternalImageFailure(models.Model):
+    """Cache negativo de URLs externas que falharam: só são buscadas de novo depois de retry_after."""
+
+    url = models.URLField(unique=True)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.CharField(max_length=255)
+    retry_after = models.DateTimeField(db_index=True)
+
+    @classmethod
+    def record(cls, url, error):
+        failure, _ = cls.objects.get_or_create(url=url, defaults={'retry_after': timezone.now()})
+        failure.attempts += 1
+        failure.error = error[:255]
+        # Espera dobra a cada falha seguida, até o teto.
+        delay = min(
+            settings.EXTERNAL_IMAGE_NEGATIVE_CACHE_TTL * 2 ** (failure.attempts - 1),
+            settings.EXTERNAL_IMAGE_NEGATIVE_CACHE_MAX_TTL,
+        )
+        failure.retry_after = timezone.now() + timedelta(seconds=delay)
+        failure.save(update_fields=['attempts', 'error', 'retry_after'])
+        return failure
+
+
+class ChunkedUpload(models.Model):
+    PURPOSE_DIRECTORIES = {
+        'product_image': 'product_images/',
+        'seller_rg': 'seller_documents/rg/',
+        'seller_selfie': 'seller_documents/selfie/',
+    }
+    PURPOSE_CHOICES = [
+        ('product_image', 'Product image'),
+        ('seller_rg', 'Seller RG'),
+        ('seller_selfie', 'Seller selfie'),
+    ]
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('receiving', 'Receiving'),
+        ('complete', 'Complete'),
+        ('attached', 'Attached'),
+        ('invalid', 'Invalid'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, related_name='uploads', on_delete=models.CASCADE)
+    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
+    filename = models.CharField(max_length=255)
+    file = models.CharField(max_length=255, blank=True)
+    multipart_id = models.CharField(max_length=255, blank=True)
+    total_size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    digest = models.CharField(max_length=64, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_at'], name='upload_status_updated_idx'),
+        ]
+
+    @staticmethod
+    def storage_is_local():
+        try:
+            default_storage.path('')
+        except NotImplementedError:
+            return False
+        return True
+
+    @staticmethod
+    def s3_client():
+        return default_storage.connection.meta.client
+
+    @property
+    def s3_key(self):
+        return default_storage._normalize_name(self.file)
+
+    def reserve_file(self):
+        directory = self.PURPOSE_DIRECTORIES[self.purpose]
+        name = default_storage.get_valid_name(os.path.basename(self.filename)) or 'upload'
+        if self.storage_is_local():
+            self.file = default_storage.save(f'{directory}{self.id.hex}_{name}', ContentFile(b''))
+        else:
+            # Object storage não aceita append: as partes vão para um multipart upload do S3, que
+            # qualquer instância pode continuar.
+            self.file = f'{directory}{self.id.hex}_{name}'
+            self.multipart_id = self.s3_client().create_multipart_upload(
+                Bucket=default_storage.bucket_name, Key=self.s3_key, **default_storage._get_write_parameters(self.s3_key),
+            )['UploadId']
+
+    def chunk_fits(self, offset, length):
+        """No S3 toda parte, exceto a última, tem exatamente CHUNKED_UPLOAD_MAX_CHUNK_SIZE bytes."""
+        if self.storage_is_local():
+            return True
+        part_size = settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE
+        return offset % part_size == 0 and (length == part_size or offset + length == self.total_size)
+
+    def open_destination(self):
+        return default_storage.open(self.file, 'ab')
+
+    def open_received(self):
+        return default_storage.open(self.file, 'rb')
+
+    @classmethod
+    def claim_chunk(cls, pk, offset):
+        """
+        Reserva num UPDATE condicional a parte que começa em `offset`, antes de gravar qualquer byte:
+        de dois PUTs com o mesmo offset só um passa. Retorna o momento da reserva, ou None.
+        Reserva mais velha que CHUNKED_UPLOAD_CLAIM_TIMEOUT é de um worker que caiu e pode ser retomada.
+        """
+        now = timezone.now()
+        stale = now - timedelta(seconds=settings.CHUNKED_UPLOAD_CLAIM_TIMEOUT)
+        claimed = cls.objects.filter(
+            models.Q(status='pending') | models.Q(status='receiving', updated_at__lt=stale), pk=pk, offset=offset,
+        ).update(status='receiving', updated_at=now)
+        return now if claimed else None
+
+    def release_chunk(self, claimed_at):
+        type(self).objects.filter(pk=self.pk, status='receiving', updated_at=claimed_at).update(status='pending')
+
+    def append(self, stream, offset, length, block_size=64 * 1024):
+        """Grava a parte que começa em `offset`; devolve quantos bytes foram gravados."""
+        if not self.storage_is_local():
+            # Uma parte do S3 não pode ficar pela metade: se o corpo veio curto, nada é gravado.
+            data = stream.read(length)
+            if len(data) < length:
+                return 0
+            self.s3_client().upload_part(
+                Bucket=default_storage.bucket_name, Key=self.s3_key, UploadId=self.multipart_id,
+                PartNumber=offset // settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE + 1, Body=data,
+            )
+            return length
+
+        # Descarta bytes de uma gravação anterior que falhou no meio.
+        os.truncate(default_storage.path(self.file), offset)
+        # Grava direto no arquivo de destino, em blocos, sem montar a parte na memória.
+        written = 0
+        with self.open_destination() as destination:
+            while written < length:
+                data = stream.read(min(block_size, length - written))
+                if not data:
+                    break
+                destination.write(data)
+                written += len(data)
+        return written
+
+    def assemble(self):
+        """Junta as partes enviadas ao S3 num objeto só; no disco local o arquivo já está montado."""
+        if self.storage_is_local():
+            return
+        client = self.s3_client()
+        parts = [
+            {'PartNumber': part['PartNumber'], 'ETag': part['ETag']}
+            for page in client.get_paginator('list_parts').paginate(
+                Bucket=default_storage.bucket_name, Key=self.s3_key, UploadId=self.multipart_id,
+            )
+            for part in page.get('Parts', [])
+        ]
+        client.complete_multipart_upload(
+            Bucket=default_storage.bucket_name, Key=self.s3_key, UploadId=self.multipart_id,
+            MultipartUpload={'Parts': parts},
+        )
+        self.multipart_id = ''
+
+    def finalize(self):
+        with self.open_received() as received:
+            self.digest = ImageBlob.compute_digest(received)
+
+    def discard(self):
+        if self.multipart_id:
+            self.s3_client().abort_multipart_upload(
+                Bucket=default_storage.bucket_name, Key=self.s3_key, UploadId=self.multipart_id,
+            )
+            self.multipart_id = ''
+        elif self.file:
+            default_storage.delete(self.file)
+
+    @classmethod
+    def claim(cls, user, upload_ids, purpose):
+        """Marca os uploads completos como anexados e os devolve, ou None se algum for inválido."""
+        if not isinstance(upload_ids, (list, tuple)):
+            return None
+        upload_ids = list(dict.fromkeys(str(upload_id) for upload_id in upload_ids))
+        if not upload_ids:
+            return []
+        try:
+            uuids = [uuid.UUID(upload_id) for upload_id in upload_ids]
+        except ValueError:
+            return None
+
+        with transaction.atomic():
+            uploads = cls.objects.filter(id__in=uuids, user=user, purpose=purpose, status='complete')
+            claimed = uploads.in_bulk()
+            if len(claimed) != len(uuids) or uploads.update(status='attached') != len(uuids):
+                transaction.set_rollback(True)
+                return None
+        return [claimed[upload_id] for upload_id in uuids]
+
+
 class Comment(models.Model):
     product = models.ForeignKey(Product, related_name='comments', on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -132,6 +510,53 @@ class Order(models.Model):
     status = models.CharField(max_length=10, choices=[('pending', 'Pending'), ('shipped', 'Shipped'), ('delivered', 'Delivered'), ('canceled', 'Canceled')])
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Pedidos nesses status entram nas estatísticas de venda (ver api.analytics).
+    SALE_STATUSES = ('pending', 'shipped', 'delivered')
+
+    @classmethod
+    def place(cls, user, items, status='pending'):
+        """
+        Cria o pedido e os itens numa transação. `items` são tuplas (produto, quantidade, reserva ou None);
+        sem reserva o estoque é baixado na hora. Se faltar estoque em algum item, nada é gravado e retorna None.
+        """
+        with transaction.atomic():
+            order = cls.objects.create(user=user, status=status, total_price=0)
+            total = 0
+            for product, quantity, reservation in items:
+                if reservation is not None:
+                    reserved = reservation.confirm(order)
+                else:
+                    reserved = Product.take_stock(product.pk, quantity)
+                if not reserved:
+                    transaction.set_rollback(True)
+                    return None
+                price = product.discounted_price or product.original_price
+                OrderItem.objects.create(order=order, product=product, quantity=quantity, price=price)
+                total += price * quantity
+            order.total_price = total
+            order.save(update_fields=['total_price'])
+        return order
+
+    @classmethod
+    def lock(cls, pk):
+        """
+        Trava o pedido até o fim da transação e devolve o status atual. O UPDATE sem efeito faz o papel do
+        select_for_update, que no SQLite não trava nada.
+        """
+        cls.objects.filter(pk=pk).update(status=models.F('status'))
+        return cls.objects.values_list('status', flat=True).get(pk=pk)
+
+    def switch_stock(self, previous, current):
+        """Devolve o estoque dos itens quando o pedido passa a 'canceled' e baixa de novo se ele voltar; False se faltar."""
+        if (previous == 'canceled') == (current == 'canceled'):
+            return True
+        for product_id, quantity in OrderItem.objects.filter(order=self).values_list('product_id', 'quantity'):
+            if current == 'canceled':
+                Product.return_stock(product_id, quantity)
+            elif not Product.take_stock(product_id, quantity):
+                return False
+        return True
+
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
@@ -139,6 +564,78 @@ class OrderItem(models.Model):
     quantity = models.IntegerField()
     price = models.DecimalField(max_digits=10, decimal_places=2)
 
+    @classmethod
+    def held_stock(cls, pk):
+        """(produto, unidades) que o item segura do estoque; itens de pedido cancelado não seguram nada."""
+        item = cls.objects.filter(pk=pk).values('product_id', 'quantity', 'order__status').get()
+        return item['product_id'], 0 if item['order__status'] == 'canceled' else item['quantity']
+
+
+class StockReservation(models.Model):
+    """Estoque separado para um comprador até `expires_at`; sem confirmação volta ao produto (release_stock_reservations)."""
+
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('confirmed', 'Confirmed'),
+        ('released', 'Released'),
+    ]
+
+    product = models.ForeignKey(Product, related_name='reservations', on_delete=models.CASCADE)
+    user = models.ForeignKey(User, related_name='stock_reservations', on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, null=True, blank=True, related_name='reservations', on_delete=models.SET_NULL)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_status_expires_idx'),
+        ]
+
+    @classmethod
+    def reserve(cls, user, product_id, quantity, ttl=None):
+        """Baixa o estoque e cria a reserva; None se não houver estoque suficiente."""
+        ttl = settings.STOCK_RESERVATION_TTL if ttl is None else ttl
+        with transaction.atomic():
+            if not Product.take_stock(product_id, quantity):
+                # Reservas vencidas que o sweeper ainda não viu seguram estoque: devolve as deste produto e tenta de novo.
+                if not cls.release_expired(product_id=product_id) or not Product.take_stock(product_id, quantity):
+                    return None
+            return cls.objects.create(
+                user=user, product_id=product_id, quantity=quantity, expires_at=timezone.now() + timedelta(seconds=ttl)
+            )
+
+    def confirm(self, order):
+        """Liga a reserva ao pedido. Se ela já venceu e foi devolvida, tenta baixar o estoque de novo."""
+        with transaction.atomic():
+            updated = StockReservation.objects.filter(pk=self.pk, status='active').update(status='confirmed', order=order)
+            if not updated:
+                updated = StockReservation.objects.filter(pk=self.pk, status='released').update(
+                    status='confirmed', order=order
+                ) and Product.take_stock(self.product_id, self.quantity)
+                if not updated:
+                    transaction.set_rollback(True)
+                    return False
+        self.status, self.order = 'confirmed', order
+        return True
+
+    def release(self):
+        with transaction.atomic():
+            # A troca de status é a trava: só quem muda de active para released devolve o estoque.
+            if not StockReservation.objects.filter(pk=self.pk, status='active').update(status='released'):
+                return False
+            Product.return_stock(self.product_id, self.quantity)
+        self.status = 'released'
+        return True
+
+    @classmethod
+    def release_expired(cls, product_id=None, limit=None):
+        expired = cls.objects.filter(status='active', expires_at__lte=timezone.now())
+        if product_id is not None:
+            expired = expired.filter(product_id=product_id)
+        return sum(reservation.release() for reservation in expired.only('id', 'product_id', 'quantity')[:limit])
+
 
 class Favorite(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -146,17 +643,353 @@ class Favorite(models.Model):
     favorited_at = models.DateTimeField(auto_now_add=True)
 
 
+class ChatShardManager(models.Manager):
+    def create(self, **kwargs):
+        # Sem .using() explícito, grava no banco que o roteador escolhe para a instância (shard do chat).
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True, using=router.db_for_write(self.model, instance=obj))
+        return obj
+
+
+# Chats e mensagens podem ficar em outros bancos (ver api.routers): as chaves para usuário, vendedor
+# e produto não têm constraint no banco e a remoção em cascata é feita pelos sinais.
 class Chat(models.Model):
-    buyer = models.ForeignKey(User, related_name='chats_as_buyer', on_delete=models.CASCADE)
-    seller = models.ForeignKey(Seller, related_name='chats_as_seller', on_delete=models.CASCADE)
-    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.CASCADE)
+    buyer = models.ForeignKey(User, related_name='chats_as_buyer', on_delete=models.DO_NOTHING, db_constraint=False)
+    seller = models.ForeignKey(Seller, related_name='chats_as_seller', on_delete=models.DO_NOTHING, db_constraint=False)
+    product = models.ForeignKey(Product, null=True, blank=True, on_delete=models.DO_NOTHING, db_constraint=False)
     started_at = models.DateTimeField(auto_now_add=True)
+    # Estado de leitura de cada participante: id da última mensagem lida e mensagens do outro depois dela.
+    buyer_last_read_message_id = models.PositiveBigIntegerField(default=0)
+    seller_last_read_message_id = models.PositiveBigIntegerField(default=0)
+    buyer_unread_count = models.PositiveIntegerField(default=0)
+    seller_unread_count = models.PositiveIntegerField(default=0)
+    last_message_seq = models.PositiveBigIntegerField(default=0)
+
+    objects = ChatShardManager()
 
     class Meta:
         unique_together = ('buyer', 'seller', 'product')
 
+    @classmethod
+    def ids_for_user(cls, user, using):
+        """Chats do usuário no banco `using` como comprador ou vendedor: UNION de duas buscas indexadas, em vez de um OR."""
+        sellers = list(Seller.objects.filter(user=user).values_list('id', flat=True))
+        chats = cls.objects.using(using)
+        return chats.filter(buyer=user).values('id').union(chats.filter(seller_id__in=sellers).values('id'))
+
+    @classmethod
+    def for_user(cls, user):
+        # Cada banco de chat tem sua faixa de ids, então concatenar na ordem dos bancos já mantém a ordem por id.
+        return list(chain.from_iterable(
+            cls.objects.using(alias).filter(id__in=cls.ids_for_user(user, alias)).order_by('id')
+            for alias in chat_databases()
+        ))
+
+    @classmethod
+    def of_buyer(cls, buyer_id):
+        """Chats do comprador: ficam todos no mesmo banco, escolhido pelo id dele."""
+        return cls.objects.using(db_for_buyer(buyer_id)).filter(buyer_id=buyer_id)
+
+    @classmethod
+    def next_message_seq(cls, chat_id, using):
+        # O UPDATE trava a linha do chat até o fim da transação, então a sequência não repete nem pula.
+        chats = cls.objects.using(using).filter(pk=chat_id)
+        chats.update(last_message_seq=models.F('last_message_seq') + 1)
+        return chats.values_list('last_message_seq', flat=True).get()
+
+    def role_of(self, user_id):
+        if user_id == self.buyer_id:
+            return 'buyer'
+        if user_id == self.seller.user_id:
+            return 'seller'
+        return None
+
+    @staticmethod
+    def recipient_of(message, chat):
+        """(papel, id do usuário) de quem recebe a mensagem; `chat` é um dict com buyer_id e seller_id."""
+        if message.sender_id == chat['buyer_id']:
+            return 'seller', Seller.objects.filter(pk=chat['seller_id']).values_list('user_id', flat=True).get()
+        return 'buyer', chat['buyer_id']
+
+    @staticmethod
+    def add_unread(user_id, delta, using):
+        """
+        Soma `delta` ao UnreadCounter, que fica no banco padrão. Com o chat no mesmo banco é a mesma
+        transação; com shards (CHAT_SHARDS) só depois do commit do shard, e uma queda entre os dois
+        commits deixa o total divergente até rodar rebuild_unread_counters.
+        """
+        if router.db_for_write(UnreadCounter) == using:
+            UnreadCounter.add(user_id, delta)
+        else:
+            transaction.on_commit(lambda: UnreadCounter.add(user_id, delta), using=using)
+
+    @classmethod
+    def message_added(cls, message):
+        chats = cls.objects.using(message._state.db).filter(pk=message.chat_id)
+        role, recipient_id = cls.recipient_of(message, chats.values('buyer_id', 'seller_id').get())
+        chats.update(**{f'{role}_unread_count': models.F(f'{role}_unread_count') + 1})
+        cls.add_unread(recipient_id, 1, message._state.db)
+
+    @classmethod
+    def message_removed(cls, message):
+        chats = cls.objects.using(message._state.db).filter(pk=message.chat_id)
+        chat = chats.values('buyer_id', 'seller_id', 'buyer_last_read_message_id', 'seller_last_read_message_id').first()
+        if chat is None:
+            return
+        role, recipient_id = cls.recipient_of(message, chat)
+        if message.id <= chat[f'{role}_last_read_message_id']:
+            return
+        counter = f'{role}_unread_count'
+        if chats.filter(**{f'{counter}__gt': 0}).update(**{counter: models.F(counter) - 1}):
+            cls.add_unread(recipient_id, -1, message._state.db)
+
+    def mark_read(self, user_id, message_id=None):
+        """Avança o ponteiro de leitura do participante e recalcula o contador; retorna (ponteiro, não lidas)."""
+        role = self.role_of(user_id)
+        pointer_field, counter_field = f'{role}_last_read_message_id', f'{role}_unread_count'
+        using = router.db_for_write(Chat, instance=self)
+        with transaction.atomic(using=using):
+            # Trava a linha do chat: mensagens novas esperam o recálculo terminar.
+            chat = Chat.objects.using(using).select_for_update().get(pk=self.pk)
+            latest = chat.messages.order_by('-id').values_list('id', flat=True).first() or 0
+            target = latest if message_id is None else min(message_id, latest)
+            pointer = max(getattr(chat, pointer_field), target)
+            unread = chat.messages.filter(id__gt=pointer).exclude(sender_id=user_id).count()
+            Chat.objects.using(using).filter(pk=self.pk).update(**{pointer_field: pointer, counter_field: unread})
+            Chat.add_unread(user_id, unread - getattr(chat, counter_field), using)
+        setattr(self, pointer_field, pointer)
+        setattr(self, counter_field, unread)
+        return pointer, unread
+
 class Message(models.Model):
     chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='messages')
-    sender = models.ForeignKey(User, on_delete=models.CASCADE)
+    sender = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False)
     message = models.TextField()
     sent_at = models.DateTimeField(auto_now_add=True)
+    # Sequência densa por chat (1, 2, 3...): clientes sincronizam com seq > N e detectam lacunas.
+    seq = models.PositiveBigIntegerField(editable=False)
+
+    objects = ChatShardManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['chat', 'seq'], name='message_chat_seq_uniq'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.seq is None:
+            using = kwargs.get('using') or router.db_for_write(Message, instance=self)
+            with transaction.atomic(using=using):
+                self.seq = Chat.next_message_seq(self.chat_id, using)
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
+
+class MessageArchive(models.Model):
+    """Mensagens antigas de um chat num mês, como JSON comprimido (ver api.archive e archive_messages)."""
+
+    chat = models.ForeignKey(Chat, on_delete=models.CASCADE, related_name='archives')
+    month = models.DateField()
+    first_seq = models.PositiveBigIntegerField()
+    last_seq = models.PositiveBigIntegerField()
+    message_count = models.PositiveIntegerField()
+    codec = models.CharField(max_length=10)
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChatShardManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['chat', 'first_seq'], name='message_archive_chat_seq_idx'),
+        ]
+
+
+class UnreadCounter(models.Model):
+    """Total de mensagens não lidas do usuário em todos os chats; o badge lê só esta linha."""
+
+    user = models.OneToOneField(User, primary_key=True, related_name='unread_counter', on_delete=models.CASCADE)
+    total = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def add(cls, user_id, delta):
+        if not delta:
+            return
+        if cls.objects.filter(user_id=user_id).update(total=Greatest(models.F('total') + delta, 0)) or delta < 0:
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, total=delta)
+        except IntegrityError:
+            cls.objects.filter(user_id=user_id).update(total=models.F('total') + delta)
+
+    @classmethod
+    def total_for(cls, user_id):
+        return cls.objects.filter(user_id=user_id).values_list('total', flat=True).first() or 0
+
+    @classmethod
+    def rebuild(cls):
+        """Recalcula os totais a partir dos contadores de cada chat, em todos os shards; devolve quantos usuários mudaram."""
+        seller_users = dict(Seller.objects.values_list('id', 'user_id'))
+        totals = Counter()
+        for alias in chat_databases():
+            chats = Chat.objects.using(alias)
+            for role in ('buyer', 'seller'):
+                rows = chats.filter(**{f'{role}_unread_count__gt': 0}).values(f'{role}_id').annotate(
+                    unread=models.Sum(f'{role}_unread_count')
+                ).values_list(f'{role}_id', 'unread')
+                for owner_id, unread in rows:
+                    user_id = owner_id if role == 'buyer' else seller_users.get(owner_id)
+                    if user_id is not None:
+                        totals[user_id] += unread
+
+        current = dict(cls.objects.values_list('user_id', 'total'))
+        users = set(User.objects.filter(pk__in=current.keys() | totals.keys()).values_list('pk', flat=True))
+        changed = 0
+        for user_id in users:
+            if current.get(user_id, 0) != totals[user_id]:
+                cls.objects.update_or_create(user_id=user_id, defaults={'total': totals[user_id]})
+                changed += 1
+        return changed
+
+
+class DailyStats(models.Model):
+    """Totais de um dia; as linhas só mudam por soma de deltas (add), então escritas concorrentes não se perdem."""
+
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_count = models.IntegerField(default=0)
+
+    METRICS = ('revenue', 'units', 'rating_sum', 'rating_count')
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def add(cls, day, deltas, **key):
+        deltas = {field: value for field, value in deltas.items() if value}
+        if not deltas:
+            return
+        changes = {field: models.F(field) + value for field, value in deltas.items()}
+        # Subtração sem linha não cria nada: ela pode ter sido apagada em cascata com o produto ou o vendedor.
+        if cls.objects.filter(day=day, **key).update(**changes) or not any(value > 0 for value in deltas.values()):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(day=day, **key, **deltas)
+        except IntegrityError:
+            cls.objects.filter(day=day, **key).update(**changes)
+
+
+class SellerDailyStats(DailyStats):
+    seller = models.ForeignKey(Seller, related_name='daily_stats', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['seller', 'day'], name='seller_daily_stats_uniq'),
+        ]
+
+
+class ProductDailyStats(DailyStats):
+    product = models.ForeignKey(Product, related_name='daily_stats', on_delete=models.CASCADE)
+    seller = models.ForeignKey(Seller, related_name='product_daily_stats', on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='product_daily_stats_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['seller', 'day'], name='product_stats_seller_day_idx'),
+        ]
+
+
+class ProductRanking(models.Model):
+    RATING_PRIOR = 3.0
+    PRIOR_WEIGHT = 5
+    FAVORITE_WEIGHT = 0.05
+    VIEW_WEIGHT = 0.1
+
+    product = models.OneToOneField(Product, primary_key=True, related_name='ranking', on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, related_name='rankings', on_delete=models.CASCADE)
+    score = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score', 'product'], name='ranking_score_idx'),
+            models.Index(fields=['category', '-score', 'product'], name='ranking_category_score_idx'),
+            models.Index(fields=['category', '-product'], name='ranking_category_newest_idx'),
+        ]
+
+    @classmethod
+    def compute_score(cls, rating_sum, rating_count, favorite_count, view_count=0):
+        rating = (cls.RATING_PRIOR * cls.PRIOR_WEIGHT + (rating_sum or 0)) / (cls.PRIOR_WEIGHT + rating_count)
+        # Visualizações em escala log: mil visitas não devem valer mais que boas avaliações.
+        return round(rating + cls.FAVORITE_WEIGHT * favorite_count + cls.VIEW_WEIGHT * math.log1p(view_count), 6)
+
+    @classmethod
+    def refresh_for(cls, product_id):
+        product = Product.objects.filter(pk=product_id).values('category_id', 'view_count').first()
+        if product is None:
+            cls.objects.filter(product_id=product_id).delete()
+            return None
+
+        ratings = Comment.objects.filter(product_id=product_id).aggregate(
+            rating_sum=models.Sum('rating'), rating_count=models.Count('id')
+        )
+        favorite_count = Favorite.objects.filter(product_id=product_id).count()
+        score = cls.compute_score(ratings['rating_sum'], ratings['rating_count'], favorite_count, product['view_count'])
+
+        ranking, _ = cls.objects.update_or_create(
+            product_id=product_id,
+            defaults={'category_id': product['category_id'], 'score': score},
+        )
+        return ranking
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        ratings = {
+            row['product_id']: row
+            for row in Comment.objects.values('product_id').annotate(
+                rating_sum=models.Sum('rating'), rating_count=models.Count('id')
+            )
+        }
+        favorites = dict(
+            Favorite.objects.values('product_id').annotate(total=models.Count('id')).values_list('product_id', 'total')
+        )
+
+        total = 0
+        batch = []
+        products = Product.objects.values_list('id', 'category_id', 'view_count').iterator(chunk_size=batch_size)
+        for product_id, category_id, view_count in products:
+            rating = ratings.get(product_id, {'rating_sum': 0, 'rating_count': 0})
+            score = cls.compute_score(
+                rating['rating_sum'], rating['rating_count'], favorites.get(product_id, 0), view_count
+            )
+            batch.append(cls(product_id=product_id, category_id=category_id, score=score))
+            if len(batch) >= batch_size:
+                total += cls.upsert(batch)
+                batch = []
+        if batch:
+            total += cls.upsert(batch)
+
+        cls.objects.exclude(product_id__in=Product.objects.values('id')).delete()
+        return total
+
+    @classmethod
+    def upsert(cls, rankings):
+        now = timezone.now()
+        for ranking in rankings:
+            ranking.updated_at = now
+        cls.objects.bulk_create(
+            rankings,
+            update_conflicts=True,
+            unique_fields=['product'],
+            update_fields=['category', 'score', 'updated_at'],
+        )
+        return len(rankings)
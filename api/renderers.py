@@ -0,0 +1,66 @@
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+else:
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def encode_json(data):
+    """
+    JSON compacto em UTF-8, igual ao do JSONRenderer do DRF. Com orjson, datas e horas passam pelo
+    JSONEncoder do DRF (o formato nativo do orjson é outro) e chaves não-str viram str como no json;
+    o que o orjson não aceita (inteiros acima de 64 bits, por exemplo) cai para o json da biblioteca padrão.
+    """
+    if orjson is not None:
+        try:
+            conteudo = orjson.dumps(data, default=JSONEncoder().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            pass
+        else:
+            return conteudo.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    conteudo = json.dumps(data, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'), allow_nan=False)
+    # Como o JSONRenderer: U+2028 e U+2029 escapados para o JSON poder ir dentro de <script>.
+    return conteudo.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return encode_json(data)
+
+
+class StreamingJSONResponse(StreamingHttpResponse):
+    """Serializa o queryset em lotes e envia um array JSON sem montá-lo inteiro na memória."""
+
+    def __init__(self, queryset, serializer_class, context=None, chunk_size=500, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(self.stream(queryset, serializer_class, context or {}, chunk_size), **kwargs)
+
+    @staticmethod
+    def stream(queryset, serializer_class, context, chunk_size):
+        yield b'['
+        first = True
+        batch = []
+        for obj in queryset.iterator(chunk_size=chunk_size):
+            batch.append(obj)
+            if len(batch) < chunk_size:
+                continue
+            yield StreamingJSONResponse.encode_batch(batch, serializer_class, context, first)
+            first = False
+            batch = []
+        if batch:
+            yield StreamingJSONResponse.encode_batch(batch, serializer_class, context, first)
+        yield b']'
+
+    @staticmethod
+    def encode_batch(batch, serializer_class, context, first):
+        items = encode_json(serializer_class(batch, many=True, context=context).data)[1:-1]
+        return items if first else b',' + items
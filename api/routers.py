@@ -0,0 +1,98 @@
+"""
+Roteamento de Chat, Message e MessageArchive para os bancos de chat (settings.CHAT_DATABASES).
+
+Com mais de um banco, cada shard numera chats e mensagens a partir de `índice << SHARD_BITS`,
+então o id já diz em qual shard a linha está. Chats novos vão para o shard do comprador, e as
+mensagens e arquivos seguem o chat.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+SHARD_BITS = 40
+CHAT_MODELS = {'chat', 'message', 'messagearchive'}
+CHAT_TABLES = ('api_chat', 'api_message', 'api_messagearchive')
+
+
+def chat_databases():
+    return settings.CHAT_DATABASES
+
+
+def db_for_chat(chat_id):
+    databases = chat_databases()
+    return databases[min(int(chat_id) >> SHARD_BITS, len(databases) - 1)]
+
+
+def db_for_buyer(buyer_id):
+    databases = chat_databases()
+    return databases[int(buyer_id) % len(databases)]
+
+
+# Mensagens usam a mesma faixa de ids do shard.
+db_for_message = db_for_chat
+
+
+def is_chat_model(model):
+    return model._meta.app_label == 'api' and model._meta.model_name in CHAT_MODELS
+
+
+def ajustar_sequencias(using):
+    """Faz os ids do shard começarem em `índice << SHARD_BITS` (só quando há mais de um banco de chat)."""
+    databases = chat_databases()
+    if len(databases) < 2 or using not in databases:
+        return
+    offset = databases.index(using) << SHARD_BITS
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for table in CHAT_TABLES:
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [table, offset])
+                elif row[0] < offset:
+                    cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [offset, table])
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {table})))",
+                    [table, offset],
+                )
+
+
+class ChatRouter:
+    def db_for_instance(self, instance):
+        # Em instâncias novas o _state.db pode ter vindo da atribuição de um objeto relacionado.
+        if not instance._state.adding and instance._state.db in chat_databases():
+            return instance._state.db
+        model_name = instance._meta.model_name
+        if model_name == 'chat':
+            if instance.pk:
+                return db_for_chat(instance.pk)
+            if instance.buyer_id:
+                return db_for_buyer(instance.buyer_id)
+        elif instance.chat_id:
+            return db_for_chat(instance.chat_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        if not is_chat_model(model):
+            # Sem isso, relações a partir de um chat cairiam no banco do chat.
+            return DEFAULT_DB_ALIAS
+        instance = hints.get('instance')
+        if instance is not None and is_chat_model(type(instance)):
+            return self.db_for_instance(instance) or chat_databases()[0]
+        return chat_databases()[0]
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_chat_model(type(obj1)) or is_chat_model(type(obj2)):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        chat_only = set(chat_databases()) - {DEFAULT_DB_ALIAS}
+        if app_label == 'api' and model_name in CHAT_MODELS:
+            return db in chat_databases()
+        if model_name is None and app_label == 'api':
+            return None
+        return db not in chat_only
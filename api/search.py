@@ -0,0 +1,185 @@
+"""
+Busca textual nas mensagens dos chats do usuário.
+
+No SQLite usa um índice FTS5 de conteúdo externo (api_message_fts) mantido por triggers a cada
+insert, update e delete em api_message, e o índice das mensagens arquivadas (ver api.archive).
+Em outros bancos cai para icontains e varre o arquivo.
+"""
+import html
+import re
+from collections import defaultdict
+
+from django.db import connections
+
+from . import archive
+from .models import Chat, Message
+from .routers import chat_databases
+
+FTS_TABLE = 'api_message_fts'
+SNIPPET_START, SNIPPET_END = '\x02', '\x03'
+SNIPPET_TOKENS = 16
+MAX_TERMS = 8
+
+FTS_TRIGGERS = {
+    f'{FTS_TABLE}_ai': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON api_message BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+        END''',
+    f'{FTS_TABLE}_ad': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON api_message BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message) VALUES ('delete', old.id, old.message);
+        END''',
+    f'{FTS_TABLE}_au': f'''
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF message ON api_message BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, message) VALUES ('delete', old.id, old.message);
+            INSERT INTO {FTS_TABLE}(rowid, message) VALUES (new.id, new.message);
+        END''',
+}
+
+
+def instalar_indice_mensagens(connection, criar_tabela=True):
+    """
+    Cria a tabela FTS e os triggers que faltarem. O SQLite descarta os triggers quando uma
+    migração recria api_message; nesse caso o índice é reconstruído a partir da tabela.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        if not criar_tabela:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            if cursor.fetchone() is None:
+                return
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            f"message, content='api_message', content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'api_message'"
+        )
+        existentes = {row[0] for row in cursor.fetchall()}
+        faltando = [nome for nome in FTS_TRIGGERS if nome not in existentes]
+        for nome in faltando:
+            cursor.execute(FTS_TRIGGERS[nome])
+        if faltando:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def remover_indice_mensagens(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for nome in FTS_TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {nome}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def termos_da_busca(texto):
+    return re.findall(r'\w+', texto or '')[:MAX_TERMS]
+
+
+def consulta_fts(termos):
+    # Cada termo entre aspas para o texto do usuário não ser lido como sintaxe FTS; o último casa por prefixo.
+    return ' '.join(f'"{termo}"' for termo in termos) + '*'
+
+
+def destacar(trecho):
+    """Escapa o HTML do trecho e troca os marcadores do FTS por <mark>."""
+    return html.escape(trecho).replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>')
+
+
+def trecho_com_destaque(texto, termos, contexto=60):
+    padrao = re.compile('|'.join(re.escape(termo) for termo in termos), re.IGNORECASE)
+    primeiro = padrao.search(texto)
+    inicio = max(0, primeiro.start() - contexto) if primeiro else 0
+    fim = min(len(texto), (primeiro.end() if primeiro else 0) + contexto)
+    trecho = padrao.sub(lambda m: f'{SNIPPET_START}{m.group(0)}{SNIPPET_END}', texto[inicio:fim])
+    return ('…' if inicio else '') + destacar(trecho) + ('…' if fim < len(texto) else '')
+
+
+def buscar_mensagens(user, texto, before=None, limit=20):
+    """
+    Retorna até `limit` tuplas (id da mensagem, trecho destacado, linha arquivada ou None), das mais
+    recentes para as mais antigas, só dos chats em que o usuário é comprador ou vendedor. `before`
+    pagina por id. Mensagens arquivadas vêm com a linha do arquivo, já que não estão mais em api_message.
+
+    Com vários bancos de chat a ordem é por id, ou seja, banco a banco do último para o primeiro,
+    e cada banco só é consultado se os anteriores não completaram a página.
+    """
+    termos = termos_da_busca(texto)
+    if not termos:
+        return []
+
+    resultados = []
+    for alias in reversed(chat_databases()):
+        resultados += buscar_mensagens_no_banco(alias, user, termos, before, limit - len(resultados))
+        if len(resultados) >= limit:
+            break
+    return resultados
+
+
+def buscar_mensagens_no_banco(alias, user, termos, before, limit):
+    chats = Chat.ids_for_user(user, alias)
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        queryset = Message.objects.using(alias).filter(chat__in=chats)
+        for termo in termos:
+            queryset = queryset.filter(message__icontains=termo)
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        quentes = [
+            (message_id, trecho_com_destaque(texto_mensagem, termos), None)
+            for message_id, texto_mensagem in queryset.order_by('-id').values_list('id', 'message')[:limit]
+        ]
+        arquivadas = [
+            (linha['id'], trecho_com_destaque(linha['message'], termos), linha)
+            for linha in archive.buscar_sem_indice(alias, chats, termos, before, limit)
+        ]
+        return sorted(quentes + arquivadas, key=lambda hit: hit[0], reverse=True)[:limit]
+
+    chats_sql, chats_params = chats.query.sql_with_params()
+    sql = f'''
+        SELECT {FTS_TABLE}.rowid, snippet({FTS_TABLE}, 0, %s, %s, '…', {SNIPPET_TOKENS})
+        FROM {FTS_TABLE}
+        JOIN api_message ON api_message.id = {FTS_TABLE}.rowid
+        WHERE {FTS_TABLE} MATCH %s AND api_message.chat_id IN ({chats_sql})
+    '''
+    params = [SNIPPET_START, SNIPPET_END, consulta_fts(termos), *chats_params]
+    if before is not None:
+        sql += f' AND {FTS_TABLE}.rowid < %s'
+        params.append(before)
+    sql += f' ORDER BY {FTS_TABLE}.rowid DESC LIMIT %s'
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        quentes = [(message_id, destacar(trecho), None) for message_id, trecho in cursor.fetchall()]
+    arquivadas = buscar_no_arquivo(alias, termos, chats_sql, chats_params, before, limit)
+    return sorted(quentes + arquivadas, key=lambda hit: hit[0], reverse=True)[:limit]
+
+
+def buscar_no_arquivo(alias, termos, chats_sql, chats_params, before, limit):
+    # O índice do arquivo não guarda o texto: o trecho sai da linha descomprimida.
+    sql = f'''
+        SELECT mapa.message_id, mapa.archive_id
+        FROM {archive.FTS_TABLE}
+        JOIN {archive.FTS_MAP_TABLE} mapa ON mapa.message_id = {archive.FTS_TABLE}.rowid
+        WHERE {archive.FTS_TABLE} MATCH %s AND mapa.chat_id IN ({chats_sql})
+    '''
+    params = [consulta_fts(termos), *chats_params]
+    if before is not None:
+        sql += f' AND {archive.FTS_TABLE}.rowid < %s'
+        params.append(before)
+    sql += f' ORDER BY {archive.FTS_TABLE}.rowid DESC LIMIT %s'
+    params.append(limit)
+
+    with connections[alias].cursor() as cursor:
+        cursor.execute(sql, params)
+        hits = cursor.fetchall()
+    ids_por_bloco = defaultdict(list)
+    for message_id, archive_id in hits:
+        ids_por_bloco[archive_id].append(message_id)
+    linhas = archive.linhas_arquivadas(alias, ids_por_bloco)
+    return [
+        (message_id, trecho_com_destaque(linhas[message_id]['message'], termos), linhas[message_id])
+        for message_id, _ in hits if message_id in linhas
+    ]
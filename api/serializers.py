@@ -1,11 +1,60 @@
 from rest_framework import serializers
 from django.core.exceptions import ValidationError
 from django.contrib.auth.hashers import make_password
-from .models import User, ConfirmationCode, Seller, Category, Product, ProductImage, Comment, Order, OrderItem, Favorite, Chat, Message
+from django.conf import settings
+from .models import User, ConfirmationCode, Seller, Category, Product, ProductImage, Comment, Order, OrderItem, Favorite, Chat, Message, ChunkedUpload, StockReservation
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 
 from datetime import date, timedelta
+from collections import defaultdict
+from django.db.models import F, Min, Prefetch
+
+from .routers import db_for_chat
+
+
+class SparseFieldsetMixin:
+    """
+    Recorte da saída pelos parâmetros ?fields= e ?expand= (ver SparseFieldsetViewMixin).
+
+    Campos em `expandable_fields` são as relações aninhadas pesadas: com algum dos parâmetros, só saem
+    se pedidos em um deles. `related_fields` diz o select_related/prefetch_related de cada campo, para
+    a view carregar só as relações que vão aparecer.
+    """
+    expandable_fields = ()
+    related_fields = {}
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def select_fields(cls, fields, expand):
+        """Nomes que vão na saída; None quando nenhum parâmetro veio (saída completa)."""
+        if fields is None and expand is None:
+            return None
+        available = set(cls().fields)
+        unknown = sorted((set(fields or ()) | set(expand or ())) - available)
+        if unknown:
+            raise serializers.ValidationError({'fields': f'Campos desconhecidos: {", ".join(unknown)}.'})
+        not_expandable = sorted(set(expand or ()) - set(cls.expandable_fields))
+        if not_expandable:
+            raise serializers.ValidationError({
+                'expand': f'Só podem ser expandidos: {", ".join(cls.expandable_fields) or "nenhum campo"}.'
+            })
+        selected = set(fields) if fields is not None else available - set(cls.expandable_fields)
+        return selected | set(expand or ())
+
+    @classmethod
+    def related_lookups(cls, selected):
+        select, prefetch = [], []
+        for name, (select_lookups, prefetch_lookups) in cls.related_fields.items():
+            if selected is None or name in selected:
+                select += [lookup for lookup in select_lookups if lookup not in select]
+                prefetch += [lookup for lookup in prefetch_lookups if lookup not in prefetch]
+        return select, prefetch
 
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -79,13 +128,33 @@ class ProductListSerializer(serializers.ModelSerializer):
         )
 
     def get_image(self, obj):
-        first_image = obj.images.first()
+        # Escolhe em Python: com prefetch_related('images') não faz uma consulta por produto.
+        first_image = min(obj.images.all(), key=lambda image: image.pk, default=None)
         return ProductImageSerializer(first_image).data if first_image else None
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductFilterSerializer(serializers.Serializer):
+    """Filtros da listagem de produtos na query string; parâmetro vazio vale como ausente."""
+    category_id = serializers.IntegerField(required=False)
+    search = serializers.CharField(required=False)
+    state = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=None, decimal_places=None, required=False)
+    max_price = serializers.DecimalField(max_digits=None, decimal_places=None, required=False)
+    min_rate = serializers.DecimalField(max_digits=None, decimal_places=None, required=False)
+
+    @classmethod
+    def parse(cls, query_params):
+        """Filtros validados; levanta ValidationError (400) se algum não for do tipo certo."""
+        serializer = cls(data={
+            name: value for name, value in query_params.items() if name in cls._declared_fields and value
+        })
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+
+class ProductDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True) 
-    seller_id = serializers.IntegerField(source='seller.id', read_only=True)
+    seller_id = serializers.IntegerField(read_only=True)
     seller_name = serializers.CharField(source='seller.user.name', read_only=True)
     category_name = serializers.CharField(source='category.name', read_only=True)
     chat_id = serializers.SerializerMethodField()
@@ -97,16 +166,23 @@ class ProductDetailSerializer(serializers.ModelSerializer):
             'seller_id', 'seller_name', 'category_name', 'state', 'city', 'neighborhood', 'images', 'chat_id'
         )
 
+    expandable_fields = ('images',)
+    related_fields = {
+        'images': ((), ('images',)),
+        'seller_name': (('seller__user',), ()),
+        'category_name': (('category',), ()),
+    }
+
     def get_chat_id(self, obj):
         request = self.context.get('request')
         if request and hasattr(request, 'user') and request.user.is_authenticated:
-            chat = Chat.objects.filter(buyer=request.user, seller=obj.seller).first()
+            chat = Chat.of_buyer(request.user.id).filter(seller_id=obj.seller_id).first()
             if chat:
                 return chat.id
         return None
     
     def get_image(self, obj):
-        first_image = obj.images.first()
+        first_image = min(obj.images.all(), key=lambda image: image.pk, default=None)
         if first_image:
             return ProductImageSerializer(first_image).data
         return None
@@ -130,7 +206,7 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'title', 'original_price', 'discounted_price', 'description', 
-                  'category_id', 'images', 'seller_id', 'seller_name', 'favorited']
+                  'category_id', 'images', 'seller_id', 'seller_name', 'favorited', 'stock']
 
     def validate_images(self, value):
         if len(value) > 6:
@@ -158,11 +234,23 @@ class ProductSerializer(serializers.ModelSerializer):
         return product
 
 
-class SellerSerializer(serializers.ModelSerializer):    
+class ChunkedUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ChunkedUpload
+        fields = ['id', 'purpose', 'filename', 'total_size', 'offset', 'status', 'created_at']
+        read_only_fields = ['id', 'offset', 'status', 'created_at']
+
+    def validate_total_size(self, value):
+        if value <= 0 or value > settings.CHUNKED_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f"O arquivo deve ter entre 1 e {settings.CHUNKED_UPLOAD_MAX_SIZE} bytes.")
+        return value
+
+
+class SellerSerializer(SparseFieldsetMixin, serializers.ModelSerializer):    
     cpf = serializers.CharField(max_length=11, required=True)
     birth_date = serializers.DateField(required=True)
-    rg = serializers.ImageField(required=True)
-    selfie_document = serializers.ImageField(required=True)
+    rg = serializers.ImageField(required=False)
+    selfie_document = serializers.ImageField(required=False)
     city = serializers.CharField(max_length=100, required=True)
     state = serializers.CharField(max_length=100, required=True)
     neighborhood = serializers.CharField(max_length=100, required=True)
@@ -176,6 +264,13 @@ class SellerSerializer(serializers.ModelSerializer):
         model = Seller
         fields = '__all__'
 
+    expandable_fields = ('products', 'comments')
+    related_fields = {
+        'user': (('user',), ()),
+        'products': ((), ('products__images', 'products__seller__user')),
+        'comments': ((), ('products__comments__user',)),
+    }
+
     def validate_cpf(self, value):
         if Seller.objects.filter(cpf=value).exists():
             raise ValidationError("Este CPF já está em uso.")
@@ -187,11 +282,17 @@ class SellerSerializer(serializers.ModelSerializer):
         return value
 
     def validate(self, data):
+        if self.instance is None:
+            for field, upload_field in (('rg', 'rg_upload_id'), ('selfie_document', 'selfie_upload_id')):
+                if field not in data and not self.initial_data.get(upload_field):
+                    raise serializers.ValidationError({field: 'Envie o arquivo ou o id de um upload em partes.'})
         return data
     
     def get_comments(self, obj):
-        products = obj.products.all()
-        comments = Comment.objects.filter(product__in=products)
+        comments = sorted(
+            (comment for product in obj.products.all() for comment in product.comments.all()),
+            key=lambda comment: comment.pk,
+        )
         return CommentSerializer(comments, many=True).data
     
     def get_chat_id(self, obj):
@@ -199,7 +300,7 @@ class SellerSerializer(serializers.ModelSerializer):
         if not request or not request.user.is_authenticated:
             return None
         try:
-            chat = Chat.objects.get(seller=obj, buyer=request.user)
+            chat = Chat.of_buyer(request.user.id).get(seller=obj)
             return chat.id
         except Chat.DoesNotExist:
             return None
@@ -239,16 +340,51 @@ class CommentSerializer(serializers.ModelSerializer):
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
+    quantity = serializers.IntegerField(min_value=1)
+
     class Meta:
         model = OrderItem
         fields = ['id', 'order', 'product', 'quantity', 'price']
 
+class StockReservationSerializer(serializers.ModelSerializer):
+    quantity = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = StockReservation
+        fields = ['id', 'product', 'quantity', 'status', 'expires_at', 'order']
+        read_only_fields = ['status', 'expires_at', 'order']
+
+
+class LineItemSerializer(serializers.Serializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    quantity = serializers.IntegerField(min_value=1)
+    reservation = serializers.PrimaryKeyRelatedField(queryset=StockReservation.objects.all(), required=False)
+
+    def validate(self, data):
+        reservation = data.get('reservation')
+        if reservation is not None and (
+            reservation.user_id != self.context['request'].user.id
+            or reservation.product_id != data['product'].id
+            or reservation.quantity != data['quantity']
+        ):
+            raise serializers.ValidationError('Reserva não corresponde a este item.')
+        return data
+
+
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
+    # Com line_items o pedido é montado por Order.place, com baixa de estoque; o total é calculado.
+    line_items = LineItemSerializer(many=True, write_only=True, required=False, allow_empty=False)
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'items']
+        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'items', 'line_items']
+        extra_kwargs = {'total_price': {'required': False}}
+
+    def validate(self, data):
+        if self.instance is None and 'line_items' not in data and 'total_price' not in data:
+            raise serializers.ValidationError({'total_price': self.fields['total_price'].error_messages['required']})
+        return data
 
 class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
@@ -260,13 +396,25 @@ class FavoriteSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Este produto já está nos favoritos.')
         return data
 
+class ChatPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Busca o chat no banco de chat dono do id (ver api.routers)."""
+
+    def to_internal_value(self, data):
+        try:
+            return Chat.objects.using(db_for_chat(data)).get(pk=data)
+        except Chat.DoesNotExist:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class MessageSerializer(serializers.ModelSerializer):
     sender_name = serializers.CharField(source='sender.name', read_only=True)
-    chat = serializers.PrimaryKeyRelatedField(queryset=Chat.objects.all())
+    chat = ChatPrimaryKeyRelatedField(queryset=Chat.objects.all())
 
     class Meta:
         model = Message
-        fields = ['id', 'chat', 'sender', 'message', 'sent_at', 'sender_name']
+        fields = ['id', 'chat', 'seq', 'sender', 'message', 'sent_at', 'sender_name']
 
     def validate(self, data):
         chat = data.get('chat')
@@ -278,18 +426,58 @@ class MessageSerializer(serializers.ModelSerializer):
         return data
 
 
-class ChatSerializer(serializers.ModelSerializer):
+class ChatSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     messages = MessageSerializer(many=True, read_only=True)
     last_message = serializers.SerializerMethodField()
     seller_name = serializers.CharField(source='seller.user.name', read_only=True)
+    unread_count = serializers.SerializerMethodField()
+    last_read_message_id = serializers.SerializerMethodField()
 
     class Meta:
         model = Chat
-        fields = ['id', 'buyer', 'seller', 'seller_name', 'messages', 'started_at', 'last_message']
+        fields = [
+            'id', 'buyer', 'seller', 'seller_name', 'messages', 'started_at', 'last_message',
+            'unread_count', 'last_read_message_id',
+        ]
+
+    expandable_fields = ('messages',)
+    # Vendedor e remetentes ficam no banco principal, fora do banco do chat: prefetch em vez de join.
+    related_fields = {
+        'messages': ((), ('messages__sender',)),
+        'seller_name': ((), ('seller__user',)),
+        'unread_count': ((), ('seller',)),
+        'last_read_message_id': ((), ('seller',)),
+        # Só a mensagem apontada por last_message_seq, pelo índice único (chat, seq).
+        'last_message': ((), (
+            Prefetch(
+                'messages', queryset=Message.objects.filter(seq=F('chat__last_message_seq')), to_attr='latest_messages'
+            ),
+            'latest_messages__sender',
+        )),
+    }
+
+    def get_role(self, obj):
+        request = self.context.get('request')
+        if request is None or not request.user.is_authenticated:
+            return None
+        return obj.role_of(request.user.id)
+
+    def get_unread_count(self, obj):
+        role = self.get_role(obj)
+        return getattr(obj, f'{role}_unread_count') if role else None
+
+    def get_last_read_message_id(self, obj):
+        role = self.get_role(obj)
+        return getattr(obj, f'{role}_last_read_message_id') if role else None
 
     def get_last_message(self, obj):
         """Retorna a última mensagem do chat, se existir."""
-        last_message = obj.messages.last()  
+        latest = getattr(obj, 'latest_messages', None)
+        if latest:
+            last_message = latest[0]
+        else:
+            # Sem prefetch, ou a última mensagem foi apagada ou arquivada: busca a maior que sobrou.
+            last_message = obj.messages.last() if latest is None or obj.last_message_seq else None
         if last_message:
             return {
                 'id': last_message.id,
@@ -307,4 +495,209 @@ class ChatSerializer(serializers.ModelSerializer):
         if buyer == seller.user:
             raise serializers.ValidationError('O comprador e o vendedor não podem ser a mesma pessoa.')
 
-        return data
\ No newline at end of file
+        return data
+
+
+class ValuesListSerializer:
+    """
+    Serializador somente leitura para listagens: recebe linhas de `.values()` e monta os
+    dicts diretamente, sem a introspecção de campos do ModelSerializer.
+
+    A saída deve ser idêntica à do serializer equivalente; use `values()` para montar o queryset.
+    """
+    values_fields = ()
+
+    def __init__(self, instance, many=True, context=None):
+        self.instance = instance
+        self.context = context or {}
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.values_fields)
+
+    @property
+    def data(self):
+        return self.represent(list(self.instance))
+
+    def represent(self, rows):
+        raise NotImplementedError
+
+
+def decimal_representation(model, field_name):
+    field = model._meta.get_field(field_name)
+    to_representation = serializers.DecimalField(max_digits=field.max_digits, decimal_places=field.decimal_places).to_representation
+    return lambda value: None if value is None else to_representation(value)
+
+
+class CommentValuesSerializer(ValuesListSerializer):
+    """Mesma saída do CommentSerializer."""
+    values_fields = ('id', 'user__name', 'comment', 'rating', 'date', 'time', 'product_id', 'user_id')
+
+    def represent(self, rows):
+        return [
+            {
+                'id': row['id'],
+                'user_name': row['user__name'],
+                'formatted_time': row['time'].strftime('%H:%M'),
+                'comment': row['comment'],
+                'rating': row['rating'],
+                'date': row['date'].isoformat(),
+                'time': row['time'].isoformat(),
+                'product': row['product_id'],
+                'user': row['user_id'],
+            }
+            for row in rows
+        ]
+
+
+class ProductDetailValuesSerializer(ValuesListSerializer):
+    """Mesma saída do ProductDetailSerializer; imagens e chat_id saem em uma consulta por lote."""
+    values_fields = (
+        'id', 'title', 'original_price', 'discounted_price', 'description', 'favorited', 'rate',
+        'seller_id', 'seller__user__name', 'category__name', 'state', 'city', 'neighborhood',
+    )
+    price = staticmethod(decimal_representation(Product, 'original_price'))
+    rate = staticmethod(decimal_representation(Product, 'rate'))
+    # Colunas que vêm de join; ficam de fora do .values() quando o campo não foi pedido.
+    joined_fields = {'seller_name': 'seller__user__name', 'category_name': 'category__name'}
+
+    @classmethod
+    def values(cls, queryset, fields=None):
+        """`fields`: nomes de saída pedidos em ?fields=/?expand= (None = todos)."""
+        if fields is None:
+            return queryset.values(*cls.values_fields)
+        omitted = {column for name, column in cls.joined_fields.items() if name not in fields}
+        return queryset.values(*[column for column in cls.values_fields if column not in omitted])
+
+    def image_url(self, name):
+        if not name:
+            return None
+        url = ProductImage._meta.get_field('image').storage.url(name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request is not None else url
+
+    def images_by_product(self, product_ids):
+        images = defaultdict(list)
+        rows = ProductImage.objects.filter(product_id__in=product_ids).order_by('id').values(
+            'id', 'product_id', 'image', 'external_image_url'
+        )
+        for row in rows:
+            images[row['product_id']].append({
+                'id': row['id'],
+                'image': self.image_url(row['image']),
+                'external_image_url': row['external_image_url'],
+            })
+        return images
+
+    def chats_by_seller(self, seller_ids):
+        request = self.context.get('request')
+        if not (request and hasattr(request, 'user') and request.user.is_authenticated):
+            return {}
+        # O ProductDetailSerializer usa o primeiro chat (menor id) do comprador com o vendedor.
+        return dict(
+            Chat.of_buyer(request.user.id).filter(seller_id__in=seller_ids)
+            .values('seller_id').annotate(first_id=Min('id')).values_list('seller_id', 'first_id')
+        )
+
+    def represent(self, rows):
+        fields = self.context.get('fields')
+        images = self.images_by_product([row['id'] for row in rows]) if fields is None or 'images' in fields else {}
+        chats = self.chats_by_seller({row['seller_id'] for row in rows}) if fields is None or 'chat_id' in fields else {}
+        price, rate = self.price, self.rate
+        products = [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'original_price': price(row['original_price']),
+                'discounted_price': price(row['discounted_price']),
+                'description': row['description'],
+                'favorited': row['favorited'],
+                'rate': rate(row['rate']),
+                'seller_id': row['seller_id'],
+                'seller_name': row.get('seller__user__name'),
+                'category_name': row.get('category__name'),
+                'state': row['state'],
+                'city': row['city'],
+                'neighborhood': row['neighborhood'],
+                'images': images.get(row['id'], []),
+                'chat_id': chats.get(row['seller_id']),
+            }
+            for row in rows
+        ]
+        if fields is not None:
+            products = [{name: value for name, value in product.items() if name in fields} for product in products]
+        return products
+
+
+class ProductSyncValuesSerializer(ValuesListSerializer):
+    """
+    Só as colunas do próprio Product, para a sincronização (api.sync): o que vem de outra tabela (nome do
+    vendedor, da categoria, imagens) muda sem mexer em Product.updated_at e vai no fluxo dessa tabela.
+    """
+    values_fields = (
+        'id', 'title', 'original_price', 'discounted_price', 'description', 'favorited', 'rate',
+        'seller_id', 'category_id', 'state', 'city', 'neighborhood', 'updated_at',
+    )
+    price = staticmethod(ProductDetailValuesSerializer.price)
+    rate = staticmethod(ProductDetailValuesSerializer.rate)
+    updated_at = staticmethod(serializers.DateTimeField().to_representation)
+
+    def represent(self, rows):
+        price, rate = self.price, self.rate
+        return [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'original_price': price(row['original_price']),
+                'discounted_price': price(row['discounted_price']),
+                'description': row['description'],
+                'favorited': row['favorited'],
+                'rate': rate(row['rate']),
+                'seller_id': row['seller_id'],
+                'category_id': row['category_id'],
+                'state': row['state'],
+                'city': row['city'],
+                'neighborhood': row['neighborhood'],
+                'updated_at': self.updated_at(row['updated_at']),
+            }
+            for row in rows
+        ]
+
+
+class SellerSyncValuesSerializer(ValuesListSerializer):
+    """Dados públicos do vendedor para a sincronização; o nome vem do User, que atualiza o updated_at do vendedor."""
+    values_fields = ('id', 'user_id', 'user__name', 'state', 'city', 'neighborhood', 'updated_at')
+    updated_at = staticmethod(serializers.DateTimeField().to_representation)
+
+    def represent(self, rows):
+        return [
+            {
+                'id': row['id'],
+                'user_id': row['user_id'],
+                'name': row['user__name'],
+                'state': row['state'],
+                'city': row['city'],
+                'neighborhood': row['neighborhood'],
+                'updated_at': self.updated_at(row['updated_at']),
+            }
+            for row in rows
+        ]
+
+
+class ProductImageSyncValuesSerializer(ValuesListSerializer):
+    """Mesma saída do ProductImageSerializer, mais o produto e updated_at."""
+    values_fields = ('id', 'product_id', 'image', 'external_image_url', 'updated_at')
+    image_url = ProductDetailValuesSerializer.image_url
+    updated_at = staticmethod(serializers.DateTimeField().to_representation)
+
+    def represent(self, rows):
+        return [
+            {
+                'id': row['id'],
+                'product': row['product_id'],
+                'image': self.image_url(row['image']),
+                'external_image_url': row['external_image_url'],
+                'updated_at': self.updated_at(row['updated_at']),
+            }
+            for row in rows
+        ]
@@ -0,0 +1,170 @@
+from django.core.cache import cache
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .analytics import registrar_avaliacao, registrar_item, registrar_pedido
+from .archive import desindexar
+from .routers import ajustar_sequencias, chat_databases
+from .search import instalar_indice_mensagens
+from .models import (
+    Category, Chat, Comment, Favorite, ImageBlob, Message, MessageArchive, Order, OrderItem, Product, ProductImage, ProductRanking,
+    Seller, Tombstone, User,
+)
+
+PRODUCT_FACETS_CACHE_KEY = 'product-facets:all'
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_product_facets(sender, **kwargs):
+    cache.delete(PRODUCT_FACETS_CACHE_KEY)
+
+
+@receiver(post_save, sender=Product)
+def sync_product_ranking(sender, instance, created, **kwargs):
+    if created:
+        ProductRanking.refresh_for(instance.pk)
+    else:
+        ProductRanking.objects.filter(product_id=instance.pk).exclude(
+            category_id=instance.category_id
+        ).update(category_id=instance.category_id)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Favorite)
+def refresh_product_ranking(sender, instance, **kwargs):
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is not sender:
+        # Deleção em cascata (produto, usuário...): o ranking é removido junto.
+        return
+    ProductRanking.refresh_for(instance.product_id)
+
+
+@receiver(post_delete, sender=ProductImage)
+def release_image_blob(sender, instance, **kwargs):
+    # Vale também para a deleção em cascata do produto: o arquivo só some sem referências.
+    if instance.blob_id:
+        ImageBlob.release(instance.blob_id)
+
+
+TOMBSTONE_KINDS = {Product: 'product', ProductImage: 'image', Category: 'category', Seller: 'seller'}
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=ProductImage)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Seller)
+def record_tombstone(sender, instance, **kwargs):
+    # Também em cascata (categoria, vendedor...): o app offline precisa saber de cada linha removida.
+    Tombstone.objects.create(kind=TOMBSTONE_KINDS[sender], object_id=instance.pk)
+
+
+@receiver(post_save, sender=User)
+def touch_seller_on_rename(sender, instance, created, update_fields=None, **kwargs):
+    # O nome do vendedor vem do User: sem isso o fluxo de vendedores da sincronização não o reenviaria.
+    if not created and (update_fields is None or 'name' in update_fields):
+        Seller.objects.filter(user_id=instance.pk).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Message)
+def count_unread_message(sender, instance, created, **kwargs):
+    if created:
+        Chat.message_added(instance)
+
+
+@receiver(post_delete, sender=Message)
+def uncount_unread_message(sender, instance, **kwargs):
+    origin = kwargs.get('origin')
+    if origin is not None and getattr(origin, 'model', type(origin)) is not sender:
+        # Em cascata o chat também é removido e discount_chat_unread acerta os totais.
+        return
+    Chat.message_removed(instance)
+
+
+@receiver(post_delete, sender=MessageArchive)
+def unindex_message_archive(sender, instance, **kwargs):
+    desindexar(instance)
+
+
+@receiver(pre_delete, sender=Chat)
+def discount_chat_unread(sender, instance, **kwargs):
+    # Lê do banco: a instância deletada pode estar com contadores desatualizados.
+    chat = Chat.objects.using(instance._state.db).filter(pk=instance.pk).values(
+        'buyer_id', 'seller_id', 'buyer_unread_count', 'seller_unread_count'
+    ).first()
+    if chat:
+        Chat.add_unread(chat['buyer_id'], -chat['buyer_unread_count'], instance._state.db)
+        seller_user_id = Seller.objects.filter(pk=chat['seller_id']).values_list('user_id', flat=True).first()
+        if seller_user_id:
+            Chat.add_unread(seller_user_id, -chat['seller_unread_count'], instance._state.db)
+
+
+@receiver(pre_delete, sender=User)
+@receiver(pre_delete, sender=Seller)
+@receiver(pre_delete, sender=Product)
+def delete_related_chats(sender, instance, **kwargs):
+    # Os chats podem estar em outros bancos, fora do alcance do CASCADE do Django.
+    field = {User: 'buyer_id', Seller: 'seller_id', Product: 'product_id'}[sender]
+    for alias in chat_databases():
+        Chat.objects.using(alias).filter(**{field: instance.pk}).delete()
+
+
+@receiver(post_migrate)
+def restore_message_search_triggers(sender, using, **kwargs):
+    # Migrações que recriam api_message no SQLite apagam os triggers do índice de busca.
+    if sender.name == 'api':
+        instalar_indice_mensagens(connections[using], criar_tabela=False)
+
+
+@receiver(post_migrate)
+def offset_chat_shard_sequences(sender, using, **kwargs):
+    if sender.name == 'api':
+        ajustar_sequencias(using)
+
+
+# Estatísticas diárias (api.analytics): o pre_save guarda os valores antigos para aplicar só a diferença.
+@receiver(pre_save, sender=OrderItem)
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=Comment)
+def remember_previous_values(sender, instance, **kwargs):
+    fields = {OrderItem: ('order_id', 'product_id', 'price', 'quantity'), Order: ('status',), Comment: ('rating',)}[sender]
+    instance._previous = sender.objects.filter(pk=instance.pk).values(*fields).first() if instance.pk else None
+
+
+@receiver(post_save, sender=OrderItem)
+def count_order_item(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        registrar_item(previous['order_id'], previous['product_id'], previous['price'], previous['quantity'], -1)
+    registrar_item(instance.order_id, instance.product_id, instance.price, instance.quantity, 1)
+
+
+@receiver(post_delete, sender=OrderItem)
+def uncount_order_item(sender, instance, **kwargs):
+    # Em cascata o pedido ainda existe aqui: o Django apaga os itens antes dele.
+    registrar_item(instance.order_id, instance.product_id, instance.price, instance.quantity, -1)
+
+
+@receiver(post_save, sender=Order)
+def count_order_status(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is None:
+        return
+    was_sale, is_sale = previous['status'] in Order.SALE_STATUSES, instance.status in Order.SALE_STATUSES
+    if was_sale != is_sale:
+        registrar_pedido(instance, 1 if is_sale else -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment_rating(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous:
+        registrar_avaliacao(instance.product_id, instance.date, previous['rating'], -1)
+    registrar_avaliacao(instance.product_id, instance.date, instance.rating, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment_rating(sender, instance, **kwargs):
+    registrar_avaliacao(instance.product_id, instance.date, instance.rating, -1)
@@ -0,0 +1,124 @@
+"""
+Sincronização incremental do catálogo para o app offline (GET /api/sync/?since=<token>).
+
+Cada fluxo (produtos, imagens, categorias, vendedores e deleções) é lido em ordem de (updated_at, id) pelos
+índices *_sync_idx, a partir da posição guardada no token; o token é opaco para o cliente (JSON em
+base64). Só entram alterações com mais de SYNC_SETTLE_SECONDS: uma transação que ainda não terminou
+pode gravar updated_at anterior a uma posição já entregue, e essa linha nunca seria enviada.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Category, Product, ProductImage, Seller, Tombstone
+from .serializers import (
+    CategorySerializer, ProductImageSyncValuesSerializer, ProductSyncValuesSerializer, SellerSyncValuesSerializer,
+)
+
+TOKEN_VERSION = 1
+FLUXOS = {
+    'products': (Product, 'updated_at'),
+    'images': (ProductImage, 'updated_at'),
+    'categories': (Category, 'updated_at'),
+    'sellers': (Seller, 'updated_at'),
+    'deleted': (Tombstone, 'deleted_at'),
+}
+
+
+class TokenExpirado(Exception):
+    """O token é mais antigo que as deleções guardadas; o app precisa baixar o catálogo de novo."""
+
+
+def codificar_token(posicoes):
+    dados = {
+        'v': TOKEN_VERSION,
+        'p': {fluxo: [momento.isoformat(), pk] for fluxo, (momento, pk) in posicoes.items()},
+    }
+    return base64.urlsafe_b64encode(json.dumps(dados, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decodificar_token(token):
+    """Posições {fluxo: (momento, id ou None)}; ValueError se o token não foi gerado aqui."""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if dados['v'] != TOKEN_VERSION:
+            raise ValueError(token)
+        posicoes = {}
+        for fluxo, (momento, pk) in dados['p'].items():
+            momento = datetime.fromisoformat(momento)
+            if fluxo not in FLUXOS or timezone.is_naive(momento) or not (pk is None or isinstance(pk, int)):
+                raise ValueError(token)
+            posicoes[fluxo] = (momento, pk)
+        return posicoes
+    except (binascii.Error, UnicodeDecodeError, KeyError, TypeError, AttributeError) as exc:
+        raise ValueError(token) from exc
+
+
+def ler_fluxo(queryset, campo, posicao, ate, limit):
+    """Próximas `limit` linhas depois de `posicao`, até `ate`: uma varredura de intervalo no índice (campo, id)."""
+    queryset = queryset.filter(**{f'{campo}__lte': ate})
+    if posicao is not None:
+        momento, pk = posicao
+        if pk is None:
+            queryset = queryset.filter(**{f'{campo}__gt': momento})
+        else:
+            queryset = queryset.filter(**{f'{campo}__gte': momento}).exclude(**{campo: momento, 'id__lte': pk})
+    return list(queryset.order_by(campo, 'id')[:limit])
+
+
+def alteracoes_desde(token, limit, context=None):
+    """
+    Uma página de alterações depois do `token` (None = catálogo inteiro). `has_more` indica que
+    algum fluxo encheu a página e o app deve pedir de novo com `next`.
+    """
+    agora = timezone.now()
+    ate = agora - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    if token:
+        posicoes = decodificar_token(token)
+        retencao = agora - timedelta(days=settings.SYNC_TOMBSTONE_RETENTION_DAYS)
+        if 'deleted' not in posicoes or posicoes['deleted'][0] < retencao:
+            raise TokenExpirado(token)
+    else:
+        # Na primeira carga só interessam as deleções que acontecerem a partir de agora.
+        posicoes = {'deleted': (ate, None)}
+
+    consultas = {
+        'products': ProductSyncValuesSerializer.values(Product.objects.all()),
+        'images': ProductImageSyncValuesSerializer.values(ProductImage.objects.all()),
+        'categories': Category.objects.all(),
+        'sellers': SellerSyncValuesSerializer.values(Seller.objects.all()),
+        'deleted': Tombstone.objects.values('id', 'kind', 'object_id', 'deleted_at'),
+    }
+    linhas = {}
+    proximas = {}
+    has_more = False
+    for fluxo, (_, campo) in FLUXOS.items():
+        linhas[fluxo] = ler_fluxo(consultas[fluxo], campo, posicoes.get(fluxo), ate, limit)
+        if len(linhas[fluxo]) == limit:
+            ultima = linhas[fluxo][-1]
+            if isinstance(ultima, dict):
+                proximas[fluxo] = (ultima[campo], ultima['id'])
+            else:
+                proximas[fluxo] = (getattr(ultima, campo), ultima.pk)
+            has_more = True
+        else:
+            proximas[fluxo] = (ate, None)
+
+    data_hora = serializers.DateTimeField().to_representation
+    return {
+        'products': ProductSyncValuesSerializer(linhas['products'], context=context).data,
+        'images': ProductImageSyncValuesSerializer(linhas['images'], context=context).data,
+        'categories': CategorySerializer(linhas['categories'], many=True, context=context).data,
+        'sellers': SellerSyncValuesSerializer(linhas['sellers'], context=context).data,
+        'deleted': [
+            {'kind': row['kind'], 'id': row['object_id'], 'deleted_at': data_hora(row['deleted_at'])}
+            for row in linhas['deleted']
+        ],
+        'next': codificar_token(proximas),
+        'has_more': has_more,
+    }
@@ -0,0 +1,67 @@
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from api.models import Category, Comment, Order, Product, ProductDailyStats, Seller, SellerDailyStats, User
+
+
+class DailyStatsTests(TestCase):
+    def setUp(self):
+        seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        self.seller = Seller.objects.create(
+            user=seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        self.product = Product.objects.create(
+            title='Camiseta', original_price=10, description='',
+            category=Category.objects.create(name='Roupas', description=''), seller=self.seller,
+        )
+        self.buyer = User.objects.create_user(email='comprador@example.com', password=None, name='Comprador')
+
+    def vendas(self):
+        produto = ProductDailyStats.objects.values_list('revenue', 'units').get(product=self.product)
+        vendedor = SellerDailyStats.objects.values_list('revenue', 'units').get(seller=self.seller)
+        self.assertEqual(produto, vendedor)
+        return produto
+
+    def avaliacoes(self):
+        return ProductDailyStats.objects.values_list('rating_sum', 'rating_count').get(product=self.product)
+
+    def mudar_status(self, order, status):
+        order.status = status
+        order.save()
+
+    def test_pedido_entrando_e_saindo_das_vendas(self):
+        order = Order.place(self.buyer, [(self.product, 3, None)])
+        self.assertEqual(self.vendas(), (Decimal('30.00'), 3))
+
+        self.mudar_status(order, 'canceled')
+        self.assertEqual(self.vendas(), (Decimal('0.00'), 0))
+
+        self.mudar_status(order, 'shipped')
+        self.assertEqual(self.vendas(), (Decimal('30.00'), 3))
+
+        # Entre dois status de venda nada muda.
+        self.mudar_status(order, 'delivered')
+        self.assertEqual(self.vendas(), (Decimal('30.00'), 3))
+
+    def test_pedido_que_nao_e_venda_nao_conta(self):
+        order = Order.place(self.buyer, [(self.product, 2, None)], status='canceled')
+
+        self.assertFalse(ProductDailyStats.objects.exists())
+
+        self.mudar_status(order, 'pending')
+        self.assertEqual(self.vendas(), (Decimal('20.00'), 2))
+
+    def test_editar_a_nota_troca_a_soma(self):
+        comment = Comment.objects.create(product=self.product, user=self.buyer, comment='Boa', rating=4)
+        self.assertEqual(self.avaliacoes(), (4, 1))
+
+        comment.rating = 2
+        comment.save()
+        self.assertEqual(self.avaliacoes(), (2, 1))
+
+        comment.delete()
+        self.assertEqual(self.avaliacoes(), (0, 0))
+        self.assertEqual(ProductDailyStats.objects.get().day, timezone.localdate())
@@ -0,0 +1,86 @@
+import gzip
+import json
+import unittest
+
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from api import middleware
+from api.middleware import STREAM_ENCODERS, CompressionMiddleware, choose_encoding
+
+
+class ChooseEncodingTests(SimpleTestCase):
+    def test_respeita_q_e_curinga(self):
+        self.assertEqual(choose_encoding('gzip;q=0.5, deflate', {'gzip': None}), 'gzip')
+        self.assertIsNone(choose_encoding('gzip;q=0', {'gzip': None}))
+        self.assertIsNone(choose_encoding('identity', {'gzip': None}))
+        self.assertEqual(choose_encoding('*;q=0.1', {'gzip': None}), 'gzip')
+        self.assertEqual(choose_encoding('gzip, br', {'br': None, 'gzip': None}), 'br')
+        self.assertEqual(choose_encoding('gzip;q=1, br;q=0.5', {'br': None, 'gzip': None}), 'gzip')
+
+    def test_stream_cai_para_gzip(self):
+        self.assertEqual(choose_encoding('gzip, deflate, unknown', STREAM_ENCODERS), 'gzip')
+        self.assertEqual(choose_encoding('gzip, deflate, br, zstd', STREAM_ENCODERS), next(iter(STREAM_ENCODERS)))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def responder(self, response, accept_encoding='gzip'):
+        request = self.factory.get('/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_abaixo_do_limite_nao_comprime(self):
+        response = self.responder(HttpResponse(b'{"a":1}', content_type='application/json'))
+
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_acima_do_limite_comprime(self):
+        corpo = json.dumps([{'id': i, 'title': 'Camiseta'} for i in range(50)]).encode()
+
+        response = self.responder(HttpResponse(corpo, content_type='application/json'))
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), corpo)
+        self.assertEqual(response['Content-Length'], str(len(response.content)))
+
+    def test_sem_accept_encoding_nao_comprime(self):
+        corpo = b'x' * 500
+
+        response = self.responder(HttpResponse(corpo, content_type='text/plain'), accept_encoding='')
+
+        self.assertEqual(response.content, corpo)
+
+    def test_stream_em_gzip(self):
+        partes = [b'[', b'{"id":1}', b',{"id":2}', b']']
+
+        response = self.responder(
+            StreamingHttpResponse(iter(partes), content_type='application/json'), 'gzip, deflate, unknown'
+        )
+
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), b''.join(partes))
+
+    @unittest.skipIf(middleware.brotli is None, 'brotli não instalado')
+    def test_stream_em_brotli(self):
+        partes = [b'[', b'{"id":1}', b']']
+
+        response = self.responder(StreamingHttpResponse(iter(partes), content_type='application/json'), 'gzip, br')
+
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(middleware.brotli.decompress(b''.join(response.streaming_content)), b''.join(partes))
+
+    @unittest.skipIf(middleware.zstandard is None, 'zstandard não instalado')
+    def test_stream_em_zstd(self):
+        partes = [b'[', b'{"id":1}', b']']
+
+        response = self.responder(StreamingHttpResponse(iter(partes), content_type='application/json'), 'gzip, zstd')
+
+        self.assertEqual(response['Content-Encoding'], 'zstd')
+        decompressor = middleware.zstandard.ZstdDecompressor()
+        self.assertEqual(decompressor.decompressobj().decompress(b''.join(response.streaming_content)), b''.join(partes))
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.models import ConfirmationCode, User
+from api.throttles import cache
+from api.utils import gerar_codigo_confirmacao
+
+RATES = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'confirm_email': '3/min'}
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': RATES})
+class ConfirmationCodeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='novo@example.com', password=None, name='Novo')
+        self.client = APIClient()
+
+    def confirmar(self, codigo):
+        return self.client.post('/api/confirm/', {'email': 'novo@example.com', 'confirmation_code': codigo}, format='json')
+
+    def test_so_um_codigo_ativo(self):
+        primeiro = gerar_codigo_confirmacao(self.user)
+        segundo = gerar_codigo_confirmacao(self.user)
+
+        ativos = ConfirmationCode.objects.filter(user=self.user, is_used=False)
+        self.assertEqual(list(ativos.values_list('confirmation_code', flat=True)), [str(segundo)])
+        if primeiro != segundo:
+            self.assertEqual(self.confirmar(primeiro).status_code, 404)
+
+    def test_banco_recusa_dois_codigos_ativos(self):
+        gerar_codigo_confirmacao(self.user)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ConfirmationCode.objects.create(
+                user=self.user, confirmation_code='123456', expiration_time=timezone.now() + timezone.timedelta(minutes=10),
+            )
+
+    def test_confirma_uma_vez_so(self):
+        codigo = gerar_codigo_confirmacao(self.user)
+
+        self.assertEqual(self.confirmar(codigo).status_code, 200)
+        self.assertTrue(User.objects.get(pk=self.user.pk).is_active)
+        self.assertEqual(self.confirmar(codigo).status_code, 400)
+
+    def test_throttle_barra_tentativas_e_deixa_o_codigo_certo_passar(self):
+        codigo = gerar_codigo_confirmacao(self.user)
+
+        self.assertEqual(self.confirmar('000000').status_code, 404)
+        self.assertEqual(self.confirmar(codigo).status_code, 200)
+        self.assertEqual(self.confirmar('000001').status_code, 404)
+        self.assertEqual(self.confirmar('000002').status_code, 429)
@@ -0,0 +1,46 @@
+import unittest
+
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.hashers import TunablePBKDF2PasswordHasher
+from api.models import User
+
+try:
+    import bcrypt
+except ImportError:
+    bcrypt = None
+
+
+class PasswordRehashTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='antigo@example.com', password=None, name='Antigo')
+        self.user.is_active = True
+        self.user.save()
+
+    def login_com_hash(self, encoded):
+        User.objects.filter(pk=self.user.pk).update(password=encoded)
+        response = APIClient().post('/api/login/', {'email': 'antigo@example.com', 'password': 'segredo123'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return User.objects.get(pk=self.user.pk).password
+
+    def test_hash_sha1_antigo_e_refeito_no_login(self):
+        novo = self.login_com_hash(make_password('segredo123', hasher='pbkdf2_sha1'))
+
+        self.assertTrue(novo.startswith('pbkdf2_sha256$'))
+        self.assertEqual(int(novo.split('$')[1]), TunablePBKDF2PasswordHasher.iterations)
+
+    def test_poucas_iteracoes_sao_refeitas_no_login(self):
+        novo = self.login_com_hash(TunablePBKDF2PasswordHasher().encode('segredo123', 'salantigo', iterations=1000))
+
+        self.assertEqual(int(novo.split('$')[1]), TunablePBKDF2PasswordHasher.iterations)
+
+    def test_bcrypt_continua_reconhecido(self):
+        self.assertEqual(identify_hasher('bcrypt_sha256$$2b$12$' + 'a' * 53).algorithm, 'bcrypt_sha256')
+
+    @unittest.skipIf(bcrypt is None, 'bcrypt não instalado')
+    def test_hash_bcrypt_e_refeito_no_login(self):
+        novo = self.login_com_hash(make_password('segredo123', hasher='bcrypt_sha256'))
+
+        self.assertTrue(novo.startswith('pbkdf2_sha256$'))
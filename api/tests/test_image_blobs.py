@@ -0,0 +1,72 @@
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from api.models import Category, ImageBlob, Product, ProductImage, Seller, User
+
+
+class ImageBlobRefcountTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        self.seller = Seller.objects.create(
+            user=seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        self.category = Category.objects.create(name='Roupas', description='')
+
+    def produto(self):
+        return Product.objects.create(
+            title='Camiseta', original_price=10, description='', category=self.category, seller=self.seller,
+        )
+
+    def imagem(self, product):
+        conteudo = ContentFile(b'mesma imagem', name='foto.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            blob = ImageBlob.acquire(ImageBlob.compute_digest(conteudo), conteudo)
+        return ProductImage.objects.create(product=product, image=blob.file, blob=blob)
+
+    def test_apagar_imagem_libera_a_referencia(self):
+        primeira = self.imagem(self.produto())
+        segunda = self.imagem(self.produto())
+        blob = ImageBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primeira.delete()
+
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertTrue(default_storage.exists(blob.file))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            segunda.delete()
+
+        self.assertFalse(ImageBlob.objects.exists())
+        self.assertFalse(default_storage.exists(blob.file))
+
+    def test_apagar_produto_libera_as_imagens(self):
+        product = self.produto()
+        self.imagem(product)
+        self.imagem(product)
+        outra = self.imagem(self.produto())
+        blob = ImageBlob.objects.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.delete()
+
+        self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+        self.assertTrue(default_storage.exists(blob.file))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            outra.product.delete()
+
+        self.assertFalse(default_storage.exists(blob.file))
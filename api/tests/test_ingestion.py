@@ -0,0 +1,216 @@
+import asyncio
+import io
+import tempfile
+import threading
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from api import ingestion
+from api.ingestion import baixar_imagens, imagens_externas_pendentes, ingerir_imagens_externas
+from api.models import Category, ExternalImageFailure, Product, ProductImage, Seller, User
+
+
+def png():
+    buffer = io.BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class ServidorLocal:
+    """Servidor aiohttp em 127.0.0.1 rodando numa thread própria; conta as requisições por caminho."""
+
+    def __init__(self):
+        self.hits = {}
+        app = web.Application()
+        app.router.add_get('/ok.png', self.ok)
+        app.router.add_get('/lenta.png', self.lenta)
+        app.router.add_get('/grande.png', self.grande)
+        app.router.add_get('/pagina.html', self.pagina)
+        app.router.add_get('/para-ok', self.para_ok)
+        app.router.add_get('/para-metadados', self.para_metadados)
+        app.router.add_get('/para-loopback', self.para_loopback)
+        app.router.add_get('/em-circulo', self.em_circulo)
+        self.app = app
+
+    def contar(self, request):
+        self.hits[request.path] = self.hits.get(request.path, 0) + 1
+
+    async def ok(self, request):
+        self.contar(request)
+        return web.Response(body=png(), content_type='image/png')
+
+    async def lenta(self, request):
+        self.contar(request)
+        await asyncio.sleep(5)
+        return web.Response(body=png(), content_type='image/png')
+
+    async def grande(self, request):
+        self.contar(request)
+        response = web.StreamResponse()
+        await response.prepare(request)
+        for _ in range(64):
+            await response.write(b'\0' * 1024)
+        return response
+
+    async def pagina(self, request):
+        self.contar(request)
+        return web.Response(text='<html>não é imagem</html>', content_type='text/html')
+
+    async def para_ok(self, request):
+        raise web.HTTPFound('/ok.png')
+
+    async def para_metadados(self, request):
+        raise web.HTTPFound('http://169.254.169.254/latest/meta-data/')
+
+    async def para_loopback(self, request):
+        raise web.HTTPFound(f'http://127.0.0.2:{self.server.port}/ok.png')
+
+    async def em_circulo(self, request):
+        raise web.HTTPFound('/em-circulo')
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server.port}{path}'
+
+    def __enter__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        self.server = TestServer(self.app, host='127.0.0.1')
+        asyncio.run_coroutine_threadsafe(self.server.start_server(), self.loop).result(10)
+        return self
+
+    def __exit__(self, *exc):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(10)
+        self.loop.close()
+
+
+def so_servidor_local_publico(host):
+    # O servidor de teste precisa de loopback; qualquer outro endereço interno continua bloqueado.
+    return host == '127.0.0.1' or endereco_publico(host)
+
+
+endereco_publico = ingestion.endereco_publico
+
+
+@mock.patch('api.ingestion.endereco_publico', so_servidor_local_publico)
+class BaixarImagensTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ServidorLocal().__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.servidor.__exit__(None, None, None)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.servidor.hits.clear()
+
+    def baixar(self, path, **opcoes):
+        opcoes.setdefault('permitir_hosts_privados', False)
+        [(_, conteudo, erro)] = asyncio.run(baixar_imagens([self.servidor.url(path)], **opcoes))
+        return conteudo, erro
+
+    def test_baixa_imagem(self):
+        conteudo, erro = self.baixar('/ok.png')
+        self.assertIsNone(erro)
+        self.assertEqual(conteudo, png())
+
+    def test_segue_redirecionamento_para_endereco_publico(self):
+        conteudo, erro = self.baixar('/para-ok')
+        self.assertIsNone(erro)
+        self.assertEqual(conteudo, png())
+
+    def test_timeout(self):
+        conteudo, erro = self.baixar('/lenta.png', timeout=0.3)
+        self.assertIsNone(conteudo)
+        self.assertEqual(erro, 'TimeoutError')
+
+    def test_corpo_maior_que_o_limite(self):
+        conteudo, erro = self.baixar('/grande.png', max_bytes=16 * 1024)
+        self.assertIsNone(conteudo)
+        self.assertEqual(erro, 'Imagem maior que o limite permitido')
+
+    def test_redirecionamento_para_ip_interno_nao_e_seguido(self):
+        for path in ('/para-metadados', '/para-loopback'):
+            with self.subTest(path=path):
+                conteudo, erro = self.baixar(path)
+                self.assertIsNone(conteudo)
+                self.assertEqual(erro, 'Endereço interno não permitido')
+        self.assertNotIn('/ok.png', self.servidor.hits)
+
+    def test_redirecionamentos_demais(self):
+        conteudo, erro = self.baixar('/em-circulo')
+        self.assertIsNone(conteudo)
+        self.assertEqual(erro, 'Redirecionamentos demais')
+
+    def test_ip_literal_interno_na_url_original(self):
+        [(_, conteudo, erro)] = asyncio.run(baixar_imagens(['http://169.254.169.254/'], permitir_hosts_privados=False))
+        self.assertIsNone(conteudo)
+        self.assertEqual(erro, 'Endereço interno não permitido')
+
+
+@mock.patch('api.ingestion.endereco_publico', so_servidor_local_publico)
+class IngerirImagensTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.servidor = ServidorLocal().__enter__()
+        cls.media = tempfile.TemporaryDirectory()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media.name, EXTERNAL_IMAGE_ALLOW_PRIVATE_HOSTS=False)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.media.cleanup()
+        cls.servidor.__exit__(None, None, None)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.servidor.hits.clear()
+        user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        seller = Seller.objects.create(
+            user=user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo', neighborhood='Centro'
+        )
+        self.product = Product.objects.create(
+            title='Produto', original_price=10, description='', seller=seller,
+            category=Category.objects.create(name='Categoria', description=''),
+        )
+
+    def imagem(self, path):
+        return ProductImage.objects.create(product=self.product, external_image_url=self.servidor.url(path))
+
+    def test_guarda_imagem_baixada(self):
+        imagem = self.imagem('/ok.png')
+        self.assertEqual(ingerir_imagens_externas([imagem]), (1, 0))
+        imagem.refresh_from_db()
+        self.assertIsNotNone(imagem.blob_id)
+        self.assertFalse(imagens_externas_pendentes().exists())
+
+    def test_conteudo_que_nao_e_imagem_vai_para_o_cache_negativo(self):
+        imagem = self.imagem('/pagina.html')
+        self.assertEqual(ingerir_imagens_externas([imagem]), (0, 1))
+        failure = ExternalImageFailure.objects.get(url=imagem.external_image_url)
+        self.assertTrue(failure.error.startswith('Imagem inválida'))
+        imagem.refresh_from_db()
+        self.assertIsNone(imagem.blob_id)
+
+    def test_cache_negativo_evita_nova_busca(self):
+        self.imagem('/pagina.html')
+        self.assertEqual(ingerir_imagens_externas(list(imagens_externas_pendentes())), (0, 1))
+        self.assertEqual(ingerir_imagens_externas(list(imagens_externas_pendentes())), (0, 0))
+        self.assertEqual(self.servidor.hits['/pagina.html'], 1)
+        self.assertEqual(ExternalImageFailure.objects.get().attempts, 1)
+
+    def test_redirecionamento_para_ip_interno_fica_em_cache_negativo(self):
+        imagem = self.imagem('/para-metadados')
+        self.assertEqual(ingerir_imagens_externas([imagem]), (0, 1))
+        self.assertEqual(ExternalImageFailure.objects.get().error, 'Endereço interno não permitido')
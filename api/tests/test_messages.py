@@ -0,0 +1,81 @@
+import datetime
+
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.archive import arquivar_mensagens
+from api.models import Category, Chat, Message, MessageArchive, Product, Seller, User
+from api.routers import db_for_chat
+
+
+class MessageParamsTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.buyer = User.objects.create_user(email='comprador@example.com', password=None, name='Comprador')
+        seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        seller = Seller.objects.create(
+            user=seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        product = Product.objects.create(
+            title='Camiseta', original_price=10, description='',
+            category=Category.objects.create(name='Roupas', description=''), seller=seller,
+        )
+        self.chat = Chat.objects.create(buyer=self.buyer, seller=seller, product=product)
+        self.messages = [
+            Message.objects.create(chat=self.chat, sender=self.buyer, message=f'entrega número {i}') for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def test_parametros_nao_numericos_dao_400(self):
+        for params in ({'after_seq': 'abc'}, {'chat': 'abc'}, {'chat': self.chat.pk, 'after_seq': '1.5'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/messages/', params).status_code, 400)
+        response = self.client.get(f'/api/messages/{self.messages[0].pk}/', {'after_seq': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_after_seq_na_listagem_sem_chat(self):
+        response = self.client.get('/api/messages/', {'after_seq': 2})
+
+        self.assertEqual([message['seq'] for message in response.data], [3])
+
+    def test_page_size_precisa_ser_positivo(self):
+        for page_size in (0, -1):
+            with self.subTest(page_size=page_size):
+                response = self.client.get(
+                    '/api/messages/', {'chat': self.chat.pk, 'before_seq': 3, 'page_size': page_size}
+                )
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/messages/', {'chat': self.chat.pk, 'before_seq': 3, 'page_size': 1})
+        self.assertEqual([message['seq'] for message in response.data], [2])
+
+    def test_busca_com_page_size_invalido(self):
+        for page_size in (0, -1):
+            with self.subTest(page_size=page_size):
+                response = self.client.get('/api/messages/search/', {'q': 'entrega', 'page_size': page_size})
+                self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/messages/search/', {'q': 'entrega', 'page_size': 2})
+        self.assertEqual([hit['id'] for hit in response.data['results']], [self.messages[2].pk, self.messages[1].pk])
+
+    def test_busca_encontra_mensagens_arquivadas(self):
+        arquivar_mensagens(self.chat.pk, datetime.date(2026, 1, 1), self.messages[:2])
+
+        response = self.client.get('/api/messages/search/', {'q': 'entrega', 'page_size': 2})
+        self.assertEqual([hit['id'] for hit in response.data['results']], [self.messages[2].pk, self.messages[1].pk])
+        arquivada = response.data['results'][1]
+        self.assertEqual(arquivada['seq'], 2)
+        self.assertEqual(arquivada['sender_name'], 'Comprador')
+        self.assertIn('entrega', arquivada['snippet'])
+
+        response = self.client.get('/api/messages/search/', {'q': 'entrega', 'before': self.messages[1].pk})
+        self.assertEqual([hit['id'] for hit in response.data['results']], [self.messages[0].pk])
+
+    def test_bloco_removido_sai_da_busca(self):
+        arquivar_mensagens(self.chat.pk, datetime.date(2026, 1, 1), self.messages[:2])
+
+        MessageArchive.objects.using(db_for_chat(self.chat.pk)).all().delete()
+
+        response = self.client.get('/api/messages/search/', {'q': 'entrega'})
+        self.assertEqual([hit['id'] for hit in response.data['results']], [self.messages[2].pk])
@@ -0,0 +1,94 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.models import Category, Order, OrderItem, Product, Seller, User
+
+
+class OrderStockTests(TestCase):
+    def setUp(self):
+        seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        seller = Seller.objects.create(
+            user=seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        self.product = Product.objects.create(
+            title='Camiseta', original_price=10, description='', stock=10,
+            category=Category.objects.create(name='Roupas', description=''), seller=seller,
+        )
+        self.buyer = User.objects.create_user(email='comprador@example.com', password=None, name='Comprador')
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+        self.order = Order.place(self.buyer, [(self.product, 3, None)])
+        self.item = OrderItem.objects.get(order=self.order)
+
+    def stock(self):
+        return Product.objects.values_list('stock', flat=True).get(pk=self.product.pk)
+
+    def test_aumentar_quantidade_baixa_a_diferenca(self):
+        response = self.client.patch(f'/api/order-items/{self.item.pk}/', {'quantity': 5}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), 5)
+
+    def test_aumentar_alem_do_estoque_e_recusado(self):
+        response = self.client.patch(f'/api/order-items/{self.item.pk}/', {'quantity': 11}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.stock(), 7)
+        self.assertEqual(OrderItem.objects.get(pk=self.item.pk).quantity, 3)
+
+    def test_diminuir_quantidade_devolve_a_diferenca(self):
+        self.client.patch(f'/api/order-items/{self.item.pk}/', {'quantity': 1}, format='json')
+
+        self.assertEqual(self.stock(), 9)
+
+    def test_quantidade_precisa_ser_positiva(self):
+        response = self.client.patch(f'/api/order-items/{self.item.pk}/', {'quantity': -4}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.stock(), 7)
+
+    def test_remover_item_devolve_o_estoque(self):
+        self.client.delete(f'/api/order-items/{self.item.pk}/')
+
+        self.assertEqual(self.stock(), 10)
+
+    def test_cancelar_e_reabrir_o_pedido(self):
+        self.client.patch(f'/api/orders/{self.order.pk}/', {'status': 'canceled'}, format='json')
+        self.assertEqual(self.stock(), 10)
+        # Itens de pedido cancelado não seguram estoque.
+        self.client.delete(f'/api/order-items/{self.item.pk}/')
+        self.assertEqual(self.stock(), 10)
+
+    def test_reabrir_sem_estoque_e_recusado(self):
+        self.client.patch(f'/api/orders/{self.order.pk}/', {'status': 'canceled'}, format='json')
+        Product.objects.filter(pk=self.product.pk).update(stock=2)
+
+        response = self.client.patch(f'/api/orders/{self.order.pk}/', {'status': 'pending'}, format='json')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, 'canceled')
+        self.assertEqual(self.stock(), 2)
+
+    def test_remover_pedido_devolve_o_estoque(self):
+        self.client.delete(f'/api/orders/{self.order.pk}/')
+
+        self.assertEqual(self.stock(), 10)
+
+    def test_save_de_instancia_antiga_nao_devolve_o_estoque(self):
+        antigo = Product.objects.get(pk=self.product.pk)
+        self.assertTrue(Product.take_stock(self.product.pk, 3))
+
+        antigo.favorited = True
+        antigo.save()
+
+        self.assertEqual(self.stock(), 4)
+        self.assertTrue(Product.objects.get(pk=self.product.pk).favorited)
+
+    def test_vendedor_ainda_altera_o_estoque(self):
+        product = Product.objects.get(pk=self.product.pk)
+        product.stock = 20
+
+        product.save()
+
+        self.assertEqual(self.stock(), 20)
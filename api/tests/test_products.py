@@ -0,0 +1,110 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import Category, Product, ProductImage, Seller, User
+
+
+class ProductFacetTests(TestCase):
+    def setUp(self):
+        seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        self.seller = Seller.objects.create(
+            user=seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        self.category = Category.objects.create(name='Roupas', description='')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='app@example.com', password=None, name='App'))
+
+    def criar_produtos(self, quantidade):
+        for i in range(quantidade):
+            product = Product.objects.create(
+                title=f'Camiseta {i}', original_price=10 + i, description='', category=self.category, seller=self.seller,
+            )
+            ProductImage.objects.create(product=product, image=f'product_images/{i}-b.png')
+            ProductImage.objects.create(product=product, image=f'product_images/{i}-a.png')
+
+    def test_filtros_invalidos_dao_400(self):
+        for params in ({'min_price': 'abc'}, {'max_price': 'NaN'}, {'category_id': 'x'}, {'min_rate': '1e'}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('product-facets'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(next(iter(params)), response.data)
+
+    def test_filtros_validos_e_vazios(self):
+        self.criar_produtos(3)
+
+        response = self.client.get(reverse('product-facets'), {'min_price': '11', 'max_price': '', 'category_id': self.category.pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_renomear_categoria_atualiza_as_facetas(self):
+        self.criar_produtos(1)
+        cache.clear()
+        self.client.get(reverse('product-facets'))
+
+        self.category.name = 'Vestuário'
+        self.category.save()
+
+        response = self.client.get(reverse('product-facets'))
+        self.assertEqual([category['name'] for category in response.data['facets']['categories']], ['Vestuário'])
+
+    def test_primeira_imagem_sem_consulta_por_produto(self):
+        self.criar_produtos(2)
+        cache.clear()
+        with CaptureQueriesContext(connection) as poucos:
+            self.client.get(reverse('product-facets'))
+        self.criar_produtos(6)
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as muitos:
+            response = self.client.get(reverse('product-facets'))
+
+        self.assertEqual(len(muitos), len(poucos))
+        self.assertTrue(response.data['results'][0]['image']['image'].endswith('0-b.png'))
+
+
+class ProductSaveTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        seller = Seller.objects.create(
+            user=seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        self.product = Product.objects.create(
+            title='Camiseta', original_price=10, description='',
+            category=Category.objects.create(name='Roupas', description=''), seller=seller,
+        )
+
+    def test_save_nao_apaga_visualizacoes_gravadas_depois(self):
+        Product.objects.filter(pk=self.product.pk).update(view_count=7)
+
+        self.product.title = 'Camiseta azul'
+        self.product.save()
+
+        product = Product.objects.get(pk=self.product.pk)
+        self.assertEqual((product.title, product.view_count), ('Camiseta azul', 7))
+
+    def test_save_de_produto_removido_insere_de_novo(self):
+        Product.objects.filter(pk=self.product.pk).delete()
+
+        self.product.save()
+
+        self.assertTrue(Product.objects.filter(pk=self.product.pk).exists())
+
+    def test_save_com_campos_adiados(self):
+        product = Product.objects.only('title', 'seller').get(pk=self.product.pk)
+        product.title = 'Camiseta verde'
+
+        with CaptureQueriesContext(connection) as queries:
+            product.save()
+
+        self.assertEqual(Product.objects.get(pk=self.product.pk).title, 'Camiseta verde')
+        update, = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "api_product"')]
+        self.assertNotIn('description', update)
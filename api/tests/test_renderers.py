@@ -0,0 +1,42 @@
+import datetime
+import decimal
+import unittest
+import uuid
+from unittest import mock
+
+from django.test import SimpleTestCase
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api import renderers
+from api.renderers import FastJSONRenderer, encode_json
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def dados(self):
+        return {
+            'created_at': timezone.make_aware(datetime.datetime(2026, 10, 19, 12, 30, 5, 123456), datetime.timezone.utc),
+            'day': datetime.date(2026, 10, 19),
+            'price': decimal.Decimal('10.50'),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'counts': {1: 'um', 2: 'dois'},
+            'message': 'linha separada ação',
+            'big': 2 ** 70,
+        }
+
+    def test_mesma_saida_do_json_renderer(self):
+        data = self.dados()
+
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(encode_json([data]), JSONRenderer().render([data]))
+
+    @unittest.skipIf(renderers.orjson is None, 'orjson não instalado')
+    def test_orjson_com_a_mesma_saida(self):
+        data = self.dados()
+        del data['big']
+
+        # Sem cair no json da biblioteca padrão.
+        with mock.patch.object(renderers.json, 'dumps', side_effect=AssertionError):
+            conteudo = FastJSONRenderer().render(data)
+
+        self.assertEqual(conteudo, JSONRenderer().render(data))
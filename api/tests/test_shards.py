@@ -0,0 +1,115 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from django.conf import settings
+from django.test import SimpleTestCase, TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.models import Category, Chat, Message, Product, Seller, UnreadCounter, User
+from api.routers import chat_databases, db_for_buyer, db_for_chat
+
+SHARDED = len(settings.CHAT_DATABASES) >= 2
+
+
+@unittest.skipUnless(SHARDED, 'roda com CHAT_SHARDS=2 (ver ShardedSuiteTests)')
+class ChatShardEndpointTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        self.seller = Seller.objects.create(
+            user=self.seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        self.product = Product.objects.create(
+            title='Camiseta', original_price=10, description='',
+            category=Category.objects.create(name='Roupas', description=''), seller=self.seller,
+        )
+        # Ids seguidos caem em shards diferentes.
+        self.buyers = [
+            User.objects.create_user(email=f'comprador{n}@example.com', password=None, name=f'Comprador {n}')
+            for n in range(2)
+        ]
+        self.client = APIClient()
+
+    def como(self, user):
+        self.client.force_authenticate(user)
+        return self.client
+
+    def criar_chats(self):
+        chats = []
+        for buyer in self.buyers:
+            response = self.como(buyer).post('/api/chats/', {
+                'buyer': buyer.id, 'seller': self.seller.id, 'product': self.product.id,
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+            chats.append(response.data['chat']['id'])
+        return chats
+
+    def test_chats_ficam_no_shard_do_comprador(self):
+        chats = self.criar_chats()
+
+        self.assertEqual(len({db_for_chat(chat_id) for chat_id in chats}), 2)
+        for buyer, chat_id in zip(self.buyers, chats):
+            self.assertEqual(db_for_buyer(buyer.id), db_for_chat(chat_id))
+            self.assertTrue(Chat.objects.using(db_for_chat(chat_id)).filter(pk=chat_id).exists())
+
+        response = self.como(self.seller_user).get('/api/chats/')
+        self.assertEqual([chat['id'] for chat in response.data], sorted(chats))
+        response = self.como(self.buyers[1]).get('/api/chats/')
+        self.assertEqual([chat['id'] for chat in response.data], [chats[1]])
+
+    def test_mensagens_e_leitura_em_cada_shard(self):
+        chats = self.criar_chats()
+        for buyer, chat_id in zip(self.buyers, chats):
+            response = self.como(buyer).post('/api/messages/', {
+                'chat': chat_id, 'sender': buyer.id, 'message': f'oi de {buyer.name}',
+            }, format='json')
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(db_for_chat(response.data['message_data']['id']), db_for_chat(chat_id))
+
+        self.assertEqual(self.como(self.seller_user).get('/api/chats/unread/').data, {'total_unread': 2})
+        response = self.client.get('/api/messages/', {'chat': chats[1]})
+        self.assertEqual([message['message'] for message in response.data], ['oi de Comprador 1'])
+        response = self.client.get('/api/messages/')
+        self.assertEqual(len(response.data), 2)
+
+        response = self.client.post(f'/api/chats/{chats[1]}/read/', {}, format='json')
+        self.assertEqual(response.data['unread_count'], 0)
+        self.assertEqual(response.data['total_unread'], 1)
+
+    def test_apagar_o_vendedor_apaga_os_chats_de_todos_os_shards(self):
+        chats = self.criar_chats()
+        for buyer, chat_id in zip(self.buyers, chats):
+            Message.objects.create(chat=Chat.objects.using(db_for_chat(chat_id)).get(pk=chat_id), sender=buyer, message='oi')
+        self.assertEqual(UnreadCounter.total_for(self.seller_user.id), 2)
+
+        self.seller_user.delete()
+
+        for alias in chat_databases():
+            self.assertFalse(Chat.objects.using(alias).exists())
+            self.assertFalse(Message.objects.using(alias).exists())
+        self.assertEqual(UnreadCounter.total_for(self.buyers[0].id), 0)
+
+
+@unittest.skipIf(SHARDED, 'a suíte já está rodando com shards')
+class ShardedSuiteTests(SimpleTestCase):
+    def test_testes_de_chat_passam_com_dois_shards(self):
+        with tempfile.TemporaryDirectory() as chat_db_dir:
+            env = {**os.environ, 'CHAT_SHARDS': '2', 'CHAT_DB_DIR': chat_db_dir}
+            result = subprocess.run(
+                [
+                    sys.executable, 'manage.py', 'test', '--noinput',
+                    'api.tests.test_shards', 'api.tests.test_messages', 'api.tests.test_unread',
+                    'api.tests.test_sparse_fields',
+                ],
+                cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, stdin=subprocess.DEVNULL,
+                timeout=600,
+            )
+
+        self.assertEqual(result.returncode, 0, result.stderr[-3000:])
+        # Só este teste fica de fora lá dentro.
+        self.assertIn('OK (skipped=1)', result.stderr)
@@ -0,0 +1,89 @@
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.models import Category, Chat, Comment, Message, Product, Seller, User
+from api.routers import chat_databases, db_for_buyer
+
+
+@contextmanager
+def consultas_em_todos_os_bancos():
+    """Como o assertNumQueries, mas soma as consultas de todos os bancos, shards de chat inclusive."""
+    consultas = []
+    with ExitStack() as stack:
+        capturas = [stack.enter_context(CaptureQueriesContext(connection)) for connection in connections.all()]
+        yield consultas
+    consultas.extend(query for captura in capturas for query in captura.captured_queries)
+
+
+class SparseFieldsQueryTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.category = Category.objects.create(name='Roupas', description='')
+        self.buyer = User.objects.create_user(email='comprador@example.com', password=None, name='Comprador')
+        self.client = APIClient()
+        self.sellers = 0
+
+    def criar_vendedor(self):
+        self.sellers += 1
+        user = User.objects.create_user(email=f'vendedor{self.sellers}@example.com', password=None, name='Vendedor')
+        seller = Seller.objects.create(
+            user=user, cpf=f'{self.sellers:011d}', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        product = Product.objects.create(
+            title='Camiseta', original_price=10, description='', category=self.category, seller=seller,
+        )
+        Comment.objects.create(product=product, user=self.buyer, comment='Boa', rating=5)
+        Comment.objects.create(product=product, user=user, comment='Obrigado', rating=5)
+        chat = Chat.objects.create(buyer=self.buyer, seller=seller, product=product)
+        Message.objects.create(chat=chat, sender=self.buyer, message='oi')
+        Message.objects.create(chat=chat, sender=user, message='olá')
+        return seller
+
+    def test_vendedores_com_expand_comments(self):
+        for _ in range(3):
+            self.criar_vendedor()
+
+        # vendedores, produtos, comentários e autores dos comentários.
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/sellers/', {'fields': 'id', 'expand': 'comments'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([len(seller['comments']) for seller in response.data], [2, 2, 2])
+        self.assertEqual(response.data[0]['comments'][0]['comment'], 'Boa')
+
+    def test_vendedores_so_com_fields(self):
+        for _ in range(3):
+            self.criar_vendedor()
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/sellers/', {'fields': 'id,city'})
+
+        self.assertEqual(response.data[0], {'id': response.data[0]['id'], 'city': 'São Paulo'})
+
+    def test_chats_com_ultima_mensagem(self):
+        for _ in range(3):
+            self.criar_vendedor()
+        self.client.force_authenticate(self.buyer)
+
+        # vendedores do usuário e chats em cada banco de chat, depois últimas mensagens e remetentes.
+        with consultas_em_todos_os_bancos() as consultas:
+            response = self.client.get('/api/chats/', {'fields': 'id,last_message'})
+
+        self.assertEqual(len(consultas), 2 * len(chat_databases()) + 2)
+        self.assertEqual([chat['last_message']['message'] for chat in response.data], ['olá'] * 3)
+        self.assertEqual(response.data[0]['last_message']['sender_name'], 'Vendedor')
+
+    def test_ultima_mensagem_apagada(self):
+        seller = self.criar_vendedor()
+        self.client.force_authenticate(self.buyer)
+        Message.objects.using(db_for_buyer(self.buyer.id)).filter(chat__seller=seller, message='olá').delete()
+
+        response = self.client.get('/api/chats/', {'fields': 'id,last_message'})
+
+        self.assertEqual(response.data[0]['last_message']['message'], 'oi')
@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from api.management.commands.bench_startup import LAZY_MODULES
+
+BOOT_SCRIPT = f'''
+import json, sys
+import django
+django.setup()
+import {settings.ROOT_URLCONF}
+print(json.dumps(sorted(m for m in {list(LAZY_MODULES)!r} if m in sys.modules)))
+'''
+
+
+class StartupTests(SimpleTestCase):
+    def test_modulos_pesados_nao_carregam_no_boot(self):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'wastee.settings')}
+        result = subprocess.run(
+            [sys.executable, '-c', BOOT_SCRIPT], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+            stdin=subprocess.DEVNULL, timeout=120,
+        )
+
+        self.assertEqual(result.returncode, 0, result.stderr[-2000:])
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
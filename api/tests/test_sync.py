@@ -0,0 +1,58 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from api.models import Category, Product, Seller, User
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class CatalogSyncTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        self.seller = Seller.objects.create(
+            user=self.seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        self.category = Category.objects.create(name='Roupas', description='')
+        self.product = Product.objects.create(
+            title='Camiseta', original_price=10, description='', category=self.category, seller=self.seller,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(email='app@example.com', password=None, name='App'))
+
+    def sincronizar(self, since=None):
+        response = self.client.get(reverse('catalog-sync'), {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_produto_traz_so_colunas_proprias(self):
+        produto, = self.sincronizar()['products']
+
+        self.assertEqual(produto['seller_id'], self.seller.pk)
+        self.assertEqual(produto['category_id'], self.category.pk)
+        for campo in ('seller_name', 'category_name', 'chat_id', 'images'):
+            self.assertNotIn(campo, produto)
+
+    def test_renomear_o_vendedor_reenvia_o_vendedor(self):
+        primeira = self.sincronizar()
+        self.assertEqual([seller['name'] for seller in primeira['sellers']], ['Vendedor'])
+
+        self.seller_user.name = 'Loja Nova'
+        self.seller_user.save()
+        segunda = self.sincronizar(primeira['next'])
+
+        self.assertEqual(segunda['products'], [])
+        self.assertEqual([seller['name'] for seller in segunda['sellers']], ['Loja Nova'])
+
+    def test_vendedor_removido_vira_delecao(self):
+        primeira = self.sincronizar()
+        seller_id = self.seller.pk
+
+        self.seller.delete()
+        segunda = self.sincronizar(primeira['next'])
+
+        self.assertIn({'kind': 'seller', 'id': seller_id}, [
+            {'kind': row['kind'], 'id': row['id']} for row in segunda['deleted']
+        ])
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.throttles import cache
+
+RATES = {**settings.REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'], 'login_ip': '3/min', 'login_email': '1/min'}
+
+
+@override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': RATES})
+class TokenBucketThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def login(self, email, **extra):
+        return self.client.post('/api/login/', {'email': email, 'password': 'errada'}, format='json', **extra)
+
+    def test_recusa_pelo_email_nao_gasta_o_ip(self):
+        self.assertNotEqual(self.login('a@example.com').status_code, 429)
+        for _ in range(5):
+            self.assertEqual(self.login('a@example.com').status_code, 429)
+
+        # O IP só gastou um token: ainda cabem dois emails novos.
+        self.assertNotEqual(self.login('b@example.com').status_code, 429)
+        self.assertNotEqual(self.login('c@example.com').status_code, 429)
+        self.assertEqual(self.login('d@example.com').status_code, 429)
+
+    def test_trava_ocupada_recusa(self):
+        cache.add('throttle:login:ip:127.0.0.1:lock', 1, 60)
+
+        response = self.login('a@example.com')
+
+        self.assertEqual(response.status_code, 429)
+        self.assertFalse(cache.get('throttle:login:email:a@example.com:lock'))
+
+    def test_x_forwarded_for_do_cliente_nao_troca_o_ip(self):
+        respostas = [
+            self.login(f'{i}@example.com', HTTP_X_FORWARDED_FOR=f'10.0.0.{i}').status_code for i in range(5)
+        ]
+
+        self.assertEqual(respostas.count(429), 2)
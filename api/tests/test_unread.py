@@ -0,0 +1,95 @@
+import io
+
+from django.core.management import call_command
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from api.models import Category, Chat, Message, Product, Seller, UnreadCounter, User
+from api.routers import db_for_chat
+
+
+class UnreadCounterRebuildTests(TransactionTestCase):
+    # Com CHAT_SHARDS o UnreadCounter só anda no on_commit do shard, que o TestCase nunca confirma.
+    databases = '__all__'
+
+    def setUp(self):
+        self.buyer = User.objects.create_user(email='comprador@example.com', password=None, name='Comprador')
+        self.seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        seller = Seller.objects.create(
+            user=self.seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        product = Product.objects.create(
+            title='Camiseta', original_price=10, description='',
+            category=Category.objects.create(name='Roupas', description=''), seller=seller,
+        )
+        self.chat = Chat.objects.create(buyer=self.buyer, seller=seller, product=product)
+        for texto in ('oi', 'ainda tem?'):
+            Message.objects.create(chat=self.chat, sender=self.buyer, message=texto)
+        Message.objects.create(chat=self.chat, sender=self.seller_user, message='tem sim')
+
+    def test_recalcula_totais_divergentes(self):
+        UnreadCounter.objects.filter(user=self.seller_user).update(total=40)
+        UnreadCounter.objects.filter(user=self.buyer).delete()
+
+        call_command('rebuild_unread_counters', stdout=io.StringIO())
+
+        self.assertEqual(UnreadCounter.total_for(self.seller_user.id), 2)
+        self.assertEqual(UnreadCounter.total_for(self.buyer.id), 1)
+
+    def test_nao_mexe_em_totais_certos(self):
+        self.assertEqual(UnreadCounter.rebuild(), 0)
+
+
+class UnreadCountTests(TransactionTestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.buyer = User.objects.create_user(email='comprador@example.com', password=None, name='Comprador')
+        self.seller_user = User.objects.create_user(email='vendedor@example.com', password=None, name='Vendedor')
+        seller = Seller.objects.create(
+            user=self.seller_user, cpf='00000000000', postal_code='00000000', state='SP', city='São Paulo',
+            neighborhood='Centro',
+        )
+        product = Product.objects.create(
+            title='Camiseta', original_price=10, description='',
+            category=Category.objects.create(name='Roupas', description=''), seller=seller,
+        )
+        self.chat = Chat.objects.create(buyer=self.buyer, seller=seller, product=product)
+        self.client = APIClient()
+        self.client.force_authenticate(self.seller_user)
+
+    def recarregar(self):
+        return Chat.objects.using(db_for_chat(self.chat.pk)).get(pk=self.chat.pk)
+
+    def test_mensagem_nova_soma_para_quem_recebe(self):
+        Message.objects.create(chat=self.chat, sender=self.buyer, message='oi')
+        Message.objects.create(chat=self.chat, sender=self.buyer, message='ainda tem?')
+
+        self.assertEqual(self.recarregar().seller_unread_count, 2)
+        self.assertEqual(self.recarregar().buyer_unread_count, 0)
+        self.assertEqual(self.client.get('/api/chats/unread/').data, {'total_unread': 2})
+        self.assertEqual(UnreadCounter.total_for(self.buyer.id), 0)
+
+    def test_marcar_como_lido_zera(self):
+        primeira = Message.objects.create(chat=self.chat, sender=self.buyer, message='oi')
+        Message.objects.create(chat=self.chat, sender=self.buyer, message='ainda tem?')
+
+        response = self.client.post(f'/api/chats/{self.chat.pk}/read/', {'message_id': primeira.pk}, format='json')
+        self.assertEqual(response.data['unread_count'], 1)
+        self.assertEqual(UnreadCounter.total_for(self.seller_user.id), 1)
+
+        self.recarregar().mark_read(self.seller_user.id)
+
+        self.assertEqual(self.recarregar().seller_unread_count, 0)
+        self.assertEqual(UnreadCounter.total_for(self.seller_user.id), 0)
+
+    def test_apagar_o_chat_desconta_os_totais(self):
+        Message.objects.create(chat=self.chat, sender=self.buyer, message='oi')
+        Message.objects.create(chat=self.chat, sender=self.seller_user, message='tem sim')
+        self.assertEqual(UnreadCounter.total_for(self.seller_user.id), 1)
+
+        self.chat.delete()
+
+        self.assertEqual(UnreadCounter.total_for(self.seller_user.id), 0)
+        self.assertEqual(UnreadCounter.total_for(self.buyer.id), 0)
@@ -0,0 +1,186 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+import boto3
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from moto import mock_aws
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api.models import ChunkedUpload, User
+
+
+def png(size=64):
+    buffer = io.BytesIO()
+    if size > 64:
+        # Ruído não comprime: o PNG fica com uns 3 bytes por pixel.
+        Image.frombytes('RGB', (size, size), os.urandom(size * size * 3)).save(buffer, format='PNG')
+    else:
+        Image.new('RGB', (size, size), 'blue').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        override = override_settings(MEDIA_ROOT=media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.user = User.objects.create_user(email='comprador@example.com', password=None, name='Comprador')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.conteudo = png()
+
+    def criar(self):
+        response = self.client.post(
+            reverse('upload-list'),
+            {'purpose': 'product_image', 'filename': 'foto.png', 'total_size': len(self.conteudo)},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def enviar(self, upload_id, offset, parte):
+        return self.client.put(
+            reverse('upload-detail', args=[upload_id]), parte,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_partes_em_ordem_completam_o_upload(self):
+        upload_id = self.criar()
+        meio = len(self.conteudo) // 2
+        self.assertEqual(self.enviar(upload_id, 0, self.conteudo[:meio]).data['status'], 'pending')
+        response = self.enviar(upload_id, meio, self.conteudo[meio:])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'complete')
+        with ChunkedUpload.objects.get(pk=upload_id).open_received() as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo)
+
+    def test_parte_repetida_no_mesmo_offset_e_recusada(self):
+        upload_id = self.criar()
+        meio = len(self.conteudo) // 2
+        self.enviar(upload_id, 0, self.conteudo[:meio])
+
+        response = self.enviar(upload_id, 0, self.conteudo[:meio])
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['offset'], meio)
+
+    def test_parte_reservada_por_outra_requisicao_e_recusada(self):
+        upload_id = self.criar()
+        self.assertIsNotNone(ChunkedUpload.claim_chunk(upload_id, 0))
+
+        response = self.enviar(upload_id, 0, self.conteudo)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['status'], 'receiving')
+        self.assertIsNone(ChunkedUpload.claim_chunk(upload_id, 0))
+
+    @override_settings(CHUNKED_UPLOAD_CLAIM_TIMEOUT=-1)
+    def test_reserva_abandonada_e_retomada_do_offset(self):
+        upload_id = self.criar()
+        ChunkedUpload.claim_chunk(upload_id, 0)
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        with upload.open_destination() as destino:
+            destino.write(b'restos de uma parte interrompida')
+
+        response = self.enviar(upload_id, 0, self.conteudo)
+
+        self.assertEqual(response.data['status'], 'complete')
+        with upload.open_received() as arquivo:
+            self.assertEqual(arquivo.read(), self.conteudo)
+
+    def test_claim_recusa_upload_ids_que_nao_sao_lista(self):
+        upload_id = self.criar()
+        self.enviar(upload_id, 0, self.conteudo)
+
+        self.assertIsNone(ChunkedUpload.claim(self.user, upload_id, 'product_image'))
+        self.assertEqual(len(ChunkedUpload.claim(self.user, [upload_id], 'product_image')), 1)
+
+
+S3_STORAGES = {
+    'default': {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {'bucket_name': 'wastee-testes', 'region_name': 'us-east-1', 'file_overwrite': False},
+    },
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+
+@override_settings(STORAGES=S3_STORAGES)
+class ChunkedUploadS3Tests(TestCase):
+    """Com object storage as partes vão direto para um multipart upload do S3 (moto faz o papel do S3)."""
+
+    def setUp(self):
+        self.env = mock.patch.dict(os.environ, {'AWS_ACCESS_KEY_ID': 'teste', 'AWS_SECRET_ACCESS_KEY': 'teste'})
+        self.env.start()
+        self.addCleanup(self.env.stop)
+        self.aws = mock_aws()
+        self.aws.start()
+        self.addCleanup(self.aws.stop)
+        self.s3 = boto3.client('s3', region_name='us-east-1')
+        self.s3.create_bucket(Bucket='wastee-testes')
+
+        self.user = User.objects.create_user(email='comprador@example.com', password=None, name='Comprador')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.conteudo = png(1400)
+        self.parte = settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE
+
+    def criar(self):
+        response = self.client.post(
+            reverse('upload-list'),
+            {'purpose': 'product_image', 'filename': 'foto.png', 'total_size': len(self.conteudo)},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def enviar(self, upload_id, offset, parte):
+        return self.client.put(
+            reverse('upload-detail', args=[upload_id]), parte,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def multipart_abertos(self):
+        return self.s3.list_multipart_uploads(Bucket='wastee-testes').get('Uploads', [])
+
+    def test_partes_viram_um_objeto_no_bucket(self):
+        self.assertGreater(len(self.conteudo), self.parte)
+        upload_id = self.criar()
+        self.assertFalse(default_storage.exists(ChunkedUpload.objects.get(pk=upload_id).file))
+
+        self.assertEqual(self.enviar(upload_id, 0, self.conteudo[:self.parte]).data['status'], 'pending')
+        # Nada fica no disco da instância: a próxima parte pode chegar em outra.
+        self.assertEqual(len(self.multipart_abertos()), 1)
+        response = self.enviar(upload_id, self.parte, self.conteudo[self.parte:])
+
+        self.assertEqual(response.data['status'], 'complete')
+        upload = ChunkedUpload.objects.get(pk=upload_id)
+        self.assertEqual(upload.multipart_id, '')
+        self.assertEqual(self.s3.get_object(Bucket='wastee-testes', Key=upload.file)['Body'].read(), self.conteudo)
+        self.assertEqual(self.multipart_abertos(), [])
+
+    def test_parte_fora_do_tamanho_do_multipart_e_recusada(self):
+        upload_id = self.criar()
+
+        response = self.enviar(upload_id, 0, self.conteudo[:1024])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ChunkedUpload.objects.get(pk=upload_id).offset, 0)
+
+    def test_descartar_aborta_o_multipart(self):
+        upload_id = self.criar()
+        self.enviar(upload_id, 0, self.conteudo[:self.parte])
+
+        ChunkedUpload.objects.get(pk=upload_id).discard()
+
+        self.assertEqual(self.multipart_abertos(), [])
@@ -0,0 +1,110 @@
+import time
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Compartilhado entre os workers (settings.CACHES['throttle']).
+cache = ConnectionProxy(caches, 'throttle')
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Trava de cada balde no cache: expira sozinha se o processo morrer segurando-a.
+LOCK_TIMEOUT = 2
+LOCK_WAIT = 0.2
+
+
+def parse_rate(rate):
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+@contextmanager
+def bucket_locks(keys):
+    """
+    Trava as chaves com cache.add (atômico no cache compartilhado), em ordem para não haver deadlock.
+    Devolve False se alguma continuar travada depois de LOCK_WAIT segundos.
+    """
+    locked = []
+    try:
+        for key in sorted(keys):
+            lock_key = f'{key}:lock'
+            deadline = time.monotonic() + LOCK_WAIT
+            while not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                if time.monotonic() > deadline:
+                    yield False
+                    return
+                time.sleep(0.005)
+            locked.append(lock_key)
+        yield True
+    finally:
+        cache.delete_many(locked)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Baldes de tokens guardados no cache compartilhado settings.CACHES['throttle'], um por sufixo em
+    `suffixes` (por IP e por email).
+
+    A taxa de cada balde vem de DEFAULT_THROTTLE_RATES['<throttle_scope da view>_<sufixo>'],
+    e a checagem roda antes de qualquer hash de senha ou consulta ao banco. Todos os baldes são
+    conferidos antes de consumir de qualquer um: uma requisição recusada pelo balde do email não
+    gasta o do IP.
+    """
+
+    suffixes = ('ip', 'email')
+
+    def get_ip_key(self, request):
+        return self.get_ident(request)
+
+    def get_email_key(self, request):
+        try:
+            email = request.data.get('email')
+        except Exception:
+            return None
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return email.strip().lower()
+
+    def get_buckets(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        buckets = []
+        for suffix in self.suffixes:
+            rate = api_settings.DEFAULT_THROTTLE_RATES.get(f'{scope}_{suffix}')
+            ident = getattr(self, f'get_{suffix}_key')(request)
+            if rate is not None and ident is not None:
+                buckets.append((f'throttle:{scope}:{suffix}:{ident}', *parse_rate(rate)))
+        return buckets
+
+    def allow_request(self, request, view):
+        buckets = self.get_buckets(request, view)
+        if not buckets:
+            return True
+
+        with bucket_locks([key for key, _, _ in buckets]) as locked:
+            if not locked:
+                self.wait_time = LOCK_WAIT
+                return False
+
+            now = time.time()
+            states = cache.get_many([key for key, _, _ in buckets])
+            refilled = []
+            waits = []
+            for key, capacity, period in buckets:
+                tokens, updated = states.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated) * capacity / period)
+                if tokens < 1:
+                    waits.append((1 - tokens) * period / capacity)
+                refilled.append((key, tokens, period))
+            if waits:
+                self.wait_time = max(waits)
+                return False
+
+            for key, tokens, period in refilled:
+                cache.set(key, (tokens - 1, now), period)
+        return True
+
+    def wait(self):
+        return getattr(self, 'wait_time', None)
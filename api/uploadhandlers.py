@@ -0,0 +1,32 @@
+import hashlib
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+
+class HashingMixin:
+    """Calcula o BLAKE2b do arquivo enquanto ele chega e o expõe em `content_digest`."""
+
+    def new_file(self, *args, **kwargs):
+        # Antes do super(): o handler de memória encerra a cadeia com StopFutureHandlers.
+        self.hasher = hashlib.blake2b(digest_size=32)
+        super().new_file(*args, **kwargs)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.content_digest = self.hasher.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    def receive_data_chunk(self, raw_data, start):
+        # Se o arquivo é grande demais para a memória, quem calcula o hash é o próximo handler.
+        if self.activated:
+            self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
@@ -12,9 +12,14 @@ from .views import (
     CategoryViewSet,
     ProductViewSet,
     ProductDetailViewSet,
+    ProductFacetView,
+    CatalogSyncView,
+    HomeFeedViewSet,
+    ChunkedUploadViewSet,
     CommentViewSet,
     OrderViewSet,
     OrderItemViewSet,
+    StockReservationViewSet,
     FavoriteViewSet,
     MessageViewSet,
     ChatViewSet,
@@ -29,11 +34,14 @@ router.register(r'categories', CategoryViewSet)
 router.register(r'comments', CommentViewSet)
 router.register(r'orders', OrderViewSet)
 router.register(r'order-items', OrderItemViewSet)
+router.register(r'reservations', StockReservationViewSet, basename='reservation')
 router.register(r'favorites', FavoriteViewSet)
 router.register(r'chats', ChatViewSet)
 router.register(r'messages', MessageViewSet)
 router.register(r'products', ProductViewSet)
 router.register(r'product-detail', ProductDetailViewSet, basename='product-detail')
+router.register(r'home', HomeFeedViewSet, basename='home')
+router.register(r'uploads', ChunkedUploadViewSet, basename='upload')
 
 
 urlpatterns = [
@@ -42,5 +50,7 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(), name='token-obtain-pair'), 
     path('set-password/<int:pk>/', SetPasswordView.as_view(), name='set-password'),
     path('confirm/', ConfirmationCodeView.as_view(), name='confirmation-code'),  
+    path('products/facets/', ProductFacetView.as_view(), name='product-facets'),
+    path('sync/', CatalogSyncView.as_view(), name='catalog-sync'),
     path('', include(router.urls)),
 ]
@@ -1,25 +1,24 @@
 import random
 from api.models import ConfirmationCode
 
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 
 import logging
 logger = logging.getLogger(__name__)
 
 import base64
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
 import os
 
+from api.mail import gmail_client
+
 def enviar_email_oauth(email_destinatario, codigo):
-    try:
-        credentials = Credentials.from_authorized_user_file('token.json', scopes=[
-            'https://www.googleapis.com/auth/gmail.send'
-        ])
-        
+    # MIME só carrega no primeiro envio; o cliente do Gmail é compartilhado pelo processo (api.mail).
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
 
+    try:
         assunto = 'Seu código de confirmação'
         mensagem = f'Seu código de confirmação é: {codigo}'
 
@@ -30,18 +29,15 @@ def enviar_email_oauth(email_destinatario, codigo):
         msg.attach(MIMEText(mensagem, 'plain'))
 
         raw_message = base64.urlsafe_b64encode(msg.as_bytes()).decode()
-        
-        service = build('gmail', 'v1', credentials=credentials)
-        message = {'raw': raw_message}
 
-        service.users().messages().send(userId='me', body=message).execute()
-        print("Email enviado com sucesso.")
+        gmail_client().send(raw_message)
+        logger.info("Email enviado com sucesso.")
 
     except Exception as e:
         logger.error(f"Erro ao enviar o e-mail: {e}")
         if 'invalid_grant' in str(e):
-            print("Token expirado ou inválido. Verifique o refresh_token e tente novamente.")
-        if not os.path.exists('token.json'):
+            logger.error("Token expirado ou inválido. Verifique o refresh_token e tente novamente.")
+        if not os.path.exists(settings.GMAIL_TOKEN_FILE):
             logger.error("Arquivo token.json não encontrado.")
         return
 
@@ -49,13 +45,16 @@ def enviar_email_oauth(email_destinatario, codigo):
 def gerar_codigo_confirmacao(user):
     codigo = random.randint(100000, 999999)
     expiration_time = timezone.now() + timezone.timedelta(minutes=10)
-    
-    ConfirmationCode.objects.create(
-        user=user,
-        confirmation_code=codigo,
-        is_used=False,
-        expiration_time=expiration_time
-    )
-    
+
+    # Só um código ativo por usuário: o anterior deixa de valer.
+    with transaction.atomic():
+        ConfirmationCode.objects.filter(user=user, is_used=False).delete()
+        ConfirmationCode.objects.create(
+            user=user,
+            confirmation_code=str(codigo),
+            is_used=False,
+            expiration_time=expiration_time
+        )
+
     return codigo
 
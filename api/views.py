@@ -1,14 +1,18 @@
 import logging
+from datetime import date, timedelta
+from itertools import groupby
 
-from PIL import Image
-from django.core.files.images import get_image_dimensions
+from django.conf import settings
 
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
+from django.http import Http404
 from django.shortcuts import get_object_or_404
-from django.db.models import Avg
+from django.core.cache import cache
+from django.db.models import Avg, Case, CharField, Count, QuerySet, Value, When, prefetch_related_objects
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from rest_framework import generics, status, viewsets
 from rest_framework.permissions import AllowAny, IsAuthenticated
@@ -17,19 +21,34 @@ from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.views import TokenBlacklistView
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError
+from rest_framework.pagination import PageNumberPagination
 
 from django.db.models import Q
 
 from .models import (
     User, ConfirmationCode, Seller, Category, Product,
-    Comment, Order, OrderItem, Favorite, Chat, Message
+    Comment, Order, OrderItem, Favorite, Chat, Message, ProductRanking,
+    ProductImage, ChunkedUpload, ImageBlob, UnreadCounter, StockReservation
 )
 from .serializers import (
     UserSerializer, LoginSerializer, CategorySerializer,
     ProductDetailSerializer, CommentSerializer, OrderSerializer,
     OrderItemSerializer, FavoriteSerializer, ChatSerializer,
-    MessageSerializer, SellerSerializer, ProductSerializer
+    MessageSerializer, SellerSerializer, ProductSerializer,
+    ProductListSerializer, ProductFilterSerializer, ChunkedUploadSerializer,
+    CommentValuesSerializer, ProductDetailValuesSerializer, StockReservationSerializer
 )
+from .analytics import painel_do_vendedor
+from .archive import mensagens_arquivadas
+from .counters import product_views
+from .renderers import StreamingJSONResponse
+from .routers import chat_databases, db_for_buyer, db_for_chat
+from .search import buscar_mensagens
+from .sync import TokenExpirado, alteracoes_desde
+from .signals import PRODUCT_FACETS_CACHE_KEY
+from .throttles import TokenBucketThrottle
+from .images import validar_imagem, validar_imagens
 from .utils import gerar_codigo_confirmacao, enviar_email_oauth
 
 logger = logging.getLogger(__name__)
@@ -39,6 +58,8 @@ User = get_user_model()
 class LoginView(generics.GenericAPIView):
     serializer_class = LoginSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'login'
 
     def post(self, request):
         logger.info(f"Dados recebidos para login: {request.data}")
@@ -79,6 +100,8 @@ class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'register'
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -111,46 +134,35 @@ class UserViewSet(viewsets.ModelViewSet):
 
 class ConfirmationCodeView(APIView):
     permission_classes = [AllowAny]
+    throttle_classes = [TokenBucketThrottle]
+    throttle_scope = 'confirm'
 
     def post(self, request):
         code = request.data.get('confirmation_code')
         email = request.data.get('email')
         logger.info(f"Recebido código: {code} para o e-mail: {email}")
 
-    
-        confirmation = ConfirmationCode.objects.get(confirmation_code=code, user__email=email)
-        if confirmation.is_used or confirmation.expiration_time < timezone.now():
-            return Response({'error': 'Código de confirmação inválido ou expirado'}, status=status.HTTP_400_BAD_REQUEST)
-        confirmation.is_used = True
-        confirmation.save()
-        user = confirmation.user
-        user.is_active = True
-        user.save()
+        confirmation = None
+        if email and code:
+            # Índice único do email + índice (user, confirmation_code): duas buscas pontuais.
+            confirmation = ConfirmationCode.objects.filter(
+                user__email=email, confirmation_code=str(code)
+            ).order_by('is_used').first()
 
-class ConfirmationCodeView(APIView):
-    permission_classes = [AllowAny]
+        if confirmation is None:
+            logger.error(f"Código de confirmação não encontrado para o e-mail: {email}")
+            return Response({'error': 'Código de confirmação não encontrado'}, status=status.HTTP_404_NOT_FOUND)
 
-    def post(self, request):
-        code = request.data.get('confirmation_code')
-        email = request.data.get('email')
-        logger.info(f"Recebido código: {code} para o e-mail: {email}")
+        if confirmation.is_used or confirmation.expiration_time < timezone.now():
+            return Response({'error': 'Código de confirmação inválido ou expirado'}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            confirmation = ConfirmationCode.objects.get(confirmation_code=code, user__email=email)
-            if confirmation.is_used or confirmation.expiration_time < timezone.now():
+        with transaction.atomic():
+            # UPDATE condicional: duas requisições simultâneas não usam o mesmo código.
+            if not ConfirmationCode.objects.filter(pk=confirmation.pk, is_used=False).update(is_used=True):
                 return Response({'error': 'Código de confirmação inválido ou expirado'}, status=status.HTTP_400_BAD_REQUEST)
+            User.objects.filter(pk=confirmation.user_id).update(is_active=True)
 
-            confirmation.is_used = True
-            confirmation.save()
-
-            user = confirmation.user
-            user.is_active = True
-            user.save()
-
-            return Response({'message': 'Código de confirmação validado com sucesso!', 'user_id': user.id}, status=status.HTTP_200_OK)
-        except ConfirmationCode.DoesNotExist:
-            logger.error(f"Cfódigo de confirmação não encontrado para o e-mail: {email}")
-            return Response({'error': 'Código de confirmação não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'message': 'Código de confirmação validado com sucesso!', 'user_id': confirmation.user_id}, status=status.HTTP_200_OK)
 
 class SetPasswordView(generics.UpdateAPIView):
     queryset = User.objects.all()
@@ -176,24 +188,68 @@ class SetPasswordView(generics.UpdateAPIView):
             'access': str(refresh.access_token),
         }, status=status.HTTP_200_OK)
 
-class SellerViewSet(viewsets.ModelViewSet):
+class SparseFieldsetViewMixin:
+    """
+    ?fields=a,b e ?expand=c nas ações de leitura: recorta o serializer (SparseFieldsetMixin) e carrega
+    só as relações dos campos que vão sair.
+    """
+    sparse_fieldset_actions = ('list', 'retrieve')
+
+    def query_list(self, name):
+        value = self.request.query_params.get(name)
+        return None if value is None else [item.strip() for item in value.split(',') if item.strip()]
+
+    def selected_fields(self):
+        if self.action not in self.sparse_fieldset_actions:
+            return None
+        if not hasattr(self, '_selected_fields'):
+            self._selected_fields = self.get_serializer_class().select_fields(
+                self.query_list('fields'), self.query_list('expand')
+            )
+        return self._selected_fields
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action in self.sparse_fieldset_actions:
+            kwargs.setdefault('fields', self.selected_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    def with_related(self, queryset):
+        if self.action not in self.sparse_fieldset_actions:
+            return queryset
+        select, prefetch = self.get_serializer_class().related_lookups(self.selected_fields())
+        if isinstance(queryset, QuerySet):
+            # select_related() sem argumentos seguiria todas as chaves estrangeiras.
+            return (queryset.select_related(*select) if select else queryset).prefetch_related(*prefetch)
+        # Lista que junta vários bancos de chat: cada grupo busca as relações a partir do seu banco.
+        for _, objs in groupby(queryset, key=lambda obj: obj._state.db):
+            prefetch_related_objects(list(objs), *select, *prefetch)
+        return queryset
+
+
+class SellerViewSet(SparseFieldsetViewMixin, viewsets.ModelViewSet):
     queryset = Seller.objects.all()
     serializer_class = SellerSerializer
     permission_classes = [AllowAny]
+    sparse_fieldset_actions = ('list', 'retrieve', 'by_user')
+
+    def get_queryset(self):
+        return self.with_related(super().get_queryset())
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
-        seller = serializer.save()
-        
-        rg_file = request.FILES.get('rg') 
-        selfie_file = request.FILES.get('selfie_document') 
-
-        if rg_file:
-            seller.rg.save(rg_file.name, rg_file) 
-        if selfie_file:
-            seller.selfie_document.save(selfie_file.name, selfie_file) 
+        documents = {}
+        for field, upload_field, purpose in (('rg', 'rg_upload_id', 'seller_rg'), ('selfie_document', 'selfie_upload_id', 'seller_selfie')):
+            upload_id = request.data.get(upload_field)
+            if upload_id and field not in serializer.validated_data:
+                uploads = ChunkedUpload.claim(request.user, [upload_id], purpose) if request.user.is_authenticated else None
+                if uploads is None:
+                    return Response({'error': 'Upload inválido, incompleto ou já utilizado.'}, status=status.HTTP_400_BAD_REQUEST)
+                documents[field] = uploads[0].file
+
+        # Arquivos enviados no multipart já são gravados pelo serializer; não salvamos de novo.
+        seller = serializer.save(**documents)
             
         user = seller.user  
         user.user_type = 'seller'
@@ -203,10 +259,99 @@ class SellerViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'], url_path='by-user/(?P<user_id>[^/.]+)')
     def by_user(self, request, user_id=None):
-        seller = get_object_or_404(Seller, user_id=user_id)
+        seller = get_object_or_404(self.get_queryset(), user_id=user_id)
         serializer = self.get_serializer(seller)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def stats(self, request, pk=None):
+        """Painel do vendedor: receita, unidades e avaliações por dia entre `start` e `end` (padrão: últimos 30 dias)."""
+        seller = self.get_object()
+        if seller.user_id != request.user.id:
+            return Response({'error': 'Apenas o próprio vendedor pode ver as estatísticas.'}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else timezone.localdate()
+            start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') else end - timedelta(days=29)
+        except ValueError:
+            return Response({'error': 'Datas inválidas; use AAAA-MM-DD.'}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end or (end - start).days >= settings.SELLER_STATS_MAX_DAYS:
+            return Response(
+                {'error': f'Intervalo inválido; máximo de {settings.SELLER_STATS_MAX_DAYS} dias.'}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(painel_do_vendedor(seller.pk, start, end))
+
+class ChunkedUploadViewSet(viewsets.GenericViewSet):
+    serializer_class = ChunkedUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return ChunkedUpload.objects.filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        upload = ChunkedUpload(user=request.user, **serializer.validated_data)
+        upload.reserve_file()
+        upload.save()
+
+        return Response(self.get_serializer(upload).data, status=status.HTTP_201_CREATED)
+
+    def retrieve(self, request, *args, **kwargs):
+        upload = self.get_object()
+        return Response(self.get_serializer(upload).data, headers={'Upload-Offset': str(upload.offset)})
+
+    def update(self, request, *args, **kwargs):
+        """Recebe uma parte do arquivo no corpo cru; Upload-Offset indica onde ela começa."""
+        upload = self.get_object()
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except (KeyError, ValueError):
+            return Response({'error': 'O cabeçalho Upload-Offset é obrigatório.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if length <= 0 or length > settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE or offset + length > upload.total_size:
+            return Response({'error': 'Tamanho da parte inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not upload.chunk_fits(offset, length):
+            return Response(
+                {'error': f'Cada parte deve ter {settings.CHUNKED_UPLOAD_MAX_CHUNK_SIZE} bytes, exceto a última.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # select_for_update não trava nada no SQLite: a parte é reservada por UPDATE condicional.
+        claimed_at = ChunkedUpload.claim_chunk(upload.pk, offset)
+        if claimed_at is None:
+            upload.refresh_from_db()
+            return Response({'error': 'Offset divergente ou upload já finalizado.', 'offset': upload.offset, 'status': upload.status}, status=status.HTTP_409_CONFLICT)
+
+        try:
+            written = upload.append(request.stream, offset, length)
+        except BaseException:
+            upload.release_chunk(claimed_at)
+            raise
+        upload.offset = offset + written
+        upload.status = 'pending'
+
+        error = None
+        if upload.offset == upload.total_size:
+            upload.assemble()
+            with upload.open_received() as uploaded:
+                error = validar_imagem(uploaded)
+            if error:
+                upload.status = 'invalid'
+                upload.discard()
+            else:
+                upload.status = 'complete'
+                upload.finalize()
+        ChunkedUpload.objects.filter(pk=upload.pk, status='receiving', updated_at=claimed_at).update(
+            file=upload.file, multipart_id=upload.multipart_id, digest=upload.digest, offset=upload.offset, status=upload.status, updated_at=timezone.now()
+        )
+
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(self.get_serializer(upload).data, headers={'Upload-Offset': str(upload.offset)})
+
+
 class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
@@ -229,16 +374,184 @@ class ProductListView(generics.ListAPIView):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        queryset = ProductDetailValuesSerializer.values(self.filter_queryset(self.get_queryset()))
+        return StreamingJSONResponse(queryset, ProductDetailValuesSerializer, context=self.get_serializer_context())
+
+
+class CatalogSyncView(APIView):
+    """Alterações do catálogo desde o token `since` (sem ele, o catálogo inteiro); ver api.sync."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            page_size = min(int(request.query_params.get('page_size', 200)), 1000)
+            if page_size < 1:
+                raise ValueError(page_size)
+        except ValueError:
+            return Response({'error': 'Parâmetros de paginação inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = alteracoes_desde(request.query_params.get('since'), page_size, context={'request': request})
+        except TokenExpirado:
+            return Response(
+                {'error': 'Token de sincronização expirado; baixe o catálogo de novo sem since.'},
+                status=status.HTTP_410_GONE,
+            )
+        except ValueError:
+            return Response({'error': 'Token de sincronização inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+
+class ProductPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+class ProductFacetView(generics.ListAPIView):
+    serializer_class = ProductListSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ProductPagination
+
+    PRICE_BANDS = [(0, 50), (50, 100), (100, 250), (250, 500), (500, 1000), (1000, None)]
+    RATING_BANDS = [(0, 1), (1, 2), (2, 3), (3, 4), (4, None)]
+    FILTER_PARAMS = ('category_id', 'search', 'state', 'min_price', 'max_price', 'min_rate')
+    FACETS_CACHE_TIMEOUT = 300
+
+    def get_queryset(self):
+        queryset = Product.objects.annotate(
+            effective_price=Coalesce('discounted_price', 'original_price')
+        ).select_related('seller__user').prefetch_related('images').order_by('id')
+        params = ProductFilterSerializer.parse(self.request.query_params)
+
+        if 'category_id' in params:
+            queryset = queryset.filter(category_id=params['category_id'])
+        if 'search' in params:
+            queryset = queryset.filter(title__icontains=params['search'])
+        if 'state' in params:
+            queryset = queryset.filter(state=params['state'])
+        if 'min_price' in params:
+            queryset = queryset.filter(effective_price__gte=params['min_price'])
+        if 'max_price' in params:
+            queryset = queryset.filter(effective_price__lt=params['max_price'])
+        if 'min_rate' in params:
+            queryset = queryset.filter(rate__gte=params['min_rate'])
+
+        return queryset
+
+    def band_label(self, low, high):
+        return f'{low}+' if high is None else f'{low}-{high}'
+
+    def band_case(self, field, bands, null_label=None):
+        whens = [When(**{f'{field}__isnull': True}, then=Value(null_label))] if null_label else []
+        for low, high in bands:
+            condition = {f'{field}__gte': low}
+            if high is not None:
+                condition[f'{field}__lt'] = high
+            whens.append(When(**condition, then=Value(self.band_label(low, high))))
+        return Case(*whens, default=Value(None), output_field=CharField())
+
+    def compute_facets(self, queryset):
+        rows = queryset.order_by().annotate(
+            price_band=self.band_case('effective_price', self.PRICE_BANDS),
+            rating_band=self.band_case('rate', self.RATING_BANDS, null_label='sem_avaliacao'),
+        ).values('category_id', 'category__name', 'state', 'price_band', 'rating_band').annotate(total=Count('id'))
+
+        categories, states, prices, ratings = {}, {}, {}, {}
+        for row in rows:
+            category = categories.setdefault(row['category_id'], {'id': row['category_id'], 'name': row['category__name'], 'count': 0})
+            category['count'] += row['total']
+            states[row['state']] = states.get(row['state'], 0) + row['total']
+            if row['price_band']:
+                prices[row['price_band']] = prices.get(row['price_band'], 0) + row['total']
+            ratings[row['rating_band']] = ratings.get(row['rating_band'], 0) + row['total']
+
+        return {
+            'categories': sorted(categories.values(), key=lambda c: c['name'] or ''),
+            'states': [{'state': state, 'count': count} for state, count in sorted(states.items())],
+            'price_bands': [
+                {'band': self.band_label(low, high), 'count': prices.get(self.band_label(low, high), 0)}
+                for low, high in self.PRICE_BANDS
+            ],
+            'rating_bands': [
+                {'band': label, 'count': ratings.get(label, 0)}
+                for label in [self.band_label(low, high) for low, high in self.RATING_BANDS] + ['sem_avaliacao']
+            ],
+        }
+
+    def get_facets(self, queryset):
+        if any(self.request.query_params.get(param) for param in self.FILTER_PARAMS):
+            return self.compute_facets(queryset)
+
+        facets = cache.get(PRODUCT_FACETS_CACHE_KEY)
+        if facets is None:
+            facets = self.compute_facets(queryset)
+            cache.set(PRODUCT_FACETS_CACHE_KEY, facets, self.FACETS_CACHE_TIMEOUT)
+        return facets
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        response.data['facets'] = self.get_facets(queryset)
+        return response
+
+
+class HomeFeedViewSet(viewsets.GenericViewSet):
+    queryset = ProductRanking.objects.all()
+    serializer_class = ProductListSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ProductPagination
 
-class ProductDetailViewSet(viewsets.ReadOnlyModelViewSet):
+    def ranked_page(self, ordering):
+        rankings = self.get_queryset()
+        category_id = ProductFilterSerializer.parse(self.request.query_params).get('category_id')
+        if category_id is not None:
+            rankings = rankings.filter(category_id=category_id)
+
+        # Só colunas cobertas pelos índices do ranking: a página sai do índice.
+        page = self.paginate_queryset(rankings.order_by(*ordering).values_list('product_id', flat=True))
+        products = Product.objects.select_related('seller__user').prefetch_related('images').in_bulk(page)
+        serializer = self.get_serializer([products[pk] for pk in page if pk in products], many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='top-rated')
+    def top_rated(self, request):
+        return self.ranked_page(('-score', 'product_id'))
+
+    @action(detail=False, methods=['get'])
+    def newest(self, request):
+        return self.ranked_page(('-product_id',))
+
+
+class ProductDetailViewSet(SparseFieldsetViewMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductDetailSerializer
     permission_classes = [IsAuthenticated]
+    sparse_fieldset_actions = ('list', 'retrieve', 'detail')
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # A listagem sai por .values() e o ProductDetailValuesSerializer faz as próprias consultas.
+        return queryset if self.action == 'list' else self.with_related(queryset)
+
+    def list(self, request, *args, **kwargs):
+        fields = self.selected_fields()
+        queryset = ProductDetailValuesSerializer.values(self.filter_queryset(self.get_queryset()), fields)
+        context = {**self.get_serializer_context(), 'fields': fields}
+        return StreamingJSONResponse(queryset, ProductDetailValuesSerializer, context=context)
+
+    def get_object(self):
+        product = super().get_object()
+        # Vai para o buffer em memória; o UPDATE sai em lote (api.counters).
+        product_views().increment(product.pk)
+        return product
 
     @action(detail=True, methods=['get'])
     def detail(self, request, pk=None):
         product = self.get_object()
-        serializer = ProductDetailSerializer(product, context={'request': request})
+        serializer = self.get_serializer(product)
         return Response(serializer.data)
 
 class ProductViewSet(viewsets.ModelViewSet):
@@ -252,34 +565,37 @@ class ProductViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         images = request.FILES.getlist('images')
 
-        logger.info(f"Imagens recebidas: {images}")
+        upload_ids = request.data.getlist('upload_ids') if hasattr(request.data, 'getlist') else request.data.get('upload_ids', [])
+        if not isinstance(upload_ids, list):
+            return Response({'error': 'upload_ids deve ser uma lista.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        logger.info(f"Imagens recebidas: {images} | uploads: {upload_ids}")
         
-        if len(images) > 6:
+        if len(images) + len(upload_ids) > 6:
             return Response({'error': 'Você pode enviar no máximo 6 imagens.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        for image in images:
-            try:
-                img = Image.open(image)
-                img.verify() 
-                img_format = img.format.lower()
-                
-                if img_format not in ['jpeg', 'jpg', 'png']:
-                    return Response({'error': f"Formato de imagem inválido: {img_format}. Apenas JPEG e PNG são permitidos."}, status=status.HTTP_400_BAD_REQUEST)
-                
-                width, height = get_image_dimensions(image)
-                if width > 3000 or height > 3000:
-                    return Response({'error': 'As imagens devem ter no máximo 3000x3000 pixels.'}, status=status.HTTP_400_BAD_REQUEST)
-
-            except Exception as e:
-                return Response({'error': f"Imagem inválida: {str(e)}"}, status=status.HTTP_400_BAD_REQUEST)
+        errors = [
+            f'{image.name}: {error}'
+            for image, error in zip(images, validar_imagens(images, max_workers=settings.IMAGE_VALIDATION_WORKERS))
+            if error
+        ]
+        if errors:
+            return Response({'error': errors[0], 'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
 
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        product = serializer.save()
+        with transaction.atomic():
+            uploads = ChunkedUpload.claim(request.user, upload_ids, 'product_image')
+            if uploads is None:
+                return Response({'error': 'Upload inválido, incompleto ou já utilizado.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            product = serializer.save()
 
-        for image in images:
-            product.images.create(image=image)
+            # Conteúdo repetido reaproveita o blob existente; uploads em partes já estão no storage.
+            blobs = [ImageBlob.acquire(ImageBlob.compute_digest(image), content=image) for image in images]
+            blobs += [ImageBlob.acquire(upload.digest, stored_name=upload.file, size=upload.total_size) for upload in uploads]
+            ProductImage.objects.bulk_create([ProductImage(product=product, image=blob.file, blob=blob) for blob in blobs])
 
         return Response({'message': 'Produto criado com sucesso!', 'product': serializer.data}, status=status.HTTP_201_CREATED)
 
@@ -326,7 +642,7 @@ class CommentViewSet(viewsets.ModelViewSet):
         if comments.exists():
             average_rating = comments.aggregate(Avg('rating'))['rating__avg']
             product.rate = average_rating
-            product.save()
+            product.save(update_fields=['rate', 'updated_at'])
 
     def list(self, request, *args, **kwargs):
         product_id = self.request.query_params.get('product_id')
@@ -340,8 +656,9 @@ class CommentViewSet(viewsets.ModelViewSet):
         if seller_id:
             queryset = queryset.filter(product__seller_id=seller_id)
 
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        return StreamingJSONResponse(
+            CommentValuesSerializer.values(queryset), CommentValuesSerializer, context=self.get_serializer_context()
+        )
 
 class OrderViewSet(viewsets.ModelViewSet):
     queryset = Order.objects.all()
@@ -356,7 +673,17 @@ class OrderViewSet(viewsets.ModelViewSet):
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        order = serializer.save()
+        line_items = serializer.validated_data.get('line_items')
+        if line_items is None:
+            order = serializer.save()
+        else:
+            order = Order.place(
+                request.user,
+                [(item['product'], item['quantity'], item.get('reservation')) for item in line_items],
+                status=serializer.validated_data.get('status', 'pending'),
+            )
+            if order is None:
+                return Response({'error': 'Estoque insuficiente para um ou mais itens.'}, status=status.HTTP_409_CONFLICT)
         return Response({'message': 'Pedido criado com sucesso!', 'order_id': order.id}, status=status.HTTP_201_CREATED)
 
     def retrieve(self, request, *args, **kwargs):
@@ -364,11 +691,90 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(instance)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        with transaction.atomic():
+            order = self.get_object()
+            previous = Order.lock(order.pk)
+            serializer = self.get_serializer(order, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            order = serializer.save()
+            if not order.switch_stock(previous, order.status):
+                transaction.set_rollback(True)
+                return Response({'error': 'Estoque insuficiente para reabrir o pedido.'}, status=status.HTTP_409_CONFLICT)
+        return Response(serializer.data)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.switch_stock(Order.lock(instance.pk), 'canceled')
+            instance.delete()
+
 class OrderItemViewSet(viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
     permission_classes = [IsAuthenticated] 
 
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            if not Product.take_stock(serializer.validated_data['product'].pk, serializer.validated_data['quantity']):
+                return Response({'error': 'Estoque insuficiente.'}, status=status.HTTP_409_CONFLICT)
+            serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        with transaction.atomic():
+            # Lê o item depois de travar o pedido: dois PATCHes seguidos não calculam a diferença do mesmo valor.
+            Order.lock(self.get_object().order_id)
+            item = self.get_object()
+            serializer = self.get_serializer(item, data=request.data, partial=partial)
+            serializer.is_valid(raise_exception=True)
+            if 'order' in serializer.validated_data:
+                Order.lock(serializer.validated_data['order'].pk)
+            product_id, units = OrderItem.held_stock(item.pk)
+            serializer.save()
+            Product.return_stock(product_id, units)
+            product_id, units = OrderItem.held_stock(item.pk)
+            if units and not Product.take_stock(product_id, units):
+                transaction.set_rollback(True)
+                return Response({'error': 'Estoque insuficiente.'}, status=status.HTTP_409_CONFLICT)
+        return Response(serializer.data)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            Order.lock(instance.order_id)
+            product_id, units = OrderItem.held_stock(instance.pk)
+            instance.delete()
+            Product.return_stock(product_id, units)
+
+
+class StockReservationViewSet(viewsets.ModelViewSet):
+    """Reservas de estoque do usuário: POST separa as unidades por STOCK_RESERVATION_TTL, DELETE devolve."""
+    serializer_class = StockReservationSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ['get', 'post', 'delete']
+
+    def get_queryset(self):
+        return StockReservation.objects.filter(user=self.request.user).order_by('-id')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reservation = StockReservation.reserve(
+            request.user, serializer.validated_data['product'].pk, serializer.validated_data['quantity']
+        )
+        if reservation is None:
+            return Response({'error': 'Estoque insuficiente.'}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(reservation).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, *args, **kwargs):
+        reservation = self.get_object()
+        if not reservation.release():
+            return Response({'error': 'A reserva não está mais ativa.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 class FavoriteViewSet(viewsets.ModelViewSet):
     queryset = Favorite.objects.all()
     serializer_class = FavoriteSerializer
@@ -381,11 +787,11 @@ class FavoriteViewSet(viewsets.ModelViewSet):
         favorites = self.get_queryset()
         product_ids = favorites.values_list('product_id', flat=True)
 
-        products = Product.objects.filter(id__in=product_ids, favorited=True)
+        products = Product.objects.filter(id__in=product_ids, favorited=True).select_related(
+            'seller__user', 'category'
+        ).prefetch_related('images')
 
-        serializer = ProductDetailSerializer(products, many=True)
-
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return StreamingJSONResponse(products, ProductDetailSerializer, status=status.HTTP_200_OK)
 
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -398,7 +804,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
 
         favorite = serializer.save()
         product.favorited = True
-        product.save()
+        product.save(update_fields=['favorited', 'updated_at'])
 
         product.refresh_from_db()
         updated_product_serializer = ProductDetailSerializer(product)
@@ -420,7 +826,7 @@ class FavoriteViewSet(viewsets.ModelViewSet):
 
             product = Product.objects.get(id=product_id)
             product.favorited = False
-            product.save()
+            product.save(update_fields=['favorited', 'updated_at'])
             product.refresh_from_db()
             updated_product_serializer = ProductDetailSerializer(product)
 
@@ -432,29 +838,40 @@ class FavoriteViewSet(viewsets.ModelViewSet):
             return Response({'detail': 'Produto não encontrado nos favoritos.'}, status=status.HTTP_404_NOT_FOUND)
         except Product.DoesNotExist:
             return Response({'detail': 'Produto não encontrado.'}, status=status.HTTP_404_NOT_FOUND)
-class ChatViewSet(viewsets.ModelViewSet):
+
+
+class ChatShardMixin:
+    """get_object no banco de chat dono do id da URL; get_queryset(using) devolve a busca nesse banco."""
+
+    def get_object(self):
+        pk = str(self.kwargs[self.lookup_url_kwarg or self.lookup_field])
+        if not pk.isdigit():
+            raise Http404
+        obj = get_object_or_404(self.get_queryset(using=db_for_chat(pk)), pk=pk)
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+class ChatViewSet(SparseFieldsetViewMixin, ChatShardMixin, viewsets.ModelViewSet):
     queryset = Chat.objects.all()
     serializer_class = ChatSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
+    def get_queryset(self, using=None):
         user = self.request.user
         if not user.is_authenticated:
             return Chat.objects.none()
-
-        try:
-            seller = Seller.objects.get(user=user)
-        except Seller.DoesNotExist:
-            seller = None
-
-        return Chat.objects.filter(buyer=user) | Chat.objects.filter(seller=seller)
+        if using is None:
+            return self.with_related(Chat.for_user(user))
+        return self.with_related(Chat.objects.using(using).filter(id__in=Chat.ids_for_user(user, using)))
 
     def create(self, request, *args, **kwargs):
         buyer_id = request.data.get('buyer')
         seller_id = request.data.get('seller')
         product_id = request.data.get('product')
 
-        existing_chat = Chat.objects.filter(buyer_id=buyer_id, seller_id=seller_id, product_id=product_id).first()
+        chats = Chat.objects.using(db_for_buyer(buyer_id)) if str(buyer_id).isdigit() else Chat.objects.none()
+        existing_chat = chats.filter(buyer_id=buyer_id, seller_id=seller_id, product_id=product_id).first()
 
         if existing_chat:
             return Response({
@@ -476,24 +893,136 @@ class ChatViewSet(viewsets.ModelViewSet):
             'message': 'Chat criado com sucesso!',
             'chat': ChatSerializer(chat).data
         }, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def read(self, request, pk=None):
+        """Marca o chat como lido até `message_id` (ou até a última mensagem)."""
+        chat = self.get_object()
+        message_id = request.data.get('message_id')
+        if message_id is not None:
+            try:
+                message_id = int(message_id)
+            except (TypeError, ValueError):
+                return Response({'error': 'message_id inválido.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        last_read, unread = chat.mark_read(request.user.id, message_id)
+        return Response({
+            'last_read_message_id': last_read,
+            'unread_count': unread,
+            'total_unread': UnreadCounter.total_for(request.user.id),
+        })
+
+    @action(detail=False, methods=['get'])
+    def unread(self, request):
+        return Response({'total_unread': UnreadCounter.total_for(request.user.id)})
     
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(ChatShardMixin, viewsets.ModelViewSet):
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
 
-    def get_queryset(self):
+    def get_queryset(self, using=None):
         user = self.request.user
         if not user.is_authenticated:
             return Message.objects.none()
-        
-        return Message.objects.filter(chat__buyer=user) | Message.objects.filter(chat__seller__user=user)
+
+        try:
+            chat_id = int(self.request.query_params['chat']) if self.request.query_params.get('chat') else None
+            after_seq = int(self.request.query_params['after_seq']) if self.request.query_params.get('after_seq') else None
+        except ValueError:
+            raise ParseError({'error': 'Parâmetros inválidos.'})
+        if using is None:
+            using = db_for_chat(chat_id) if chat_id is not None else chat_databases()[0]
+        queryset = Message.objects.using(using).filter(chat__in=Chat.ids_for_user(user, using))
+
+        if chat_id is not None:
+            queryset = queryset.filter(chat_id=chat_id)
+        if after_seq is not None:
+            queryset = queryset.filter(seq__gt=after_seq)
+
+        return queryset.order_by('chat_id', 'seq')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Com `chat`, inclui o histórico arquivado: `after_seq` sincroniza para frente e `before_seq`
+        volta uma página (`page_size`) a partir de uma seq, buscando no arquivo o que não está mais na tabela.
+        """
+        if not request.query_params.get('chat'):
+            # Sem chat: junta os bancos de chat em ordem, o que mantém a ordenação por chat e seq.
+            return Response([
+                message
+                for alias in chat_databases()
+                for message in self.get_serializer(self.get_queryset(using=alias), many=True).data
+            ])
+        try:
+            chat_id = int(request.query_params['chat'])
+            after_seq = int(request.query_params.get('after_seq') or 0)
+            before_seq = int(request.query_params['before_seq']) if request.query_params.get('before_seq') else None
+            page_size = min(int(request.query_params.get('page_size', 50)), 200)
+            if page_size < 1:
+                raise ValueError(page_size)
+        except ValueError:
+            return Response({'error': 'Parâmetros inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        using = db_for_chat(chat_id)
+        if not Chat.objects.using(using).filter(pk=chat_id, id__in=Chat.ids_for_user(request.user, using)).exists():
+            return Response([])
+
+        queryset = self.filter_queryset(self.get_queryset())
+        if before_seq is None:
+            messages = self.get_serializer(queryset, many=True).data
+            return Response(mensagens_arquivadas(chat_id, after_seq=after_seq) + messages)
+
+        recent = list(queryset.filter(seq__lt=before_seq).order_by('-seq')[:page_size])[::-1]
+        messages = self.get_serializer(recent, many=True).data
+        if len(recent) < page_size:
+            # As arquivadas são sempre mais antigas que as da tabela quente.
+            oldest = recent[0].seq if recent else before_seq
+            messages = mensagens_arquivadas(
+                chat_id, after_seq=after_seq, before_seq=oldest, limit=page_size - len(recent)
+            ) + messages
+        return Response(messages)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Busca nas mensagens dos chats do usuário; pagina das mais recentes para as mais antigas com `before`."""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response({'error': 'Informe o termo de busca em q.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            before = int(request.query_params['before']) if request.query_params.get('before') else None
+            page_size = min(int(request.query_params.get('page_size', 20)), 100)
+            if page_size < 1:
+                raise ValueError(page_size)
+        except ValueError:
+            return Response({'error': 'Parâmetros de paginação inválidos.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        hits = buscar_mensagens(request.user, query, before=before, limit=page_size + 1)
+        has_next, hits = len(hits) > page_size, hits[:page_size]
+        messages = {}
+        for alias in chat_databases():
+            messages.update(Message.objects.using(alias).prefetch_related('sender').in_bulk(
+                [message_id for message_id, _, arquivada in hits if arquivada is None and db_for_chat(message_id) == alias]
+            ))
+        results = [
+            {**(arquivada or MessageSerializer(messages[message_id]).data), 'snippet': snippet}
+            for message_id, snippet, arquivada in hits if arquivada is not None or message_id in messages
+        ]
+
+        next_url = None
+        if has_next:
+            params = request.query_params.copy()
+            params['before'] = hits[-1][0]
+            next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+        return Response({'next': next_url, 'results': results})
 
     def create(self, request, *args, **kwargs):
         """Envia uma nova mensagem em um chat."""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        message = serializer.save()
+        # Mensagem e contadores do chat na mesma transação; o total do usuário só vai junto sem shards (ver Chat.add_unread).
+        with transaction.atomic(using=serializer.validated_data['chat']._state.db):
+            message = serializer.save()
         return Response({
             'message': 'Mensagem enviada com sucesso!',
             'message_data': serializer.data
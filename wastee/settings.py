@@ -34,8 +34,60 @@ ALLOWED_HOSTS = ['*']
 
 CORS_ALLOW_ALL_ORIGINS = True
 
-MEDIA_URL = '/media/'
+# Mídia: 'filesystem' (MEDIA_ROOT servido pelo nginx/CDN em MEDIA_URL) ou 's3'
+# (qualquer API compatível com S3, inclusive um MinIO local via MEDIA_S3_ENDPOINT_URL).
+MEDIA_STORAGE = os.getenv('MEDIA_STORAGE', 'filesystem')
+MEDIA_URL = os.getenv('MEDIA_URL', '/media/')
 MEDIA_ROOT = BASE_DIR / 'media'
+# O Django só serve mídia em desenvolvimento e quando ela está no disco local.
+SERVE_MEDIA = DEBUG and MEDIA_STORAGE == 'filesystem' and MEDIA_URL.startswith('/')
+
+FILE_UPLOAD_HANDLERS = [
+    'api.uploadhandlers.HashingMemoryFileUploadHandler',
+    'api.uploadhandlers.HashingTemporaryFileUploadHandler',
+]
+
+# Acima de 1 a validação dos cabeçalhos vai para um pool de processos. Ler só o cabeçalho
+# custa menos que a ida e volta entre processos, então o padrão é validar no próprio worker
+# (veja `manage.py bench_image_validation`).
+IMAGE_VALIDATION_WORKERS = int(os.getenv('IMAGE_VALIDATION_WORKERS', 1))
+
+CHUNKED_UPLOAD_MAX_SIZE = 15 * 1024 * 1024
+# Com MEDIA_STORAGE='s3' é também o tamanho das partes do multipart upload (o S3 exige ao menos 5 MiB).
+CHUNKED_UPLOAD_MAX_CHUNK_SIZE = 5 * 1024 * 1024
+# Uma parte reservada por mais que isso (segundos) é de um worker que caiu; outro PUT pode retomá-la.
+CHUNKED_UPLOAD_CLAIM_TIMEOUT = 10 * 60
+
+GMAIL_TOKEN_FILE = os.getenv('GMAIL_TOKEN_FILE', 'token.json')
+# Renova o access token do Gmail quando faltar menos que isso (segundos) para expirar.
+GMAIL_TOKEN_REFRESH_MARGIN = 300
+
+# Tempo (segundos) que uma reserva de estoque segura as unidades antes de release_stock_reservations devolvê-las.
+STOCK_RESERVATION_TTL = int(os.getenv('STOCK_RESERVATION_TTL', 15 * 60))
+
+# Visualizações de produto ficam em memória e são gravadas num UPDATE só a cada PRODUCT_VIEW_FLUSH_INTERVAL
+# segundos ou ao juntar PRODUCT_VIEW_FLUSH_MAX_PENDING; é o máximo que um processo perde se cair.
+# O UPDATE só soma em Product.view_count: o ProductRanking não é recalculado e as visualizações
+# só entram no score do feed quando rebuild_rankings rodar.
+PRODUCT_VIEW_FLUSH_INTERVAL = int(os.getenv('PRODUCT_VIEW_FLUSH_INTERVAL', 10))
+PRODUCT_VIEW_FLUSH_MAX_PENDING = int(os.getenv('PRODUCT_VIEW_FLUSH_MAX_PENDING', 1000))
+
+# Sincronização offline do catálogo (/api/sync/): alterações mais recentes que isso (segundos) ficam para a
+# próxima chamada, e deleções ficam guardadas SYNC_TOMBSTONE_RETENTION_DAYS (purge_tombstones).
+SYNC_SETTLE_SECONDS = 5
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+
+# Maior intervalo (dias) aceito pelo painel de estatísticas do vendedor.
+SELLER_STATS_MAX_DAYS = 366
+
+# Mensagens mais antigas que isso (dias) vão para o arquivo comprimido (archive_messages).
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.getenv('MESSAGE_ARCHIVE_AFTER_DAYS', 180))
+
+EXTERNAL_IMAGE_MAX_SIZE = 10 * 1024 * 1024
+EXTERNAL_IMAGE_NEGATIVE_CACHE_TTL = 60 * 60
+EXTERNAL_IMAGE_NEGATIVE_CACHE_MAX_TTL = 7 * 24 * 60 * 60
+# Bloqueia URLs que resolvem para IPs internos (loopback, rede privada); só libere em desenvolvimento.
+EXTERNAL_IMAGE_ALLOW_PRIVATE_HOSTS = os.getenv('EXTERNAL_IMAGE_ALLOW_PRIVATE_HOSTS', 'False') == 'True'
 
 # Application definition
 
@@ -56,8 +108,42 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_THROTTLE_RATES': {
+        'login_ip': '20/min',
+        'login_email': '5/min',
+        'register_ip': '10/hour',
+        'register_email': '3/hour',
+        'confirm_ip': '20/min',
+        'confirm_email': '5/min',
+    },
+    # Quantos proxies reversos confiáveis ficam na frente da aplicação. Com 0 o IP do throttle é o
+    # REMOTE_ADDR; sem isso o DRF aceitaria qualquer X-Forwarded-For enviado pelo cliente.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 0)),
 }
 
+# Os baldes de tokens (api.throttles) precisam de um cache compartilhado entre os workers; num LocMem
+# cada processo teria o próprio limite. Redis com THROTTLE_REDIS_URL, senão a tabela api_throttle_cache
+# do banco principal (criada por `manage.py createcachetable`).
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'api_throttle_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+if os.getenv('THROTTLE_REDIS_URL'):
+    CACHES['throttle'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('THROTTLE_REDIS_URL'),
+    }
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=120),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
@@ -69,6 +155,7 @@ SIMPLE_JWT = {
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -77,6 +164,10 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_CACHE_TIMEOUT = 300
+COMPRESSION_CACHE_MAX_SIZE = 512 * 1024
+
 ROOT_URLCONF = 'wastee.urls'
 
 TEMPLATES = [
@@ -118,11 +209,22 @@ WSGI_APPLICATION = 'wastee.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.getenv('DATABASE_PATH', BASE_DIR / 'db.sqlite3'),
         'PORT': '5432',
     }
 }
 
+# Chats e mensagens: CHAT_SHARDS=N os coloca em N bancos próprios (chat_0 ... chat_N-1), roteados por
+# api.routers.ChatRouter. Com 0 ficam no banco principal. Cada banco novo precisa de `migrate --database`.
+CHAT_SHARDS = int(os.getenv('CHAT_SHARDS', 0))
+CHAT_DB_DIR = Path(os.getenv('CHAT_DB_DIR', BASE_DIR))
+CHAT_DATABASES = [f'chat_{shard}' for shard in range(CHAT_SHARDS)] or ['default']
+for alias in CHAT_DATABASES:
+    if alias != 'default':
+        DATABASES[alias] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': CHAT_DB_DIR / f'{alias}.sqlite3'}
+
+DATABASE_ROUTERS = ['api.routers.ChatRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -144,6 +246,25 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'api.User'
 
+# Política de hash de senha: 'pbkdf2' (padrão) ou 'argon2' (requer argon2-cffi).
+# O primeiro hasher da lista é o preferido; hashes antigos continuam válidos e
+# são refeitos com a política atual no próximo login bem-sucedido.
+PASSWORD_HASHER_POLICY = os.getenv('PASSWORD_HASHER_POLICY', 'pbkdf2')
+PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', 0)) or None
+ARGON2_TIME_COST = int(os.getenv('ARGON2_TIME_COST', 0)) or None
+ARGON2_MEMORY_COST = int(os.getenv('ARGON2_MEMORY_COST', 0)) or None
+ARGON2_PARALLELISM = int(os.getenv('ARGON2_PARALLELISM', 0)) or None
+
+PASSWORD_HASHERS = [
+    'api.hashers.TunablePBKDF2PasswordHasher',
+    'api.hashers.TunableArgon2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+if PASSWORD_HASHER_POLICY == 'argon2':
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop(1))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -163,7 +284,33 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage',
+    },
+}
+
+if MEDIA_STORAGE == 's3':
+    # Requer django-storages[s3]. Sem domínio de CDN, as URLs saem pré-assinadas.
+    MEDIA_CDN_DOMAIN = os.getenv('MEDIA_CDN_DOMAIN')
+    STORAGES['default'] = {
+        'BACKEND': 'storages.backends.s3.S3Storage',
+        'OPTIONS': {
+            'bucket_name': os.getenv('MEDIA_S3_BUCKET'),
+            'endpoint_url': os.getenv('MEDIA_S3_ENDPOINT_URL'),
+            'region_name': os.getenv('MEDIA_S3_REGION'),
+            'access_key': os.getenv('MEDIA_S3_ACCESS_KEY'),
+            'secret_key': os.getenv('MEDIA_S3_SECRET_KEY'),
+            'custom_domain': MEDIA_CDN_DOMAIN,
+            'querystring_auth': not MEDIA_CDN_DOMAIN,
+            'querystring_expire': int(os.getenv('MEDIA_URL_EXPIRE', 3600)),
+            'file_overwrite': False,
+        },
+    }
 
 
 # Default primary key field type